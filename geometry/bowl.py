@@ -1,55 +1,121 @@
+import numpy as np
 import pandas as pd
 from matplotlib import style
+from inputs.rating_table import RatingTable
 style.use('ggplot')
 
+# Ways of working out the volume between two surveyed areas
+VOLUME_METHODS = ('trapezoid', 'frustum')
 
 
 class Bowl:
     """Class to create bowl objects used to represent the elevation-area-volume relationship for a reservoir.
-    
+
+        Volumes are the cumulative sum of the volume between each pair of
+        elevations, either a trapezoid (the mean of the two areas) or a
+        conic frustum ((A1 + A2 + sqrt(A1*A2)) / 3), which is exact for a
+        cone or pyramid. The lookup tables are built on first use, so a
+        survey of tens of thousands of points loads quickly.
+
         Attributes
         ----------
         elevation_units : Quantity Length unit
         area_units : Quantity Area unit
         volume_units : Quantity Volume unit
-        
-        elevations : list of flt
-        areas : list of flt
-        
+
+        elevations : numpy.ndarray
+        areas : numpy.ndarray
+        volumes : numpy.ndarray
+            Volume below each elevation
+        method : str
+            'trapezoid' or 'frustum'
+
         geometry : dataframe of elevations, area, and volume increments
         Methods
         -------
         plot_elevation_area() : show a plot of elevation-area
             show areas on x axis and elevations on y
-        
+        from_csv() : read a survey of elevations and areas
+        lookup_volume(elevation) : volume below an elevation
+        lookup_area(elevation) : water surface area at an elevation
+        lookup_elevation(volume) : elevation of a volume
+
     """
-    def __init__(self, elevations, areas, base_unit='ft'):
+    def __init__(self, elevations, areas, base_unit='ft', method='trapezoid'):
+        if method not in VOLUME_METHODS:
+            raise ValueError('method should be one of %s' % (VOLUME_METHODS,))
+        elevations = np.asarray(elevations, dtype=float)
+        areas = np.asarray(areas, dtype=float)
+        if elevations.ndim != 1 or elevations.shape != areas.shape:
+            raise ValueError('elevations and areas should be 1-D with the same number of points')
+        if (np.diff(elevations) < 0.0).any():
+            order = np.argsort(elevations, kind='stable')
+            elevations = elevations[order]
+            areas = areas[order]
+
         self.base_unit = base_unit
+        self.method = method
         self.elevations_name = 'Elevation'
         self.elevations = elevations
-        
+
         self.areas_name = 'Area'
         self.areas = areas
-        
+
         self.volumes_name = 'Volume'
-        self.volumes = [0.0] * len(self.elevations)
-        
-        volume = 0.0
-        for i in range(len(self.elevations)):
-            if i == 0:
-                self.volumes[i] = 0.0
-            else:
-                elev_diff = self.elevations[i] - self.elevations[i-1]
-                volume += elev_diff * (self.areas[i] + self.areas[i-1]) / 2.0
-                self.volumes[i] = volume
-
-        self.geometry = pd.DataFrame(list(zip(
-            self.elevations,
-            self.areas,
-            self.volumes,
-            )),
-            columns=[self.elevations_name, self.areas_name, self.volumes_name])
+        elev_diff = np.diff(elevations)
+        if method == 'frustum':
+            increments = elev_diff * (areas[1:] + areas[:-1] + np.sqrt(areas[1:] * areas[:-1])) / 3.0
+        else:
+            increments = elev_diff * (areas[1:] + areas[:-1]) / 2.0
+        self.volumes = np.concatenate([np.zeros(min(len(elevations), 1)), np.cumsum(increments)])
+        self._elevation_area = None
+        self._elevation_volume = None
+
+    @classmethod
+    def from_csv(cls, filename, elevation='Elevation', area='Area', **kwargs):
+        """Bowl of a survey held in the columns of a CSV file
+
+            Parameters
+            ----------
+            filename : str
+            elevation, area : str
+                Column names
+            kwargs
+                Passed on to Bowl()
+        """
+        frame = pd.read_csv(filename, usecols=[elevation, area], dtype=float, engine='c')
+        return cls(frame[elevation].to_numpy(), frame[area].to_numpy(), **kwargs)
+
+    @property
+    def geometry(self):
+        """DataFrame of the elevations, areas and volumes"""
+        return pd.DataFrame({self.elevations_name: self.elevations,
+                             self.areas_name: self.areas,
+                             self.volumes_name: self.volumes})
 
+    @property
+    def elevation_area(self):
+        if self._elevation_area is None:
+            self._elevation_area = RatingTable(self.elevations, self.areas)
+        return self._elevation_area
+
+    @property
+    def elevation_volume(self):
+        if self._elevation_volume is None:
+            self._elevation_volume = RatingTable(self.elevations, self.volumes)
+        return self._elevation_volume
+
+    def lookup_volume(self, elevation):
+        """Volume below an elevation, for a float or an array"""
+        return self.elevation_volume.lookup(elevation)
+
+    def lookup_area(self, elevation):
+        """Water surface area at an elevation, for a float or an array"""
+        return self.elevation_area.lookup(elevation)
+
+    def lookup_elevation(self, volume):
+        """Elevation of a volume, for a float or an array"""
+        return self.elevation_volume.inverse(volume)
 
     def plot_elevation_volume(self):
         #plt.figure()
@@ -61,4 +127,4 @@ class Bowl:
         ax.set_xticks(self.geometry['Elevation'])
     
         #plt.show()
-        
\ No newline at end of file
+        
@@ -1,5 +1,9 @@
+import os
+import tempfile
 import unittest
+import numpy as np
 from geometry.bowl import Bowl
+from water_manage.reservoir import Reservoir
 
 
 class TestBowl(unittest.TestCase):
@@ -17,4 +21,61 @@ class TestBowl(unittest.TestCase):
         """Head loss should be correct"""
         
         self.b.plot_elevation_volume()
- 
\ No newline at end of file
+
+    def testVolumes(self):
+        """Cumulative trapezoids as the old loop added them"""
+        self.assertEqual(self.b.volumes.tolist(), [0.0, 150.0, 487.5, 875.0, 1282.5])
+        self.assertEqual(self.b.geometry['Volume'].iloc[-1], 1282.5)
+
+    def testFrustum(self):
+        """The frustum volume of a cone is exact"""
+        elevations = np.linspace(0.0, 10.0, 11)
+        cone = Bowl(elevations, np.pi * elevations**2, method='frustum')
+        np.testing.assert_allclose(cone.volumes, np.pi * elevations**3 / 3.0)
+        self.assertGreater(Bowl(elevations, np.pi * elevations**2).volumes[-1], cone.volumes[-1])
+        with self.assertRaises(ValueError):
+            Bowl(elevations, elevations, method='simpson')
+
+    def testLookups(self):
+        self.assertEqual(self.b.lookup_volume(1.5), np.interp(1.5, self.b.elevations, self.b.volumes))
+        self.assertEqual(self.b.lookup_area(3.5), 407.5)
+        self.assertAlmostEqual(self.b.lookup_elevation(self.b.lookup_volume(2.7)), 2.7)
+        np.testing.assert_allclose(self.b.lookup_elevation(self.b.volumes), self.b.elevations)
+
+    def testSurvey(self):
+        """A large unsorted survey read from a file"""
+        elevations = np.random.default_rng(5).permutation(np.linspace(100.0, 150.0, 50001))
+        areas = 20.0 * (elevations - 100.0)**1.5
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'survey.csv')
+            np.savetxt(filename, np.column_stack([elevations, areas]), delimiter=',',
+                       header='Elevation,Area', comments='')
+            bowl = Bowl.from_csv(filename)
+        self.assertEqual(len(bowl.volumes), 50001)
+        self.assertTrue((np.diff(bowl.elevations) > 0.0).all())
+        self.assertAlmostEqual(bowl.volumes[-1], 8.0 * 50.0**2.5, delta=1.0)
+
+    def testReservoir(self):
+        """A reservoir takes its stage-storage-area table from a bowl"""
+        r = Reservoir(500.0, bowl=self.b)
+        self.assertEqual(r.volumes, self.b.volumes.tolist())
+        self.assertAlmostEqual(r.water_level, self.b.lookup_elevation(500.0))
+        self.assertAlmostEqual(r.area, np.interp(500.0, self.b.volumes, self.b.areas))
+
+    def testReservoirSurvey(self):
+        """A survey that does not start at 0 sets the crest, outlet and bottom"""
+        elevations = np.linspace(100.0, 150.0, 51)
+        bowl = Bowl(elevations, 20.0 * (elevations - 100.0))
+        r = Reservoir(20000.0, bowl=bowl)
+        self.assertEqual((r.bottom, r.outlet_elevation, r.spillway_crest), (100.0, 100.0, 150.0))
+        self.assertEqual(r.spillway_volume, bowl.volumes[-1])
+        result = r.simulate(np.full(5, 10.0))
+        self.assertEqual(result['spill'].tolist(), [0.0] * 5)
+        self.assertAlmostEqual(result['volume'][-1], 20050.0)
+        # The spillway volume follows a new crest
+        r.spillway_crest = 140.0
+        self.assertEqual(r.spillway_volume, bowl.lookup_volume(140.0))
+        result = r.simulate(np.full(5, 10.0))
+        self.assertAlmostEqual(result['volume'][-1], bowl.lookup_volume(140.0))
+        self.assertEqual(Reservoir(0.0, bowl=bowl, spillway_crest=130.0, outlet_elevation=110.0).outlet_elevation,
+                         110.0)
@@ -1,3 +1,4 @@
+import numpy as np
 from validation import error_checks as ec
 from water_manage.store import Store
 from water_manage.store_array import StoreArray
@@ -41,6 +42,8 @@ class Awbm:
             this is the main output of AWBM. It represents the
             outflow discharge rate from the catch01 on a per
             area basis [mm]
+        run(precip, et)
+            runoff for a whole series of precipitation and ET
         set_bucket_capacity :
             reset the capacity depths for each bucket [mm]
     """
@@ -146,6 +149,64 @@ class Awbm:
         # Sum surface and baseflow
         return self.surface.outflow + self.base.outflow
 
+    def run(self, precip, et):
+        """Calculates the runoff for a whole series of precip and ET
+
+            This gives the same result as calling runoff() once per
+            time step but the state is carried in local floats rather
+            than the store objects. The stores are updated with the
+            final state when the run is complete so a run can be
+            continued with runoff() or another call to run().
+
+            Parameters
+            ----------
+            precip : array[float]
+                Daily precipitation series [m]
+            et : array[float]
+                Effective evapotranspiration series [m]
+
+            Returns
+            -------
+            runoff : numpy.ndarray
+                Runoff for each time step [m] on a per unit area basis
+            buckets : numpy.ndarray
+                Quantity in each bucket at the end of each time step,
+                shape (time steps, bucket count)
+            surface, base : numpy.ndarray
+                Quantity in the surface and baseflow stores at the end
+                of each time step
+        """
+        precip = np.asarray(precip, dtype=float)
+        et = np.asarray(et, dtype=float)
+        ec.check_equal_length(precip, et)
+        if (precip < 0.0).any() or (et < 0.0).any():
+            raise ValueError('precip and et should be a positive')
+
+        result = _awbm_kernel(precip.tolist(), et.tolist(),
+                              list(self.partial_area_fraction),
+                              self.buckets.capacity.tolist(),
+                              self.buckets.quantity.tolist(),
+                              self.surface.quantity, self.base.quantity,
+                              self.baseflow_index, self.surface_recession,
+                              self.baseflow_recession)
+        runoff, buckets, surface, base, last = result
+
+        if len(runoff) > 0:
+            b_in, b_req, b_over, b_out, s_step, b_step = last
+            self.buckets.quantity[:] = buckets[-self.bucket_count:]
+            self.buckets.inflow[:] = b_in
+            self.buckets.request[:] = b_req
+            self.buckets.overflow[:] = b_over
+            self.buckets.outflow[:] = b_out
+            for store, quantity, step in ((self.surface, surface[-1], s_step),
+                                          (self.base, base[-1], b_step)):
+                store._quantity = quantity
+                store.inflow, store.request, store.outflow = step
+                store.overflow = 0.0
+
+        return (np.array(runoff), np.array(buckets).reshape(len(runoff), self.bucket_count),
+                np.array(surface), np.array(base))
+
     def set_partial_area_fraction(self, new_fractions):
         """Reset the partial area fractions used for the bucket stores
 
@@ -179,3 +240,224 @@ class Awbm:
             bucket_capacities[i] = new_capacities[i] * self.partial_area_fraction[i]
         self.buckets.set_capacity(bucket_capacities)
         return "Array of fractions replaced."
+
+
+class AwbmEnsemble:
+    """A group of AWBM catchments advanced together as arrays
+
+        Parameters and states for N catchments are held as (N, 3) bucket
+        arrays and (N,) store arrays so that a time step for every
+        catchment is a handful of numpy operations. Each operation is
+        done in the same order as Awbm.runoff so results are identical
+        to running the catchments one at a time.
+
+        Attributes
+        ----------
+        count : int
+            Number of catchments (N)
+        partial_area_fraction : numpy.ndarray
+            (N, buckets) partial area fraction of each bucket
+        depth_comp_capacity : numpy.ndarray
+            (N, buckets) depth capacity of each bucket
+        baseflow_index, surface_recession, baseflow_recession : numpy.ndarray
+            (N,) parameters of each catchment
+        buckets : numpy.ndarray
+            (N, buckets) quantity in each bucket
+        surface, base : numpy.ndarray
+            (N,) quantity in the surface and baseflow stores
+
+        Methods
+        -------
+        from_models(models)
+            Build an ensemble from a list of Awbm objects
+        runoff(precip, et)
+            Advance every catchment by one time step
+        run(precip, et)
+            Runoff for a whole series
+    """
+
+    def __init__(self, count=1, depth_capacity=(0.04, 0.15, 0.3),
+                 partial_area_fraction=(0.134, 0.433, 0.433),
+                 baseflow_index=0.658, surface_recession=0.869,
+                 baseflow_recession=0.309):
+        """Parameters are broadcast to all catchments so a scalar or a
+            single set of bucket values may be used for every catchment.
+        """
+        self.count = count
+        depth_capacity = np.asarray(depth_capacity, dtype=float)
+        self.depth_comp_capacity = np.array(np.broadcast_to(depth_capacity, (count, depth_capacity.shape[-1])))
+        self.partial_area_fraction = np.array(np.broadcast_to(partial_area_fraction,
+                                                              self.depth_comp_capacity.shape), dtype=float)
+        self.baseflow_index = np.array(np.broadcast_to(baseflow_index, count), dtype=float)
+        self.surface_recession = np.array(np.broadcast_to(surface_recession, count), dtype=float)
+        self.baseflow_recession = np.array(np.broadcast_to(baseflow_recession, count), dtype=float)
+        self.buckets = np.zeros(self.depth_comp_capacity.shape)
+        self.surface = np.zeros(count)
+        self.base = np.zeros(count)
+
+    @classmethod
+    def from_models(cls, models):
+        """Build an ensemble with the parameters and state of Awbm objects
+
+            Parameters
+            ----------
+            models : list of Awbm
+        """
+        ensemble = cls(len(models),
+                       [m.depth_comp_capacity for m in models],
+                       [m.partial_area_fraction for m in models],
+                       [m.baseflow_index for m in models],
+                       [m.surface_recession for m in models],
+                       [m.baseflow_recession for m in models])
+        ensemble.buckets[:] = [m.buckets.quantity for m in models]
+        ensemble.surface[:] = [m.surface.quantity for m in models]
+        ensemble.base[:] = [m.base.quantity for m in models]
+        return ensemble
+
+    @property
+    def bucket_capacity(self):
+        return self.partial_area_fraction * self.depth_comp_capacity
+
+    def runoff(self, precip, et):
+        """Advance every catchment by one time step
+
+            Parameters
+            ----------
+            precip, et : float or array[float]
+                Precipitation and effective ET [m], either one value for
+                all catchments or one value per catchment
+
+            Returns
+            -------
+            numpy.ndarray
+                (N,) runoff from each catchment [m] on a per unit area basis
+        """
+        return self._step(np.asarray(precip, dtype=float), np.asarray(et, dtype=float),
+                          self.bucket_capacity)
+
+    def run(self, precip, et):
+        """Runoff for a whole series
+
+            Parameters
+            ----------
+            precip, et : array[float]
+                Series of shape (T,) shared by all catchments or (T, N)
+                with a column per catchment
+
+            Returns
+            -------
+            numpy.ndarray
+                (T, N) runoff from each catchment
+        """
+        precip = np.asarray(precip, dtype=float)
+        et = np.asarray(et, dtype=float)
+        ec.check_equal_length(precip, et)
+        capacity = self.bucket_capacity
+        runoff = np.empty((len(precip), self.count))
+        for t in range(len(precip)):
+            runoff[t] = self._step(precip[t], et[t], capacity)
+        return runoff
+
+    def _step(self, precip, et, capacity):
+        if (precip < 0.0).any() or (et < 0.0).any():
+            raise ValueError('precip and et should be a positive')
+        fraction = self.partial_area_fraction
+        if precip.ndim:
+            precip = precip[:, np.newaxis]
+        if et.ndim:
+            et = et[:, np.newaxis]
+
+        # Buckets: same clip logic as StoreArray.apply
+        q = self.buckets + (fraction * precip - fraction * et)
+        overflow = np.where(q > capacity, q - capacity, 0.0).sum(axis=1)
+        self.buckets = np.maximum(np.minimum(q, capacity), 0.0)
+
+        to_baseflow = overflow * self.baseflow_index
+        to_surface = overflow * (1.0 - self.baseflow_index)
+
+        surface_out = (1.0 - self.surface_recession) * self.surface
+        q = self.surface + (to_surface - surface_out)
+        surface_out = np.where(q < 0.0, surface_out + q, surface_out)
+        self.surface = np.maximum(q, 0.0)
+
+        base_out = (1.0 - self.baseflow_recession) * self.base
+        q = self.base + (to_baseflow - base_out)
+        base_out = np.where(q < 0.0, base_out + q, base_out)
+        self.base = np.maximum(q, 0.0)
+
+        return surface_out + base_out
+
+
+def _awbm_kernel(precip, et, fractions, capacities, bucket_q, surface_q, base_q,
+                 baseflow_index, surface_recession, baseflow_recession):
+    """Time loop of Awbm.run using plain floats and lists.
+
+        Every expression is evaluated in the same order as Store.update
+        and StoreArray.apply so the result matches Awbm.runoff exactly.
+    """
+    n = len(fractions)
+    buckets = range(n)
+    bucket_q = list(bucket_q)
+    b_in = [0.0] * n
+    b_req = [0.0] * n
+    b_over = [0.0] * n
+    b_out = [0.0] * n
+    s_step = b_step = (0.0, 0.0, 0.0)
+    to_surface_fraction = 1.0 - baseflow_index
+    surface_k = 1.0 - surface_recession
+    base_k = 1.0 - baseflow_recession
+
+    runoff = []
+    bucket_trace = []
+    surface_trace = []
+    base_trace = []
+    for p, e in zip(precip, et):
+        overflow = 0.0
+        for i in buckets:
+            inflow = fractions[i] * p
+            request = fractions[i] * e
+            q = bucket_q[i] + (inflow - request)
+            cap = capacities[i]
+            if q > cap:
+                over = q - cap
+                q = cap
+            else:
+                over = 0.0
+            if q < 0.0:
+                b_out[i] = request + q
+                q = 0.0
+            else:
+                b_out[i] = request
+            bucket_q[i] = q
+            b_in[i] = inflow
+            b_req[i] = request
+            b_over[i] = over
+            overflow += over
+
+        to_baseflow = overflow * baseflow_index
+        to_surface = overflow * to_surface_fraction
+
+        request = surface_k * surface_q
+        surface_q += (to_surface - request)
+        if surface_q < 0.0:
+            surface_out = request + surface_q
+            surface_q = 0.0
+        else:
+            surface_out = request
+        s_step = (to_surface, request, surface_out)
+
+        request = base_k * base_q
+        base_q += (to_baseflow - request)
+        if base_q < 0.0:
+            base_out = request + base_q
+            base_q = 0.0
+        else:
+            base_out = request
+        b_step = (to_baseflow, request, base_out)
+
+        runoff.append(surface_out + base_out)
+        bucket_trace.extend(bucket_q)
+        surface_trace.append(surface_q)
+        base_trace.append(base_q)
+
+    return runoff, bucket_trace, surface_trace, base_trace, (b_in, b_req, b_over, b_out, s_step, b_step)
@@ -0,0 +1,223 @@
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+from validation import error_checks as ec
+from hydrology.awbm import AwbmEnsemble
+
+# AWBM parameters that can be swept and the number of values each one takes
+AWBM_PARAMETERS = {'baseflow_index': 1,
+                   'surface_recession': 1,
+                   'baseflow_recession': 1,
+                   'depth_comp_capacity': 3,
+                   'partial_area_fraction': 3}
+
+
+def nse(simulated, observed):
+    """Nash-Sutcliffe efficiency of one or more simulated series
+
+        Parameters
+        ----------
+        simulated : array[float]
+            (T,) series or (T, N) with one column per parameter set
+        observed : array[float]
+            (T,) observed series
+
+        Returns
+        -------
+        float or numpy.ndarray
+    """
+    simulated, observed = _align(simulated, observed)
+    sse = ((simulated - observed) ** 2).sum(axis=0)
+    return 1.0 - sse / ((observed - observed.mean()) ** 2).sum()
+
+
+def rmse(simulated, observed):
+    """Root mean square error of one or more simulated series"""
+    simulated, observed = _align(simulated, observed)
+    return np.sqrt(((simulated - observed) ** 2).mean(axis=0))
+
+
+def kge(simulated, observed):
+    """Kling-Gupta efficiency (Gupta et al. 2009) of one or more simulated series"""
+    simulated, observed = _align(simulated, observed)
+    r = (((simulated - simulated.mean(axis=0)) * (observed - observed.mean())).mean(axis=0)
+         / (simulated.std(axis=0) * observed.std()))
+    alpha = simulated.std(axis=0) / observed.std()
+    beta = simulated.mean(axis=0) / observed.mean()
+    return 1.0 - np.sqrt((r - 1.0) ** 2 + (alpha - 1.0) ** 2 + (beta - 1.0) ** 2)
+
+
+def _align(simulated, observed):
+    simulated = np.asarray(simulated, dtype=float)
+    observed = np.asarray(observed, dtype=float)
+    ec.check_equal_length(simulated, observed)
+    if simulated.ndim == 2:
+        observed = observed[:, np.newaxis]
+    return simulated, observed
+
+
+def parameter_grid(**values):
+    """Every combination of the values given for each parameter
+
+        Parameters
+        ----------
+        values : list
+            A list of values for each parameter to sweep. Values of
+            depth_comp_capacity and partial_area_fraction are lists of
+            3 floats.
+
+        Returns
+        -------
+        dict of numpy.ndarray
+            One array per parameter with an element (or row) per set
+
+        Example
+        -------
+        parameter_grid(baseflow_index=[0.3, 0.5, 0.7],
+                       surface_recession=np.linspace(0.5, 0.95, 10))
+    """
+    names = list(values)
+    combinations = list(itertools.product(*(values[name] for name in names)))
+    return {name: np.array([c[i] for c in combinations], dtype=float)
+            for i, name in enumerate(names)}
+
+
+def latin_hypercube(bounds, count, seed=None):
+    """Sample parameter sets with a Latin hypercube design
+
+        Parameters
+        ----------
+        bounds : dict
+            (lower, upper) bounds for each parameter. Bounds for
+            depth_comp_capacity are lists of 3 values for each bound.
+        count : int
+            Number of parameter sets
+        seed : int, optional
+            Seed for the random number generator
+
+        Returns
+        -------
+        dict of numpy.ndarray
+    """
+    rng = np.random.default_rng(seed)
+    samples = {}
+    for name, (lower, upper) in bounds.items():
+        lower = np.asarray(lower, dtype=float)
+        upper = np.asarray(upper, dtype=float)
+        columns = lower.size
+        strata = np.column_stack([rng.permutation(count) for i in range(columns)])
+        u = (strata + rng.uniform(size=(count, columns))) / count
+        values = lower.ravel() + u * (upper.ravel() - lower.ravel())
+        samples[name] = values if lower.ndim else values[:, 0]
+    return samples
+
+
+def sweep(parameters, precip, et, observed, area=1.0, warmup=0, workers=None, chunk_size=2000):
+    """Evaluate many AWBM parameter sets against an observed flow series
+
+        The parameter sets are split into chunks and each chunk is run as
+        one AwbmEnsemble, so every set in a chunk is advanced with the
+        same vectorized step. Only running sums are kept while the model
+        runs so memory does not grow with the length of the series.
+        Chunks are shared out over a process pool when more than one
+        worker is requested.
+
+        Parameters
+        ----------
+        parameters : dict of array
+            Values for each parameter set, for example from
+            parameter_grid() or latin_hypercube(). Parameters not given
+            take the Awbm default.
+        precip, et : array[float]
+            (T,) precipitation and effective ET series [m]
+        observed : array[float]
+            (T,) observed flow series
+        area : float
+            Simulated runoff depth is multiplied by this to compare with
+            the observed flow
+        warmup : int
+            Number of time steps run before the metrics are accumulated
+        workers : int, optional
+            Number of worker processes. None or 1 runs in this process.
+        chunk_size : int
+            Number of parameter sets evaluated together
+
+        Returns
+        -------
+        DataFrame
+            One row per parameter set with the parameter values and the
+            nse, kge and rmse of the simulated flow
+    """
+    parameters = {name: np.asarray(value, dtype=float) for name, value in parameters.items()}
+    for name in parameters:
+        if name not in AWBM_PARAMETERS:
+            raise ValueError(name + ' is not an AWBM parameter')
+    counts = {len(value) for value in parameters.values()}
+    if len(counts) != 1:
+        raise ValueError('Every parameter needs the same number of sets')
+    count = counts.pop()
+
+    precip = np.asarray(precip, dtype=float)
+    et = np.asarray(et, dtype=float)
+    observed = np.asarray(observed, dtype=float)
+    ec.check_equal_length(precip, et)
+    ec.check_equal_length(precip, observed)
+
+    tasks = [({name: value[start:start + chunk_size] for name, value in parameters.items()},
+              precip, et, observed, area, warmup)
+             for start in range(0, count, chunk_size)]
+    if workers is None or workers == 1:
+        results = [_evaluate_chunk(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_evaluate_chunk, tasks))
+
+    table = {}
+    for name, value in parameters.items():
+        if value.ndim == 1:
+            table[name] = value
+        else:
+            for i in range(value.shape[1]):
+                table[name + '_' + str(i + 1)] = value[:, i]
+    for metric in ('nse', 'kge', 'rmse'):
+        table[metric] = np.concatenate([r[metric] for r in results]) if results else np.zeros(0)
+    return pd.DataFrame(table)
+
+
+def _evaluate_chunk(task):
+    """Run one chunk of parameter sets and return their metrics."""
+    parameters, precip, et, observed, area, warmup = task
+    kwargs = dict(parameters)
+    if 'depth_comp_capacity' in kwargs:
+        kwargs['depth_capacity'] = kwargs.pop('depth_comp_capacity')
+    count = len(next(iter(parameters.values())))
+    ensemble = AwbmEnsemble(count, **kwargs)
+
+    for t in range(warmup):
+        ensemble.runoff(precip[t], et[t])
+
+    s1 = np.zeros(count)
+    s2 = np.zeros(count)
+    so = np.zeros(count)
+    sse = np.zeros(count)
+    for t in range(warmup, len(precip)):
+        q = ensemble.runoff(precip[t], et[t]) * area
+        s1 += q
+        s2 += q * q
+        so += q * observed[t]
+        sse += (q - observed[t]) ** 2
+
+    obs = observed[warmup:]
+    n = len(obs)
+    obs_mean = obs.mean()
+    obs_std = obs.std()
+    sim_mean = s1 / n
+    sim_std = np.sqrt(np.maximum(s2 / n - sim_mean ** 2, 0.0))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        r = (so / n - sim_mean * obs_mean) / (sim_std * obs_std)
+        kge_value = 1.0 - np.sqrt((r - 1.0) ** 2 + (sim_std / obs_std - 1.0) ** 2
+                                  + (sim_mean / obs_mean - 1.0) ** 2)
+    return {'nse': 1.0 - sse / ((obs - obs_mean) ** 2).sum(),
+            'kge': kge_value,
+            'rmse': np.sqrt(sse / n)}
@@ -1,20 +1,65 @@
 import math
+import numpy as np
 # This is the Sacramento Soil Moisture Accounting Model implemented in Python
 
+# Order of the storages in the state vector
+STATE_NAMES = ('uztwc', 'uzfwc', 'lztwc', 'lzfsc', 'lzfpc', 'adimc')
+
+# Order of the parameters passed to the time step kernel
+PARAM_NAMES = ('uztwm', 'uzfwm', 'lztwm', 'lzfpm', 'lzfsm', 'uzk', 'lzpk', 'lzsk',
+               'zperc', 'rexp', 'pfree', 'pctim', 'adimp', 'riva', 'side', 'rserv')
+
+
+class StateMap:
+    """Descriptor that maps a named storage onto an element of the state vector"""
+    def __init__(self, index):
+        self.index = index
+
+    def __get__(self, obj, typ):
+        if obj is None:
+            return self
+        return float(obj.state[self.index])
+
+    def __set__(self, obj, value):
+        obj.state[self.index] = value
+
 
 class Sacramento:
+    """Sacramento Soil Moisture Accounting (SAC-SMA) model
+
+        The six soil moisture storages are held in one float64 state
+        vector so that a whole series can be run by a kernel that keeps
+        everything in local variables. The storages are still available
+        by name (i.e. s.uztwc) as views of the state vector.
+
+        Attributes
+        ----------
+        state : numpy.ndarray
+            Storage contents in the order of STATE_NAMES [mm]
+        tci : float
+            Total channel inflow for the last time interval [mm]
+
+        Methods
+        -------
+        update(p, et)
+            Advance the model by one time interval
+        run(p, pet)
+            Run the model over whole precipitation and ET series
+    """
     # Class constants
     DT = 1.0        # Length of time interval in days
     IFRZE = False       # Flag to incorporate frost calculations. True = use calculations
+
+    uztwc = StateMap(0)     # Upper zone tension water storage
+    uzfwc = StateMap(1)     # Upper zone free water storage
+    lztwc = StateMap(2)     # Lower zone tension water storage
+    lzfsc = StateMap(3)     # Lower zone supplementary free water storage
+    lzfpc = StateMap(4)     # Lower zone primary free water storage
+    adimc = StateMap(5)     # Additional impervious area storage
     
     def __init__(self, init_state, params, globals):
         # Initial values of state variables
-        self.uztwc = init_state['uztwc']    # Upper zone tension water storage
-        self.uzfwc = init_state['uzfwc']    # Upper zone free water storage
-        self.lztwc = init_state['lztwc']    # Lower zone tension water storage
-        self.lzfsc = init_state['lzfsc']    # Lower zone supplementary free water storage
-        self.lzfpc = init_state['lzfpc']    # Upper zone primary free water storage
-        self.adimc = init_state['adimc']    # Additional impervious area storage
+        self.state = np.array([init_state[name] for name in STATE_NAMES], dtype=float)
         self.fgix = 0.0                     # Initial value of the frost index, units of Cdeg
 
         # Params yet to be incorporated:
@@ -54,16 +99,18 @@ class Sacramento:
         self.rserv = params['rserv']  # Fraction of lower zone free water not transferrable (decimal fraction)
 
         self.pxv = globals['pxv']  # Precip for the time interval
-        self.lwe = globals['lwe']
-        self.we = globals['we']
-        self.isc = globals['isc']
-        self.aesc = globals['aesc']
+        self.lwe = globals.get('lwe', 0.0)
+        self.we = globals.get('we', 0.0)
+        self.isc = globals.get('isc', 0.0)
+        self.aesc = globals.get('aesc', 0.0)
 
         self.roimp = 0.0
         self.lzdefr = 0.0
         self.fr = 0.0
         self.fi = 0.0
 
+        self.sdro = 0.0
+        self.ssur = 0.0
         self.sif = 0.0
         self.sperc = 0.0
         self.spbf = 0.0
@@ -76,283 +123,80 @@ class Sacramento:
         
         self.bf = 0.0                   # baseflow
 
+    @property
+    def params(self):
+        """Parameters in the order of PARAM_NAMES"""
+        return tuple(getattr(self, name) for name in PARAM_NAMES)
+
     def update(self, p, et):
-        # Carryover state variables and update runoff amounts
-        self.evapotrans(et)
-        return None
-    
-    def evapotrans(self, ep):
-        """Compute evapotranspiration loss for the time interval."""
-        # epdist = list(range(0, 24))
-        # edmnd is the et-demand for the time interval
-        edmnd = ep      # * epdist[self.kint] --this was removed for constant ep over the day
-        
-        # Compute ET from the upper zone
-        e1 = edmnd * (self.uztwc / self.uztwm)
-        
-        # Residual evaporation demand
-        red = edmnd - e1
-        
-        self.uztwc -= e1
-        
-        if self.uztwc < 0.0:
-            e1 += self.uztwc
-            self.uztwc = 0.0
-            red = edmnd - e1
-            
-        if self.uzfwc < red:
-            e2 = self.uzfwc
-            self.uzfwc = 0.0
-            red -= e2
-        else:
-            e2 = red
-            self.uzfwc -= e2
-            red = 0.0
-
-            if (self.uztwc / self.uztwm) < (self.uzfwc / self.uzfwm):
-                uzrat = (self.uztwc + self.uzfwc) / (self.uztwm + self.uzfwm)
-                self.uztwc = self.uztwm * uzrat
-                self.uzfwc = self.uzfwm * uzrat
-        
-        if self.uztwc < 0.00001:
-            self.uztwc = 0.0
-        if self.uzfwc < 0.00001:
-            self.uzfwc = 0.0
-            
-        # Compute ET from lower zone
-        e3 = red * (self.lztwc / (self.uztwm + self.lztwm))
-        self.lztwc -= e3
-        if self.lztwc < 0.0:
-            e3 += self.lztwc
-            self.lztwc = 0.0
-        ratlzt = self.lztwc / self.lztwm
-        ratlz = (self.lztwc + self.lzfpc + self.lzfsc) / (self.lztwm + self.lzfpm + self.lzfsm)
-        if ratlzt < ratlz:
-            delivery = (ratlz - ratlzt) * self.lztwm
-            self.lztwc += delivery
-            self.lzfsc -= delivery
-            if self.lzfsc < 0.0:
-                self.lzfpc += self.lzfsc
-                self.lzfsc = 0.0
-        if self.lztwc < 0.00001:
-            self.lztwc = 0.0
-            
-        e5 = e1 + (red + e2) * ((self.adimc - e1 - self.uztwc) / (self.uztwm + self.lztwm))
-        self.adimc -= e5
-        if self.adimc < 0.0:
-            e5 += self.adimc
-            self.adimc = 0.0
-        e5 *= self.adimp
-        
-        # Compute percolation and runoff amounts
-        twx = self.pxv + self.uztwc - self.uztwm
-        if twx < 0.0:
-            self.uztwc += self.pxv
-            twx = 0.0
-        else:
-            self.uztwc = self.uztwm
-        self.adimc += self.pxv - twx
-        
-        # Compute impervious area runoff
-        self.roimp = self.pxv * self.pctim
-        self.runoff(twx)
+        """Advance the model by one time interval
 
-        # compute sums and adjust runoff amounts by the area over which they are generated.
-        eused = e1 + e2 + e3
-        # eused is the et from parea which is 1.0-adimp-pctim
-        parea = 1.0 - self.adimp - self.pctim
-        self.sif *= parea
-        # Separate channel component of baseflow from the non-channel component
-        tbf = bf * parea
-        # tbf is total baseflow
-        bfcc = tbf * (1.0 / (1.0 + self.side))
-        # bfcc is baseflow, channel component
-        bfp = self.spbf * parea / (1.0 + self.side)
-        bfs = bfcc - bfp
-        bfs = max(bfs, 0.0)
-        bfncc = tbf - bfcc
-        # bfncc is baseflow,non-channel component
-
-        # compute total channel inflow for the time interval.
-        self.tci = self.roimp + self.addro + self.ssur + self.sif + bfcc
-
-        # compute e4-et from riparian vegetation.
-        e4 = (edmnd - eused) * self.riva
-
-        # subtract e4 from channel inflow
-        self.tci -= e4
-        if self.tci < 0.0:
-            e4 += self.tci
-            self.tci = 0.0
-
-        # compute total evapotranspiration - tet
-        eused = eused * parea
-        tet = eused + e5 + e4
+            Parameters
+            ----------
+            p : float
+                Precipitation for the time interval [mm]
+            et : float
+                ET-demand for the time interval [mm]
+
+            Returns
+            -------
+            tci : float
+                Total channel inflow for the time interval [mm]
+        """
+        self.pxv = p
+        state = self.state.tolist()
+        out = sacramento_step(state, self.params, p, et, self.DT)
+        self.state[:] = state
+        (self.tci, self.roimp, self.sdro, self.ssur, self.sif, self.bf,
+         self.sperc, self.spbf, e1, e3, e4, e5, tet) = out
         self.sett += tet
-        self.se1 += e1 * parea
-        self.se3 += e3 * parea
+        self.se1 += e1
+        self.se3 += e3
         self.se4 += e4
         self.se5 += e5
-        # check that adimc >= uztwc
-        self.adimc = max(self.uztwc, self.adimc)
-    
-    def runoff(self, twx):
-        
-        # Initialize time interval sums
-        self.sif = 0.0
-        self.sperc = 0.0
-        self.spbf = 0.0
-        
-        # Determine computational time increment for the basic time interval
-        ninc = 1.0 + 0.2 * (self.uzfwc + twx)
-        # ninc = number of time increments that the time interval is divided into for further
-        # soil-moisture accounting. No one increment will exceed 5.0 millimeters of uzfwc+pav
-        dinc = (1.0 / ninc) * self.DT
-        # dinc = length of each increment in days
-        pinc = twx / ninc
-        # pinc = Amount of available moisture for each increment. Compute free water depletion
-        # fractions for the time increment being used-basic depletions are for one day
-        duz = 1.0 - ((1.0 - self.uzk)**dinc)
-        dlzp = 1.0 - ((1.0 - self.lzpk)**dinc)
-        dlzs = 1.0 - ((1.0 - self.lzsk)**dinc)
-        
-        # Start incremental do loop for the time interval.
-        for i in range(int(ninc)):
-            adsur = 0.0
-            # Compute direct runoff (from adimp area)
-            ratio = (self.adimc - self.uztwc) / self.lztwm
-            if ratio < 0.0:
-                ratio = 0.0
-            addro = pinc * ratio**2
-            # addro is the amount of direct runoff from the area adimp
-            
-        bf = self.baseflow(dlzp, dlzs)
-
-    def baseflow(self, dlzp, dlzs):
-        # Compute baseflow
-        bf = self.lzfpc * dlzp
-        self.lzfpc -= bf
-        if self.lzfpc <= 0.0001:
-            bf += self.lzfpc
-            self.lzfpc = 0.0
-
-        self.spbf += bf
-        bf = self.lzfsc * dlzs
-        self.lzfsc -= bf
-        if self.lzfsc <= 0.0001:
-            bf += self.lzfsc
-            self.lzfsc = 0.0
-        return bf
-        
-        # Compute percolation-if no water available then skip
-        if pinc + self.uzfwc <= 0.01:
-            self.uzfwc += pinc
-        else:
-            self.percolation(dlzp, dlzs, duz, pinc, addro, adsur)
-
-        # Distribute pinc between uzfwc and surface runoff.
-        if pinc != 0.0:
-            # Check if pinc exceeds uzfwm
-            if (pinc + self.uzfwc) <= self.uzfwm:
-                # No surface runoff
-                self.uzfwc = self.uzfwc + pinc
-            else:
-                #
-                #     compute surface runoff (sur) and keep track of time interval sum.
-                sur = pinc + self.uzfwc - self.uzfwm
-                self.uzfwc = self.uzfwm
-                # self.ssur += sur * self.parea -- I removed cumulative since time step is always 1 day
-                adsur = sur * (
-                            1.0 - addro / pinc)  # adsur is the amount of surface runoff which comes from that portion of adimp which is not  # currently generating direct runoff.  addro/pinc is the fraction of adimp currently generating  # direct runoff.  # self.ssur += adsur * self.adimp -- I removed cumulative since time step is always 1 day  # adimp area water balance -- sdro is the 6 hr sum of direct runoff.
-
-        self.adimc = self.adimc + pinc - addro - adsur
-        if self.adimc > self.uztwm + self.lztwm:
-            addro = addro + self.adimc - (self.uztwm + self.lztwm)
-            self.adimc = self.uztwm + self.lztwm
-        self.sdro += addro * self.adimp
-        if self.adimc < 0.00001:
-            self.adimc = 0.0
-
-        # compute new frost index and moisture transfer.
-        if self.IFRZE:
-            self.frost1(self.pxv, sur, addro, self.lwe, self.we, self.isc, self.aesc)
-            
-    def percolation(self, dlzp, dlzs, duz, pinc, addro, adsur):
-        percm = self.lzfpm * dlzp + self.lzfsm * dlzs
-        perc = percm * (self.uzfwc / self.uzfwm)
-        defr = 1.0 - ((self.lztwc + self.lzfpc + self.lzfsc) / (self.lztwm + self.lzfpm + self.lzfsm))
-        #     defr is the lower zone moisture deficiency ratio
-        self.fr = 1.0
-        #     fr is the change in percolation withdrawal due to frozen ground.
-        self.fi = 1.0
-        #     fi is the change in interflow withdrawal due to frozen ground.
-        if self.IFRZE:
-            uzdefr = 1.0 - ((self.uztwc + self.uzfwc) / (self.uztwm + self.uzfwm))
-            self.fgfr1()
-        
-        perc = perc * (1.0 + self.zperc * (defr ** self.rexp)) * self.fr
-        #     note...percolation occurs from uzfwc before pav is added.
-        if perc >= self.uzfwc:
-            # Percolation rate exceeds uzfwc.
-            perc = self.uzfwc
-        # Percolation rate is less than uzfwc.
-        self.uzfwc = self.uzfwc - perc
-        #     check to see if percolation exceeds lower zone deficiency.
-        check = self.lztwc + self.lzfpc + self.lzfsc + perc - self.lztwm - self.lzfpm - self.lzfsm
-        if check > 0.0:
-            perc = perc - check
-            self.uzfwc += check
-
-        self.sperc += perc
-        #     sperc is the time interval summation of perc
-        #
-        #     compute interflow and keep track of time interval sum.
-        #     note...pinc has not yet been added
-        delivery = self.uzfwc * duz * self.fi
-        self.sif += delivery
-        self.uzfwc = self.uzfwc - delivery
-        # Distribute percolated water into the lower zones
-        # Tension water must be filled first except for the pfree area.
-        # perct is percolation to tension water and percf is percolation going to free water.
-        perct = perc * (1.0 - self.pfree)
-        if (perct + self.lztwc) <= self.lztwm:
-            self.lztwc = self.lztwc + perct
-            percf = 0.0
-        else:
-            percf = perct + self.lztwc - self.lztwm
-            self.lztwc = self.lztwm
-        #
-        #      distribute percolation in excess of tension
-        #      requirements among the free water storages.
-        percf = percf + perc * self.pfree
-        if percf != 0.0:
-            hpl = self.lzfpm / (self.lzfpm + self.lzfsm)
-            #     hpl is the relative size of the primary storage
-            #     as compared with total lower zone free water storage.
-            ratlp = self.lzfpc / self.lzfpm
-            ratls = self.lzfsc / self.lzfsm
-            #     ratlp and ratls are content to capacity ratios, or
-            #     in other words, the relative fullness of each storage
-            fracp = (hpl * 2.0 * (1.0 - ratlp)) / ((1.0 - ratlp) + (1.0 - ratls))
-            #     fracp is the fraction going to primary.
-            fracp = min(fracp, 1.0)
-            percp = percf * fracp
-            percs = percf - percp
-            # percp and percs are the amount of the excess percolation going to primary
-            # and supplemental storges, respectively.
-            self.lzfsc += percs
-            if self.lzfsc > self.lzfsm:
-                percs = percs - self.lzfsc + self.lzfsm
-                self.lzfsc = self.lzfsm
-            self.lzfpc = self.lzfpc + (percf - percs)
-            # Check to make sure lzfpc does not exceed lzfpm.
-            if self.lzfpc > self.lzfpm:
-                excess = self.lzfpc - self.lzfpm
-                self.lztwc = self.lztwc + excess
-                self.lzfpc = self.lzfpm
-            
-        
-    
+        return self.tci
+
+    def run(self, p, pet):
+        """Run the model over whole precipitation and ET-demand series
+
+            Gives the same result as calling update() for each time
+            interval. The state vector holds the final state afterwards.
+
+            Parameters
+            ----------
+            p, pet : array[float]
+                Precipitation and ET-demand for each time interval [mm]
+
+            Returns
+            -------
+            tci : numpy.ndarray
+                Total channel inflow for each time interval [mm]
+            states : numpy.ndarray
+                (time intervals, 6) storages at the end of each interval
+        """
+        p = np.asarray(p, dtype=float)
+        pet = np.asarray(pet, dtype=float)
+        if len(p) != len(pet):
+            raise ValueError("The new array size is different from the old.")
+
+        params = self.params
+        dt = self.DT
+        state = self.state.tolist()
+        tci = []
+        states = []
+        out = None
+        for pxv, edmnd in zip(p.tolist(), pet.tolist()):
+            out = sacramento_step(state, params, pxv, edmnd, dt)
+            tci.append(out[0])
+            states.extend(state)
+
+        self.state[:] = state
+        if out is not None:
+            self.pxv = p[-1]
+            (self.tci, self.roimp, self.sdro, self.ssur, self.sif, self.bf,
+             self.sperc, self.spbf) = out[:8]
+        return np.array(tci), np.array(states).reshape(len(tci), len(STATE_NAMES))
+
     def fgfr1(self):
         # Compute the change in the percolation and interflow withdrawal rates due to frozen ground.
         # The following vars are references to items from an array that I still need to find.
@@ -425,3 +269,566 @@ class Sacramento:
                 findx = findx + c * ta + ghc
         
         return max(findx, 0.0)
+
+
+def sacramento_step(state, params, pxv, edmnd, dt=1.0):
+    """Advance the SAC-SMA storages by one time interval
+
+        This is the kernel used by Sacramento.update and Sacramento.run.
+        Everything is held in local variables, so the incremental loop
+        does no attribute or dictionary lookups. Frozen ground is not
+        modelled (IFRZE = False).
+
+        Parameters
+        ----------
+        state : list of float
+            Storages in the order of STATE_NAMES. Updated in place.
+        params : tuple of float
+            Parameters in the order of PARAM_NAMES
+        pxv : float
+            Precipitation for the time interval [mm]
+        edmnd : float
+            ET-demand for the time interval [mm]
+        dt : float
+            Length of the time interval in days
+
+        Returns
+        -------
+        tuple of float
+            tci, roimp, sdro, ssur, sif, bfcc, sperc, spbf and the area
+            weighted e1, e3, e4, e5 and total ET for the time interval
+    """
+    uztwc, uzfwc, lztwc, lzfsc, lzfpc, adimc = state
+    (uztwm, uzfwm, lztwm, lzfpm, lzfsm, uzk, lzpk, lzsk,
+     zperc, rexp, pfree, pctim, adimp, riva, side, rserv) = params
+    saved = rserv * (lzfpm + lzfsm)
+    parea = 1.0 - adimp - pctim
+
+    # Compute ET from the upper zone
+    e1 = edmnd * (uztwc / uztwm)
+    # Residual evaporation demand
+    red = edmnd - e1
+    uztwc -= e1
+    if uztwc < 0.0:
+        e1 += uztwc
+        uztwc = 0.0
+        red = edmnd - e1
+
+    if uzfwc < red:
+        e2 = uzfwc
+        uzfwc = 0.0
+        red -= e2
+    else:
+        e2 = red
+        uzfwc -= e2
+        red = 0.0
+        if (uztwc / uztwm) < (uzfwc / uzfwm):
+            uzrat = (uztwc + uzfwc) / (uztwm + uzfwm)
+            uztwc = uztwm * uzrat
+            uzfwc = uzfwm * uzrat
+
+    if uztwc < 0.00001:
+        uztwc = 0.0
+    if uzfwc < 0.00001:
+        uzfwc = 0.0
+
+    # Compute ET from lower zone
+    e3 = red * (lztwc / (uztwm + lztwm))
+    lztwc -= e3
+    if lztwc < 0.0:
+        e3 += lztwc
+        lztwc = 0.0
+    ratlzt = lztwc / lztwm
+    ratlz = (lztwc + lzfpc + lzfsc - saved) / (lztwm + lzfpm + lzfsm - saved)
+    if ratlzt < ratlz:
+        delivery = (ratlz - ratlzt) * lztwm
+        lztwc += delivery
+        lzfsc -= delivery
+        if lzfsc < 0.0:
+            lzfpc += lzfsc
+            lzfsc = 0.0
+    if lztwc < 0.00001:
+        lztwc = 0.0
+
+    # Compute ET from the adimp area
+    e5 = e1 + (red + e2) * ((adimc - e1 - uztwc) / (uztwm + lztwm))
+    adimc -= e5
+    if adimc < 0.0:
+        e5 += adimc
+        adimc = 0.0
+    e5 *= adimp
+
+    # Compute percolation and runoff amounts
+    twx = pxv + uztwc - uztwm
+    if twx < 0.0:
+        uztwc += pxv
+        twx = 0.0
+    else:
+        uztwc = uztwm
+    adimc += pxv - twx
+
+    # Compute impervious area runoff
+    roimp = pxv * pctim
+
+    # Initialize time interval sums
+    sbf = 0.0
+    ssur = 0.0
+    sif = 0.0
+    sperc = 0.0
+    sdro = 0.0
+    spbf = 0.0
+
+    # Determine computational time increment for the basic time interval
+    # ninc = number of time increments that the time interval is divided into for further
+    # soil-moisture accounting. No one increment will exceed 5.0 millimeters of uzfwc+pav
+    ninc = int(1.0 + 0.2 * (uzfwc + twx))
+    # dinc = length of each increment in days
+    dinc = (1.0 / ninc) * dt
+    # pinc = Amount of available moisture for each increment. Compute free water depletion
+    # fractions for the time increment being used-basic depletions are for one day
+    pinc = twx / ninc
+    duz = 1.0 - ((1.0 - uzk) ** dinc)
+    dlzp = 1.0 - ((1.0 - lzpk) ** dinc)
+    dlzs = 1.0 - ((1.0 - lzsk) ** dinc)
+    percm = lzfpm * dlzp + lzfsm * dlzs
+    lz_capacity = lztwm + lzfpm + lzfsm
+    hpl = lzfpm / (lzfpm + lzfsm)
+    adimc_max = uztwm + lztwm
+
+    # Start incremental do loop for the time interval.
+    for i in range(ninc):
+        adsur = 0.0
+        # Compute direct runoff (from adimp area)
+        ratio = (adimc - uztwc) / lztwm
+        if ratio < 0.0:
+            ratio = 0.0
+        # addro is the amount of direct runoff from the area adimp
+        addro = pinc * ratio ** 2
+
+        # Compute baseflow and keep track of time interval sum
+        bf = lzfpc * dlzp
+        lzfpc -= bf
+        if lzfpc <= 0.0001:
+            bf += lzfpc
+            lzfpc = 0.0
+        sbf += bf
+        spbf += bf
+        bf = lzfsc * dlzs
+        lzfsc -= bf
+        if lzfsc <= 0.0001:
+            bf += lzfsc
+            lzfsc = 0.0
+        sbf += bf
+
+        # Compute percolation-if no water available then skip
+        if pinc + uzfwc <= 0.01:
+            uzfwc += pinc
+        else:
+            perc = percm * (uzfwc / uzfwm)
+            # defr is the lower zone moisture deficiency ratio
+            defr = 1.0 - ((lztwc + lzfpc + lzfsc) / lz_capacity)
+            perc = perc * (1.0 + zperc * (defr ** rexp))
+            # note...percolation occurs from uzfwc before pav is added.
+            if perc >= uzfwc:
+                # Percolation rate exceeds uzfwc.
+                perc = uzfwc
+            uzfwc -= perc
+            # check to see if percolation exceeds lower zone deficiency.
+            check = lztwc + lzfpc + lzfsc + perc - lz_capacity
+            if check > 0.0:
+                perc -= check
+                uzfwc += check
+            # sperc is the time interval summation of perc
+            sperc += perc
+
+            # compute interflow and keep track of time interval sum.
+            # note...pinc has not yet been added
+            delivery = uzfwc * duz
+            sif += delivery
+            uzfwc -= delivery
+
+            # Distribute percolated water into the lower zones
+            # Tension water must be filled first except for the pfree area.
+            # perct is percolation to tension water and percf is percolation going to free water.
+            perct = perc * (1.0 - pfree)
+            if (perct + lztwc) <= lztwm:
+                lztwc += perct
+                percf = 0.0
+            else:
+                percf = perct + lztwc - lztwm
+                lztwc = lztwm
+
+            # distribute percolation in excess of tension
+            # requirements among the free water storages.
+            percf += perc * pfree
+            if percf != 0.0:
+                # ratlp and ratls are content to capacity ratios, or
+                # in other words, the relative fullness of each storage
+                ratlp = lzfpc / lzfpm
+                ratls = lzfsc / lzfsm
+                # fracp is the fraction going to primary.
+                fracp = (hpl * 2.0 * (1.0 - ratlp)) / ((1.0 - ratlp) + (1.0 - ratls))
+                if fracp > 1.0:
+                    fracp = 1.0
+                # percp and percs are the amount of the excess percolation going to primary
+                # and supplemental storges, respectively.
+                percp = percf * fracp
+                percs = percf - percp
+                lzfsc += percs
+                if lzfsc > lzfsm:
+                    percs = percs - lzfsc + lzfsm
+                    lzfsc = lzfsm
+                lzfpc += percf - percs
+                # Check to make sure lzfpc does not exceed lzfpm.
+                if lzfpc > lzfpm:
+                    excess = lzfpc - lzfpm
+                    lztwc += excess
+                    lzfpc = lzfpm
+
+            # Distribute pinc between uzfwc and surface runoff.
+            if pinc != 0.0:
+                # Check if pinc exceeds uzfwm
+                if (pinc + uzfwc) <= uzfwm:
+                    # No surface runoff
+                    uzfwc += pinc
+                else:
+                    # compute surface runoff (sur) and keep track of time interval sum.
+                    sur = pinc + uzfwc - uzfwm
+                    uzfwc = uzfwm
+                    ssur += sur * parea
+                    # adsur is the amount of surface runoff which comes from that portion of adimp
+                    # which is not currently generating direct runoff. addro/pinc is the fraction
+                    # of adimp currently generating direct runoff.
+                    adsur = sur * (1.0 - addro / pinc)
+                    ssur += adsur * adimp
+
+        # adimp area water balance -- sdro is the sum of direct runoff.
+        adimc += pinc - addro - adsur
+        if adimc > adimc_max:
+            addro += adimc - adimc_max
+            adimc = adimc_max
+        sdro += addro * adimp
+        if adimc < 0.00001:
+            adimc = 0.0
+
+    # compute sums and adjust runoff amounts by the area over which they are generated.
+    # eused is the et from parea which is 1.0-adimp-pctim
+    eused = e1 + e2 + e3
+    sif *= parea
+    # Separate channel component of baseflow from the non-channel component
+    # tbf is total baseflow
+    tbf = sbf * parea
+    # bfcc is baseflow, channel component
+    bfcc = tbf * (1.0 / (1.0 + side))
+
+    # compute total channel inflow for the time interval.
+    tci = roimp + sdro + ssur + sif + bfcc
+
+    # compute e4-et from riparian vegetation.
+    e4 = (edmnd - eused) * riva
+
+    # subtract e4 from channel inflow
+    tci -= e4
+    if tci < 0.0:
+        e4 += tci
+        tci = 0.0
+
+    # compute total evapotranspiration - tet
+    eused *= parea
+    tet = eused + e5 + e4
+
+    # check that adimc >= uztwc
+    if adimc < uztwc:
+        adimc = uztwc
+
+    state[:] = (uztwc, uzfwc, lztwc, lzfsc, lzfpc, adimc)
+    return tci, roimp, sdro, ssur, sif, bfcc, sperc, spbf, e1 * parea, e3 * parea, e4, e5, tet
+
+
+class SacramentoEnsemble:
+    """Many SAC-SMA basins or parameter sets advanced in lockstep
+
+        Parameters and storages for M members are held as arrays and every
+        equation of sacramento_step is applied to all members at once.
+        Each member may need a different number of increments (ninc) in a
+        time interval, so the increment loop runs up to the largest ninc
+        and members that have finished are masked out of the update.
+
+        Attributes
+        ----------
+        count : int
+            Number of members (M)
+        state : numpy.ndarray
+            (M, 6) storages in the order of STATE_NAMES [mm]
+        params : dict of numpy.ndarray
+            (M,) values for each name in PARAM_NAMES
+        tci : numpy.ndarray
+            (M,) total channel inflow for the last time interval [mm]
+
+        Methods
+        -------
+        from_models(models)
+            Build an ensemble from a list of Sacramento objects
+        update(p, et)
+            Advance every member by one time interval
+        run(p, pet)
+            Run every member over whole series
+    """
+    DT = Sacramento.DT
+
+    def __init__(self, init_state, params, count=1):
+        """
+            Parameters
+            ----------
+            init_state : dict
+                Initial storages by name, a scalar or an (M,) array each
+            params : dict
+                Parameters by name, a scalar or an (M,) array each
+            count : int
+                Number of members (M)
+        """
+        self.count = count
+        self.state = np.column_stack([np.broadcast_to(np.asarray(init_state[name], dtype=float), count)
+                                      for name in STATE_NAMES])
+        self.params = {name: np.array(np.broadcast_to(np.asarray(params[name], dtype=float), count))
+                       for name in PARAM_NAMES}
+        self.tci = np.zeros(count)
+
+    @classmethod
+    def from_models(cls, models):
+        """Build an ensemble with the parameters and state of Sacramento objects
+
+            Parameters
+            ----------
+            models : list of Sacramento
+        """
+        init_state = {name: [m.state[i] for m in models] for i, name in enumerate(STATE_NAMES)}
+        params = {name: [getattr(m, name) for m in models] for name in PARAM_NAMES}
+        return cls(init_state, params, len(models))
+
+    def update(self, p, et):
+        """Advance every member by one time interval
+
+            Parameters
+            ----------
+            p, et : float or array[float]
+                Precipitation and ET-demand [mm], either one value for all
+                members or an (M,) array
+
+            Returns
+            -------
+            numpy.ndarray
+                (M,) total channel inflow for the time interval [mm]
+        """
+        pxv = np.broadcast_to(np.asarray(p, dtype=float), self.count)
+        edmnd = np.broadcast_to(np.asarray(et, dtype=float), self.count)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.tci = self._step(pxv, edmnd)
+        return self.tci
+
+    def run(self, p, pet):
+        """Run every member over whole precipitation and ET-demand series
+
+            Parameters
+            ----------
+            p, pet : array[float]
+                Series of shape (T,) shared by all members or (T, M)
+
+            Returns
+            -------
+            numpy.ndarray
+                (T, M) total channel inflow [mm]
+        """
+        p = np.asarray(p, dtype=float)
+        pet = np.asarray(pet, dtype=float)
+        if len(p) != len(pet):
+            raise ValueError("The new array size is different from the old.")
+        tci = np.empty((len(p), self.count))
+        for t in range(len(p)):
+            tci[t] = self.update(p[t], pet[t])
+        return tci
+
+    def _step(self, pxv, edmnd):
+        """Vectorized form of sacramento_step. Each branch of the scalar
+            kernel is evaluated for every member and selected with np.where."""
+        where = np.where
+        uztwc, uzfwc, lztwc, lzfsc, lzfpc, adimc = self.state.T
+        prm = self.params
+        uztwm, uzfwm, lztwm = prm['uztwm'], prm['uzfwm'], prm['lztwm']
+        lzfpm, lzfsm = prm['lzfpm'], prm['lzfsm']
+        zperc, rexp, pfree = prm['zperc'], prm['rexp'], prm['pfree']
+        pctim, adimp = prm['pctim'], prm['adimp']
+        saved = prm['rserv'] * (lzfpm + lzfsm)
+        parea = 1.0 - adimp - pctim
+
+        # Compute ET from the upper zone
+        e1 = edmnd * (uztwc / uztwm)
+        red = edmnd - e1
+        uztwc = uztwc - e1
+        neg = uztwc < 0.0
+        e1 = where(neg, e1 + uztwc, e1)
+        uztwc = where(neg, 0.0, uztwc)
+        red = where(neg, edmnd - e1, red)
+
+        short = uzfwc < red
+        e2 = where(short, uzfwc, red)
+        red_short = red - uzfwc
+        uzfwc = where(short, 0.0, uzfwc - red)
+        red = where(short, red_short, 0.0)
+        balance = ~short & ((uztwc / uztwm) < (uzfwc / uzfwm))
+        uzrat = (uztwc + uzfwc) / (uztwm + uzfwm)
+        uztwc = where(balance, uztwm * uzrat, uztwc)
+        uzfwc = where(balance, uzfwm * uzrat, uzfwc)
+
+        uztwc = where(uztwc < 0.00001, 0.0, uztwc)
+        uzfwc = where(uzfwc < 0.00001, 0.0, uzfwc)
+
+        # Compute ET from lower zone
+        e3 = red * (lztwc / (uztwm + lztwm))
+        lztwc = lztwc - e3
+        neg = lztwc < 0.0
+        e3 = where(neg, e3 + lztwc, e3)
+        lztwc = where(neg, 0.0, lztwc)
+        ratlzt = lztwc / lztwm
+        ratlz = (lztwc + lzfpc + lzfsc - saved) / (lztwm + lzfpm + lzfsm - saved)
+        transfer = ratlzt < ratlz
+        delivery = (ratlz - ratlzt) * lztwm
+        lztwc = where(transfer, lztwc + delivery, lztwc)
+        lzfsc_new = lzfsc - delivery
+        neg = transfer & (lzfsc_new < 0.0)
+        lzfpc = where(neg, lzfpc + lzfsc_new, lzfpc)
+        lzfsc = where(neg, 0.0, where(transfer, lzfsc_new, lzfsc))
+        lztwc = where(lztwc < 0.00001, 0.0, lztwc)
+
+        # Compute ET from the adimp area
+        e5 = e1 + (red + e2) * ((adimc - e1 - uztwc) / (uztwm + lztwm))
+        adimc = adimc - e5
+        neg = adimc < 0.0
+        e5 = where(neg, e5 + adimc, e5)
+        adimc = where(neg, 0.0, adimc)
+        e5 = e5 * adimp
+
+        # Compute percolation and runoff amounts
+        twx = pxv + uztwc - uztwm
+        neg = twx < 0.0
+        uztwc = where(neg, uztwc + pxv, uztwm)
+        twx = where(neg, 0.0, twx)
+        adimc = adimc + (pxv - twx)
+        roimp = pxv * pctim
+
+        sbf = np.zeros(self.count)
+        ssur = np.zeros(self.count)
+        sif = np.zeros(self.count)
+        sdro = np.zeros(self.count)
+
+        ninc = (1.0 + 0.2 * (uzfwc + twx)).astype(int)
+        dinc = (1.0 / ninc) * self.DT
+        pinc = twx / ninc
+        duz = 1.0 - ((1.0 - prm['uzk']) ** dinc)
+        dlzp = 1.0 - ((1.0 - prm['lzpk']) ** dinc)
+        dlzs = 1.0 - ((1.0 - prm['lzsk']) ** dinc)
+        percm = lzfpm * dlzp + lzfsm * dlzs
+        lz_capacity = lztwm + lzfpm + lzfsm
+        hpl = lzfpm / (lzfpm + lzfsm)
+        adimc_max = uztwm + lztwm
+
+        for i in range(ninc.max()):
+            active = i < ninc
+
+            # Compute direct runoff (from adimp area)
+            ratio = np.maximum((adimc - uztwc) / lztwm, 0.0)
+            addro = pinc * ratio ** 2
+
+            # Compute baseflow
+            bf = lzfpc * dlzp
+            fp = lzfpc - bf
+            empty = fp <= 0.0001
+            bf = where(empty, bf + fp, bf)
+            fp = where(empty, 0.0, fp)
+            sbf_new = sbf + bf
+            bf = lzfsc * dlzs
+            fs = lzfsc - bf
+            empty = fs <= 0.0001
+            bf = where(empty, bf + fs, bf)
+            fs = where(empty, 0.0, fs)
+            sbf_new = sbf_new + bf
+
+            # Compute percolation-if no water available then skip
+            skip = pinc + uzfwc <= 0.01
+            perc = percm * (uzfwc / uzfwm)
+            defr = 1.0 - ((lztwc + fp + fs) / lz_capacity)
+            perc = perc * (1.0 + zperc * (defr ** rexp))
+            perc = where(perc >= uzfwc, uzfwc, perc)
+            fw = uzfwc - perc
+            check = lztwc + fp + fs + perc - lz_capacity
+            over = check > 0.0
+            perc = where(over, perc - check, perc)
+            fw = where(over, fw + check, fw)
+
+            # Interflow
+            delivery = fw * duz
+            sif_new = sif + delivery
+            fw = fw - delivery
+
+            # Distribute percolated water into the lower zones
+            perct = perc * (1.0 - pfree)
+            fits = (perct + lztwc) <= lztwm
+            tw = where(fits, lztwc + perct, lztwm)
+            percf = where(fits, 0.0, perct + lztwc - lztwm)
+            percf = percf + perc * pfree
+            to_free = percf != 0.0
+            ratlp = fp / lzfpm
+            ratls = fs / lzfsm
+            fracp = np.minimum((hpl * 2.0 * (1.0 - ratlp)) / ((1.0 - ratlp) + (1.0 - ratls)), 1.0)
+            percp = percf * fracp
+            percs = percf - percp
+            fs_new = fs + percs
+            full = fs_new > lzfsm
+            percs = where(full, percs - fs_new + lzfsm, percs)
+            fs_new = where(full, lzfsm, fs_new)
+            fp_new = fp + (percf - percs)
+            full = fp_new > lzfpm
+            tw_new = where(full, tw + (fp_new - lzfpm), tw)
+            fp_new = where(full, lzfpm, fp_new)
+            fs_perc = where(to_free, fs_new, fs)
+            fp_perc = where(to_free, fp_new, fp)
+            tw = where(to_free, tw_new, tw)
+
+            # Distribute pinc between uzfwc and surface runoff.
+            runoff = (pinc != 0.0) & ((pinc + fw) > uzfwm)
+            sur = pinc + fw - uzfwm
+            adsur = where(runoff, sur * (1.0 - addro / pinc), 0.0)
+            ssur_new = where(runoff, ssur + sur * parea + adsur * adimp, ssur)
+            fw = where(runoff, uzfwm, where(pinc != 0.0, fw + pinc, fw))
+
+            perc_done = active & ~skip
+            adsur = where(perc_done, adsur, 0.0)
+            uzfwc = where(active, where(skip, uzfwc + pinc, fw), uzfwc)
+            lztwc = where(perc_done, tw, lztwc)
+            lzfsc = where(active, where(skip, fs, fs_perc), lzfsc)
+            lzfpc = where(active, where(skip, fp, fp_perc), lzfpc)
+            sbf = where(active, sbf_new, sbf)
+            sif = where(perc_done, sif_new, sif)
+            ssur = where(perc_done, ssur_new, ssur)
+
+            # adimp area water balance
+            ad = adimc + (pinc - addro - adsur)
+            over = ad > adimc_max
+            addro = where(over, addro + (ad - adimc_max), addro)
+            ad = where(over, adimc_max, ad)
+            sdro = where(active, sdro + addro * adimp, sdro)
+            ad = where(ad < 0.00001, 0.0, ad)
+            adimc = where(active, ad, adimc)
+
+        # compute sums and adjust runoff amounts by the area over which they are generated.
+        eused = e1 + e2 + e3
+        sif = sif * parea
+        bfcc = (sbf * parea) * (1.0 / (1.0 + prm['side']))
+        tci = roimp + sdro + ssur + sif + bfcc
+        e4 = (edmnd - eused) * prm['riva']
+        tci = tci - e4
+        tci = np.maximum(tci, 0.0)
+
+        adimc = where(adimc < uztwc, uztwc, adimc)
+        self.state = np.column_stack((uztwc, uzfwc, lztwc, lzfsc, lzfpc, adimc))
+        return tci
@@ -1,5 +1,6 @@
 import unittest
-from hydrology.awbm import Awbm
+import numpy as np
+from hydrology.awbm import Awbm, AwbmEnsemble
 
 
 class TestBucketCase(unittest.TestCase):
@@ -71,5 +72,75 @@ class TestSurfaceStore(unittest.TestCase):
         self.assertAlmostEqual(outflow, 0.024936, self.precision)
 
 
+class TestRunSeries(unittest.TestCase):
+    def setUp(self):
+        """Set up two identical objects to compare run() with runoff()"""
+        self.step = Awbm()
+        self.batch = Awbm()
+        for a in (self.step, self.batch):
+            a.buckets.set_quantities([0.0042, 0.05, 0.0429])
+            a.base.quantity = 0.01
+            a.surface.quantity = 0.01
+        rng = np.random.RandomState(42)
+        self.precip = rng.gamma(0.4, 0.01, 500)
+        self.et = rng.uniform(0.0, 0.004, 500)
+
+    def tearDown(self):
+        """Destroy the object after running tests"""
+        del self.step
+        del self.batch
+
+    def testMatchesRunoff(self):
+        """run() returns exactly the same series as repeated runoff()"""
+        expected = [self.step.runoff(p, e) for p, e in zip(self.precip, self.et)]
+        runoff, buckets, surface, base = self.batch.run(self.precip, self.et)
+        np.testing.assert_array_equal(runoff, expected)
+        np.testing.assert_array_equal(buckets[-1], self.step.buckets.quantity)
+        self.assertEqual(surface[-1], self.step.surface.quantity)
+        self.assertEqual(base[-1], self.step.base.quantity)
+
+    def testContinueRun(self):
+        """Two half runs give the same result as one full run"""
+        full = self.step.run(self.precip, self.et)[0]
+        first = self.batch.run(self.precip[:250], self.et[:250])[0]
+        second = self.batch.run(self.precip[250:], self.et[250:])[0]
+        np.testing.assert_array_equal(full, np.concatenate([first, second]))
+
+
+class TestEnsemble(unittest.TestCase):
+    def setUp(self):
+        """Set up catchments with different parameters and states"""
+        self.models = [Awbm() for i in range(4)]
+        for i, m in enumerate(self.models):
+            m.baseflow_index = 0.5 + 0.1 * i
+            m.surface_recession = 0.8 + 0.02 * i
+            m.buckets.set_quantities([0.001 * i, 0.01, 0.02])
+        self.ensemble = AwbmEnsemble.from_models(self.models)
+        rng = np.random.RandomState(7)
+        self.precip = rng.gamma(0.4, 0.01, (300, 4))
+        self.et = rng.uniform(0.0, 0.004, (300, 4))
+
+    def tearDown(self):
+        """Destroy the object after running tests"""
+        del self.models
+        del self.ensemble
+
+    def testShapes(self):
+        """Parameters are (N, 3) and states are (N,)"""
+        self.assertEqual(self.ensemble.buckets.shape, (4, 3))
+        self.assertEqual(self.ensemble.surface.shape, (4,))
+
+    def testMatchesModels(self):
+        """Each column matches the catchment run on its own"""
+        runoff = self.ensemble.run(self.precip, self.et)
+        for i, m in enumerate(self.models):
+            np.testing.assert_array_equal(runoff[:, i], m.run(self.precip[:, i], self.et[:, i])[0])
+
+    def testSharedInput(self):
+        """A scalar input is applied to every catchment"""
+        q = self.ensemble.runoff(0.01, 0.001)
+        self.assertEqual(q[0], self.models[0].runoff(0.01, 0.001))
+
+
 if __name__ == '__main__':
     unittest.main()
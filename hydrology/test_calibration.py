@@ -0,0 +1,68 @@
+import unittest
+import numpy as np
+from hydrology.awbm import Awbm
+from hydrology import calibration
+
+
+class TestSweep(unittest.TestCase):
+    def setUp(self):
+        """Build a synthetic observed series from a known parameter set"""
+        rng = np.random.RandomState(3)
+        self.precip = rng.gamma(0.4, 0.01, 400)
+        self.et = rng.uniform(0.0, 0.004, 400)
+        a = Awbm()
+        a.baseflow_index = 0.5
+        a.surface_recession = 0.8
+        self.observed = a.run(self.precip, self.et)[0]
+        self.grid = calibration.parameter_grid(baseflow_index=[0.3, 0.5, 0.7],
+                                               surface_recession=[0.7, 0.8, 0.9])
+        self.precision = 8
+
+    def tearDown(self):
+        """Destroy the object after running tests"""
+        del self.grid
+
+    def testGrid(self):
+        """Grid holds every combination"""
+        self.assertEqual(len(self.grid['baseflow_index']), 9)
+
+    def testBestSet(self):
+        """The set used to build the observations is a perfect fit"""
+        result = calibration.sweep(self.grid, self.precip, self.et, self.observed)
+        best = result.loc[result['nse'].idxmax()]
+        self.assertAlmostEqual(best['baseflow_index'], 0.5)
+        self.assertAlmostEqual(best['surface_recession'], 0.8)
+        self.assertAlmostEqual(best['nse'], 1.0, self.precision)
+        self.assertAlmostEqual(best['kge'], 1.0, 6)
+        self.assertAlmostEqual(best['rmse'], 0.0, self.precision)
+
+    def testMetrics(self):
+        """Metrics match the metric functions applied to a single run"""
+        result = calibration.sweep(self.grid, self.precip, self.et, self.observed, chunk_size=4)
+        a = Awbm()
+        a.baseflow_index = 0.3
+        a.surface_recession = 0.9
+        simulated = a.run(self.precip, self.et)[0]
+        row = result[(result['baseflow_index'] == 0.3) & (result['surface_recession'] == 0.9)].iloc[0]
+        self.assertAlmostEqual(row['nse'], calibration.nse(simulated, self.observed), self.precision)
+        self.assertAlmostEqual(row['kge'], calibration.kge(simulated, self.observed), 6)
+        self.assertAlmostEqual(row['rmse'], calibration.rmse(simulated, self.observed), self.precision)
+
+    def testWorkers(self):
+        """A process pool gives the same result as a single process"""
+        single = calibration.sweep(self.grid, self.precip, self.et, self.observed, chunk_size=3)
+        pooled = calibration.sweep(self.grid, self.precip, self.et, self.observed, workers=2, chunk_size=3)
+        np.testing.assert_array_equal(single.values, pooled.values)
+
+    def testLatinHypercube(self):
+        """Samples fall within the bounds and fill each stratum once"""
+        samples = calibration.latin_hypercube({'baseflow_index': (0.2, 0.8),
+                                               'depth_comp_capacity': ([0.01, 0.1, 0.2], [0.05, 0.2, 0.4])},
+                                              50, seed=1)
+        self.assertEqual(samples['depth_comp_capacity'].shape, (50, 3))
+        strata = np.floor((samples['baseflow_index'] - 0.2) / 0.6 * 50)
+        self.assertEqual(len(np.unique(strata)), 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,5 +1,5 @@
 import unittest
-from hydrology.sacramento import Sacramento
+from hydrology.sacramento import Sacramento, SacramentoEnsemble
 import numpy as np
 
 class TestSacramento(unittest.TestCase):
@@ -38,11 +38,13 @@ class TestSacramento(unittest.TestCase):
                    'aesc': 1.0
                    }
         self.s1 = Sacramento(init_states, params, globals)
+        self.s2 = Sacramento(init_states, params, globals)
         self.precision = 2
     
     def tearDown(self):
         """Destroy the object after running tests"""
         del self.s1
+        del self.s2
         del self.precision
     
     def testET(self):
@@ -50,4 +52,44 @@ class TestSacramento(unittest.TestCase):
         et = 1.5
         for i in range(10):
             self.s1.update(p[i], et)
-        self.assertAlmostEqual(self.s1.tci, 0.152, self.precision)
\ No newline at end of file
+        self.assertAlmostEqual(self.s1.tci, 0.152, self.precision)
+
+    def testStateVector(self):
+        """Named storages are views of the state vector"""
+        self.assertEqual(self.s1.lzfpc, 47.0)
+        self.s1.uzfwc = 3.5
+        self.assertEqual(self.s1.state[1], 3.5)
+
+    def testRunMatchesUpdate(self):
+        """run() gives the same result as calling update() each day"""
+        rng = np.random.RandomState(11)
+        p = rng.gamma(0.3, 30.0, 365)
+        et = rng.uniform(1.0, 4.0, 365)
+        expected = [self.s1.update(p[i], et[i]) for i in range(365)]
+        tci, states = self.s2.run(p, et)
+        np.testing.assert_array_equal(tci, expected)
+        np.testing.assert_array_equal(states[-1], self.s1.state)
+        self.assertEqual(self.s2.tci, self.s1.tci)
+
+    def testEnsembleMatchesModels(self):
+        """Each ensemble member matches the scalar model"""
+        rng = np.random.RandomState(5)
+        models = []
+        for i in range(6):
+            model = Sacramento({name: self.s1.state[j] for j, name in enumerate(('uztwc', 'uzfwc', 'lztwc',
+                                                                               'lzfsc', 'lzfpc', 'adimc'))},
+                               {'uztwm': 40.0, 'uzfwm': rng.uniform(10.0, 80.0), 'lztwm': 330.0,
+                                'lzfpm': 40.0, 'lzfsm': rng.uniform(5.0, 50.0), 'uzk': 0.4,
+                                'lzpk': 0.005, 'lzsk': 0.1, 'zperc': rng.uniform(20.0, 250.0),
+                                'rexp': 2.0, 'pfree': 0.1, 'pctim': 0.01, 'adimp': 0.05,
+                                'riva': 0.01, 'side': 0.0, 'rserv': 0.3},
+                               {'pxv': 0.0})
+            models.append(model)
+        ensemble = SacramentoEnsemble.from_models(models)
+        p = rng.gamma(0.3, 30.0, 365)
+        et = rng.uniform(1.0, 4.0, 365)
+        tci = ensemble.run(p, et)
+        self.assertEqual(tci.shape, (365, 6))
+        for i, model in enumerate(models):
+            np.testing.assert_allclose(tci[:, i], model.run(p, et)[0], rtol=1e-9, atol=1e-9)
+            np.testing.assert_allclose(ensemble.state[i], model.state, rtol=1e-9)
@@ -2,6 +2,8 @@ import unittest
 from hydrology.watershed import Watershed
 from hydrology.catchment import Catchment
 import numpy as np
+import os
+import tempfile
 from data.fileman import FileManager
 
 
@@ -43,6 +45,61 @@ class TestWatershed(unittest.TestCase):
         self.w.load_from_file(filename)
         self.assertAlmostEqual(self.w.discharge(precip, et), expected_ouflow, self.precision)
 
+    def testEnsembleDischarge(self):
+        """Discharge is unchanged when AWBM catchments use an ensemble"""
+        w2 = Watershed()
+        w2.add_junction('J1', 'sink')
+        w2.link_catchment('C1', 'J1')
+        w2.link_catchment('C2', 'J1')
+        for w in (self.w, w2):
+            w.link_catchment('C3', 'J1', 12600000.0, 'AWBM')
+            w.link_catchment('C4', 'J1', 8000000.0, 'AWBM')
+        w2.build_ensemble()
+        self.assertEqual(w2.ensemble_names, ['C3', 'C4'])
+        for i in range(10):
+            expected_outflow = self.w.discharge(0.00654, 0.00025)
+            self.assertAlmostEqual(w2.discharge(0.00654, 0.00025), expected_outflow, self.precision)
+
+    def testDischargeSeries(self):
+        """A whole series gives the same discharge as daily updates"""
+        precip = np.random.uniform(0, 0.02, 60)
+        et = np.random.uniform(0, 0.005, 60)
+        w2 = Watershed()
+        w2.add_junction('J1', 'sink')
+        w2.link_catchment('C1', 'J1')
+        w2.link_catchment('C2', 'J1')
+        for w in (self.w, w2):
+            w.add_junction('J2', 'J1')
+            w.link_catchment('C3', 'J2', 12600000.0, 'AWBM')
+            w.link_catchment('C4', 'J2', 8000000.0, 'AWBM')
+        w2.build_ensemble()
+        expected = [self.w.discharge(p, e) for p, e in zip(precip, et)]
+        np.testing.assert_allclose(w2.discharge_series(precip, et), expected, rtol=1e-9)
+        self.assertAlmostEqual(w2.outflow(), expected[-1], self.precision)
+
+    def testSnapshot(self):
+        """A watershed restarted from a snapshot carries on where it stopped"""
+        precip = np.random.uniform(0, 0.02, 20)
+        et = np.random.uniform(0, 0.005, 20)
+        self.w.add_junction('J2', 'J1')
+        self.w.add_reach('J2', k=1.5, x=0.2, lag=1)
+        self.w.link_catchment('C3', 'J2', 12600000.0, 'AWBM')
+        self.w.link_catchment('C4', 'J2', 8000000.0, 'AWBM')
+        self.w.catchments['C1'].runoff_method.loss = 0.5
+        self.w.build_ensemble()
+        for p, e in zip(precip[:10], et[:10]):
+            self.w.discharge(p, e)
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'watershed.npz')
+            self.w.save_snapshot(filename)
+            w2 = Watershed()
+            w2.load_snapshot(filename)
+        self.assertEqual(sorted(w2.dg.edges), sorted(self.w.dg.edges))
+        self.assertEqual(w2.ensemble_names, ['C3', 'C4'])
+        self.assertEqual(w2.catchments['C1'].runoff_method.loss, 0.5)
+        for p, e in zip(precip[10:], et[10:]):
+            self.assertEqual(w2.discharge(p, e), self.w.discharge(p, e))
+
         
 if __name__ == '__main__':
     unittest.main()
@@ -2,6 +2,7 @@ import unittest
 from global_attributes.clock import Clock
 from hydrology.wgen import Wgen
 import numpy as np
+import pandas as pd
 
 class TestWGEN(unittest.TestCase):
     def setUp(self):
@@ -93,6 +94,55 @@ class TestWGEN(unittest.TestCase):
             monthly_temps[i] /= realizations
 
         np.testing.assert_allclose(observed_tavg, monthly_temps, rtol=0.1, atol=0.05, err_msg='Not close enough!', verbose=True)
+
+    def testGenerateDeterministic(self):
+        """generate() gives the same values as daily updates in deterministic mode"""
+        dates = pd.date_range('1/1/2019', '12/31/2019')
+        self.w.temp_determ = True
+        self.w.rain_deterministic = True
+        self.w.markov_deterministic = True
+        expected = []
+        for date in dates:
+            self.w.update(date)
+            expected.append([self.w.rain, self.w.tmax, self.w.tmin])
+
+        generator = Wgen()
+        generator.temp_determ = True
+        generator.rain_deterministic = True
+        generator.markov_deterministic = True
+        result = generator.generate(dates)
+        self.assertEqual(list(result.columns), ['rain', 'tmax', 'tmin'])
+        np.testing.assert_allclose(result.values, expected, rtol=1e-12)
+
+    def testGenerateMonthly(self):
+        """Monthly rain and temperature from one long generated series"""
+        years = 200
+        dates = pd.date_range('1/1/2000', periods=365 * years)
+        self.w.min_rain = 0.0
+        result = self.w.generate(dates, np.random.default_rng(42))
+        month = result.index.month
+        rain = result['rain'].groupby(month).sum().values / years
+        tavg = ((result['tmax'] + result['tmin']) / 2.0).groupby(month).mean().values
+        np.testing.assert_allclose(self.rain_obs, rain, rtol=0.15, atol=0.1)
+        np.testing.assert_allclose(self.max_temp_obs, tavg, rtol=0.1, atol=0.05)
+
+    def testEnsembleReproducible(self):
+        """Ensemble output depends only on the seed, not on how it is split"""
+        dates = pd.date_range('1/1/2019', '12/31/2019')
+        serial = self.w.ensemble(dates, 20, seed=11)
+        chunked = self.w.ensemble(dates, 20, seed=11, chunk_size=3)
+        pooled = self.w.ensemble(dates, 20, seed=11, workers=2, chunk_size=7)
+        for name in ('rain', 'tmax', 'tmin'):
+            self.assertEqual(serial[name].shape, (20, len(dates)))
+            np.testing.assert_array_equal(serial[name], chunked[name])
+            np.testing.assert_array_equal(serial[name], pooled[name])
+        self.assertFalse(np.array_equal(serial['rain'][0], serial['rain'][1]))
+
+        # Each realisation is the same as generate() with its own Generator
+        rng = np.random.default_rng(np.random.SeedSequence(11).spawn(20)[4])
+        single = Wgen().generate(dates, rng)
+        np.testing.assert_array_equal(single['rain'].values, serial['rain'][4])
+        np.testing.assert_array_equal(single['tmax'].values, serial['tmax'][4])
         
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
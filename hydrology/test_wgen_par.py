@@ -0,0 +1,59 @@
+import os
+import unittest
+import numpy as np
+import pandas as pd
+from hydrology import wgen_par
+from hydrology.wgen import Wgen
+
+DATA = os.path.join(os.path.dirname(__file__), '..', 'data_external')
+
+
+class TestWgenPar(unittest.TestCase):
+    def setUp(self):
+        self.w = Wgen()
+        # A tiny threshold keeps every wet day of the Markov chain
+        self.w.min_rain = 1e-6
+        dates = pd.date_range('1/1/1900', periods=365 * 100)
+        self.data = self.w.generate(dates, np.random.default_rng(3))
+
+    def testRecoverPrecipitation(self):
+        """Fitting a long generated series gives back the Wgen inputs"""
+        monthly = wgen_par.precipitation_parameters(self.data['rain'], self.w.min_rain)
+        np.testing.assert_allclose(monthly['pww'], self.w.pww_array, atol=0.04)
+        np.testing.assert_allclose(monthly['pwd'], self.w.pwd_array, atol=0.03)
+        np.testing.assert_allclose(monthly['alpha'] * monthly['beta'],
+                                   np.multiply(self.w.alpha_array, self.w.beta_array), rtol=0.15)
+
+    def testRecoverTemperature(self):
+        parameters = wgen_par.temperature_parameters(self.data['tmax'], self.data['tmin'],
+                                                     self.data['rain'], self.w.min_rain)
+        for name in ('txmd', 'txmw', 'atx', 'tn', 'atn'):
+            self.assertAlmostEqual(parameters[name], getattr(self.w, name), delta=1.5)
+        for name in ('cvtx', 'acvtx', 'cvtn', 'acvtn'):
+            self.assertAlmostEqual(parameters[name], getattr(self.w, name), delta=0.03)
+
+    def testObservedRain(self):
+        """Parameters from the shipped rain record are sensible"""
+        data = wgen_par.read_timeseries(os.path.join(DATA, 'timeseries_data1.csv'))
+        parameters = wgen_par.estimate_parameters(data)
+        self.assertNotIn('txmd', parameters)
+        for name in ('pww_array', 'pwd_array'):
+            self.assertEqual(len(parameters[name]), 12)
+            self.assertTrue(all(0.0 < p < 1.0 for p in parameters[name]))
+        self.assertTrue(all(a > 0.0 for a in parameters['alpha_array']))
+        wgen_par.apply_parameters(self.w, parameters)
+        self.assertEqual(self.w.pww_array, parameters['pww_array'])
+        with self.assertRaises(AttributeError):
+            wgen_par.apply_parameters(self.w, {'not_a_parameter': 1.0})
+
+    def testStations(self):
+        """Serial and pooled fitting of several stations agree"""
+        stations = {'a': self.data, 'b': self.data.iloc[:3650], 'c': self.data[['rain']]}
+        serial = wgen_par.estimate_stations(stations)
+        pooled = wgen_par.estimate_stations(stations, workers=2)
+        self.assertEqual(list(pooled), ['a', 'b', 'c'])
+        self.assertEqual(serial, pooled)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,9 +1,15 @@
 from water_manage.flow_network import Network
 from hydrology.catchment import Catchment
+from hydrology.awbm import Awbm, AwbmEnsemble
 from hydrology.junction import Junction
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
 
+# AwbmEnsemble arrays written to snapshots
+AWBM_ARRAYS = ('depth_comp_capacity', 'partial_area_fraction', 'baseflow_index', 'surface_recession',
+               'baseflow_recession', 'buckets', 'surface', 'base')
+
 
 class Watershed(Network):
     """ This class is used to create a watershed consisting of
@@ -33,6 +39,12 @@ class Watershed(Network):
             network : networkx.DiGraph
                 Represents the demand network of catchments and junctions using
                 a bi-directional graph.
+            calc_method : str
+                Flows are routed with the array Router ('route') by
+                default since watersheds are tree-shaped
+            ensemble : AwbmEnsemble
+                When built, the AWBM catchments listed in ensemble_names are
+                advanced together by the ensemble instead of one at a time.
 
         Methods
         -------
@@ -59,18 +71,48 @@ class Watershed(Network):
                 if it exists. If so, it returns the catchment
                 
             load_from_file(file_name)
-                Loads a new watershed from a file, overwriting any existing nodes
+                Loads a new watershed from a GML, GraphML, CSV edge list or
+                adjacency list file, overwriting any existing nodes
+
+            build_ensemble()
+                Group the AWBM catchments into one AwbmEnsemble
+
+            discharge_series(precip, et)
+                Discharge for a whole series with one routing product
+
+            save_snapshot(filename), load_snapshot(filename)
+                Write the watershed with its catchment and store states to
+                a .npz file and restart from it
     """
 
     def __init__(self):
         Network.__init__(self)
+        self.calc_method = 'route'
         self.catchments = {}
+        self.ensemble = None
+        self.ensemble_names = []
+        self.ensemble_areas = np.zeros(0)
 
-    def link_catchment(self, name, downstream_name='sink'):
+    def link_catchment(self, name, downstream_name='sink', area=1000.0, runoff_method='simple'):
         """Link a Catchment object with the network node"""
         self.add_catchment(name, downstream_name)
-        c = Catchment()
+        c = Catchment(area, runoff_method)
         self.catchments[name] = c
+
+    def build_ensemble(self):
+        """Group all catchments that use AWBM into one AwbmEnsemble
+
+            The ensemble takes a copy of the parameters and state of each
+            Awbm object and, from then on, discharge() advances the group
+            with one vectorized step. The individual Awbm objects are not
+            updated while the ensemble is in use.
+        """
+        self.ensemble_names = [name for name, c in self.catchments.items()
+                               if isinstance(c.runoff_method, Awbm)]
+        models = [self.catchments[name].runoff_method for name in self.ensemble_names]
+        self.ensemble = AwbmEnsemble.from_models(models)
+        self.ensemble_areas = np.array([self.catchments[name].area for name in self.ensemble_names])
+        return self.ensemble
     
     def discharge(self, precip, et):
         """Calculates runoff from all catchments and routes it down
@@ -85,11 +127,66 @@ class Watershed(Network):
                 precip : float
                 et : float
         """
-        
+        # Channel reaches move on from the flows of the previous call
+        self.advance()
+        members = set()
+        if self.ensemble is not None:
+            members = set(self.ensemble_names)
+            outflows = self.ensemble.runoff(precip, et) * self.ensemble_areas
+            for name, q in zip(self.ensemble_names, outflows.tolist()):
+                self.update_capacity(name, q)
+
         for name, catchment in self.catchments.items():
-            self.update_capacity(name, catchment.outflow(precip, et))
+            if name not in members:
+                self.update_capacity(name, catchment.outflow(precip, et))
         
         return self.outflow()
+
+    def discharge_series(self, precip, et):
+        """Discharge for a whole series of precipitation and ET
+
+            Runoff is first calculated for every catchment over the whole
+            series (AWBM catchments with Awbm.run or the ensemble) and is
+            then routed for all time steps in one sparse matrix product.
+            Catchment states are advanced just as with a discharge() call
+            per time step, and the network is left with the capacities of
+            the last time step.
+
+            Parameters
+            ----------
+                precip, et : array[float]
+                    (T,) series
+
+            Returns
+            -------
+                numpy.ndarray
+                    (T,) discharge reaching the sink
+        """
+        self.advance()
+        precip = np.asarray(precip, dtype=float)
+        et = np.asarray(et, dtype=float)
+        names = list(self.catchments)
+        runoff = np.empty((len(precip), len(names)))
+        column = {name: j for j, name in enumerate(names)}
+
+        members = set()
+        if self.ensemble is not None:
+            members = set(self.ensemble_names)
+            ensemble_runoff = self.ensemble.run(precip, et) * self.ensemble_areas
+            runoff[:, [column[name] for name in self.ensemble_names]] = ensemble_runoff
+
+        for name, catchment in self.catchments.items():
+            if name in members:
+                continue
+            if isinstance(catchment.runoff_method, Awbm):
+                runoff[:, column[name]] = catchment.runoff_method.run(precip, et)[0] * catchment.area
+            else:
+                runoff[:, column[name]] = catchment.runoff_method.runoff(precip, et) * catchment.area
+
+        if len(precip):
+            self.update_all(dict(zip(names, runoff[-1].tolist())))
+        flows = self.route_series(runoff, names)
+        return flows[:, self.get_router().index[self.sink]]
         
         # for u, v, a in self.network.edges(data=True):
         #     try:
@@ -187,18 +284,82 @@ class Watershed(Network):
     #     nx.draw(network_copy, with_labels=True)
     #     plt.show()
     
-    def load_from_file(self, filename):
-        self.dg = nx.read_gml(filename)
-        # Convert catchment labels to Catchment objects
-        for node in self.dg.copy().nodes():
-            try:
-                if self.dg.nodes[node]['node_type'] == 'Catchment':
-                    self.dg.add_edge(self.source, node)
-                    c = Catchment()
-                    self.catchments[node] = c
-            except KeyError:
-                pass
+    def load_table(self, table, source_name=None):
+        """Build the watershed from a GraphTable with a default Catchment
+            for every catchment node, replacing any existing catchments"""
+        names = Network.load_table(self, table, source_name)
+        self.catchments = {name: Catchment() for name in names}
+        self.ensemble = None
+        self.ensemble_names = []
+        self.ensemble_areas = np.zeros(0)
+        return names
             
+    def _snapshot_arrays(self):
+        """Add the catchment areas, runoff parameters and AWBM states"""
+        arrays = Network._snapshot_arrays(self)
+        names = list(self.catchments)
+        catchments = [self.catchments[name] for name in names]
+        awbm = np.array([isinstance(c.runoff_method, Awbm) for c in catchments], dtype=bool)
+        arrays['catchment_names'] = np.array(names, dtype=str)
+        arrays['catchment_area'] = np.array([c.area for c in catchments], dtype=float)
+        arrays['catchment_awbm'] = awbm
+        arrays['rational_loss'] = np.array([np.nan if a else c.runoff_method.loss
+                                            for c, a in zip(catchments, awbm.tolist())], dtype=float)
+
+        # Gather the AWBM parameters and states into arrays, taking the
+        # ensemble's state for the catchments it is advancing
+        awbm_names = [name for name, a in zip(names, awbm.tolist()) if a]
+        state = AwbmEnsemble.from_models([self.catchments[name].runoff_method for name in awbm_names])
+        if self.ensemble is not None:
+            row = {name: i for i, name in enumerate(awbm_names)}
+            rows = [row[name] for name in self.ensemble_names]
+            state.buckets[rows] = self.ensemble.buckets
+            state.surface[rows] = self.ensemble.surface
+            state.base[rows] = self.ensemble.base
+        for name in AWBM_ARRAYS:
+            arrays['awbm_' + name] = getattr(state, name)
+        arrays['ensemble_names'] = np.array(self.ensemble_names, dtype=str)
+        arrays['has_ensemble'] = np.array(self.ensemble is not None)
+        return arrays
+
+    def _restore_snapshot(self, data):
+        Network._restore_snapshot(self, data)
+        values = {name: data['awbm_' + name] for name in AWBM_ARRAYS}
+        self.catchments = {}
+        row = 0
+        awbm_rows = {}
+        for name, area, awbm, loss in zip(data['catchment_names'].tolist(), data['catchment_area'].tolist(),
+                                          data['catchment_awbm'].tolist(), data['rational_loss'].tolist()):
+            c = Catchment(area, 'AWBM' if awbm else 'simple')
+            if awbm:
+                m = c.runoff_method
+                m.depth_comp_capacity = values['depth_comp_capacity'][row].tolist()
+                m.partial_area_fraction = values['partial_area_fraction'][row].tolist()
+                m.baseflow_index = float(values['baseflow_index'][row])
+                m.surface_recession = float(values['surface_recession'][row])
+                m.baseflow_recession = float(values['baseflow_recession'][row])
+                m.buckets.set_capacity(values['partial_area_fraction'][row] * values['depth_comp_capacity'][row])
+                m.buckets.quantity[:] = values['buckets'][row]
+                m.surface._quantity = float(values['surface'][row])
+                m.base._quantity = float(values['base'][row])
+                awbm_rows[name] = row
+                row += 1
+            else:
+                c.runoff_method.loss = loss
+            self.catchments[name] = c
+
+        self.ensemble_names = data['ensemble_names'].tolist()
+        self.ensemble = None
+        self.ensemble_areas = np.array([self.catchments[name].area for name in self.ensemble_names])
+        if bool(data['has_ensemble']):
+            rows = [awbm_rows[name] for name in self.ensemble_names]
+            self.ensemble = AwbmEnsemble(len(rows), values['depth_comp_capacity'][rows],
+                                         values['partial_area_fraction'][rows], values['baseflow_index'][rows],
+                                         values['surface_recession'][rows], values['baseflow_recession'][rows])
+            self.ensemble.buckets[:] = values['buckets'][rows]
+            self.ensemble.surface[:] = values['surface'][rows]
+            self.ensemble.base[:] = values['base'][rows]
+
     # def load_from_file(self, filename):
     #     self.network = nx.read_gml(filename)
     #     catchments = [x for x, y in self.network.nodes(data=True) if y['node_type'] == 200]
@@ -1,8 +1,20 @@
 import pandas as pd
 import numpy as np
 import math
+from concurrent.futures import ProcessPoolExecutor
 from global_attributes.aegis import Aegis
 
+# Lag-0 (b) and lag-1 (a) coefficient matrices of the weakly stationary
+# process for the tmax, tmin and radiation residuals
+A_MATRIX = np.array([[0.567, 0.086, -0.002],
+                     [0.253, 0.504, -0.05],
+                     [-0.006, -0.039, 0.244]])
+B_MATRIX = np.array([[0.781, 0.000, 0.000],
+                     [0.328, 0.637, 0.00],
+                     [0.238, -0.341, 0.873]])
+X_DETERMINISTIC = [-0.3513, -1.754, 0.6244]
+
+
 class Wgen(Aegis):
     """A class to create an object that generates weather data.
 
@@ -22,7 +34,8 @@ class Wgen(Aegis):
             to regions of the world where sufficient data are available.
 
             Data is entered through the dashboard interface. Prepare the data
-            using WGEN PAR found in our GoldSim library. Run the model
+            using WGEN PAR found in our GoldSim library, or estimate it from
+            daily records with hydrology.wgen_par. Run the model
             as-is and view the "WGEN_Validation" to see how the results
             compare against those presented in the WGEN documentation.
 
@@ -96,6 +109,10 @@ class Wgen(Aegis):
             precipitation(date)
             calc_temperature(date)
             tavg
+            generate(dates)
+                Generate rain, tmax and tmin for a whole period at once
+            ensemble(dates, realisations)
+                Generate many reproducible realisations of a period
     	"""
 
     def __init__(self):
@@ -294,17 +311,10 @@ class Wgen(Aegis):
         """Calculate a one harmonic series"""
         e = self.fourier()
         if self.temp_determ:
-            self.x = [-0.3513, -1.754, 0.6244]
-        else:
-            self.x = [0] * 3
+            self.x = X_DETERMINISTIC
         x = self.x
-        a = np.array([[0.567, 0.086, -0.002],
-                      [0.253, 0.504, -0.05],
-                      [-0.006, -0.039, 0.244]])
-    
-        b = np.array([[0.781, 0.000, 0.000],
-                      [0.328, 0.637, 0.00],
-                      [0.238, -0.341, 0.873]])
+        a = A_MATRIX
+        b = B_MATRIX
     
         r = np.zeros(3)
         rr = np.zeros(3)
@@ -313,4 +323,268 @@ class Wgen(Aegis):
             for j in range(0, 3):
                 r[i] += b[i, j] * e[j]
                 rr[i] += a[i, j] * x[j]
-        return r + rr
\ No newline at end of file
+        return r + rr
+
+    def generate(self, dates, random_state=None):
+        """Generate daily weather for a whole period in one call
+
+            All random numbers for the period are drawn up front. The
+            wet/dry Markov chain and the AR(1) recursion of the temperature
+            residuals are then run over arrays. The deterministic options
+            give the same values as calling update() for each date. The
+            wet state and residuals are kept at the end so generation can
+            continue with update() or another call to generate().
+
+            Parameters
+            ----------
+            dates : DatetimeIndex or list of dates
+            random_state : numpy RandomState or Generator, optional
+                Source of random numbers. The global numpy random state
+                is used by default, like update().
+
+            Returns
+            -------
+            DataFrame
+                rain, tmax and tmin indexed by date
+        """
+        dates = pd.DatetimeIndex(dates)
+        rng = np.random if random_state is None else random_state
+        rain_raw, rn, e = self._draw(rng, dates)
+        wet, rain, rain_today, x, tmax, tmin = self._simulate(dates, rain_raw, rn, e, self.wet, self.x)
+
+        if len(dates):
+            self.wet = bool(wet[-1])
+            self.rain = rain[-1]
+            self.rain_today = bool(rain_today[-1])
+            self.x = list(x[-1])
+            self.tmax = tmax[-1]
+            self.tmin = tmin[-1]
+        return pd.DataFrame({'rain': rain, 'tmax': tmax, 'tmin': tmin}, index=dates)
+
+    def ensemble(self, dates, realisations, seed=None, workers=None, chunk_size=500):
+        """Generate many independent realisations of daily weather
+
+            Each realisation draws from its own numpy Generator spawned
+            from a single SeedSequence, so a realisation depends only on
+            the seed and its position in the ensemble. Realisations are
+            split into chunks that are advanced together and chunks are
+            shared out over a process pool when more than one worker is
+            requested. The output is the same for any number of workers
+            or chunk size. Every realisation starts from the current wet
+            state and temperature residuals; the generator's own state is
+            not changed.
+
+            Parameters
+            ----------
+            dates : DatetimeIndex or list of dates
+            realisations : int
+                Number of realisations
+            seed : int or SeedSequence, optional
+                Entropy for the ensemble. None gives a fresh random seed.
+            workers : int, optional
+                Number of worker processes. None or 1 runs in this process.
+            chunk_size : int
+                Number of realisations generated together
+
+            Returns
+            -------
+            dict of numpy.ndarray
+                (realisations, days) arrays of rain, tmax and tmin
+        """
+        dates = pd.DatetimeIndex(dates)
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        seeds = seed.spawn(realisations)
+        tasks = [(self, dates, seeds[start:start + chunk_size])
+                 for start in range(0, realisations, chunk_size)]
+        if workers is None or workers == 1:
+            results = [_ensemble_chunk(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(executor.map(_ensemble_chunk, tasks))
+
+        output = {}
+        for name in ('rain', 'tmax', 'tmin'):
+            if results:
+                output[name] = np.concatenate([r[name] for r in results], axis=0)
+            else:
+                output[name] = np.zeros((0, len(dates)))
+        return output
+
+    def _draw(self, rng, dates):
+        """Draw the random numbers for one realisation in a fixed order
+
+            Returns
+            -------
+            rain_raw, rn : numpy.ndarray
+                (T,) gamma rain depths and uniforms for the Markov chain
+            e : numpy.ndarray
+                (T, 3) normal deviates for the temperature residuals
+        """
+        count = len(dates)
+        month = dates.month.values - 1
+        if self.rain_deterministic:
+            rain_raw = np.full(count, 0.25)
+        else:
+            rain_raw = rng.gamma(np.asarray(self.alpha_array)[month], np.asarray(self.beta_array)[month])
+        if self.markov_deterministic:
+            rn = np.full(count, 0.177)
+        else:
+            rn = rng.uniform(size=count)
+        if self.temp_determ:
+            e = None
+        else:
+            e = normal_deviates(rng, (count, 3))
+        return rain_raw, rn, e
+
+    def _simulate(self, dates, rain_raw, rn, e, wet, x):
+        """Run the Markov chain, residuals and temperatures over drawn numbers
+
+            rain_raw and rn are (T,) or (T, R) with a column per realisation
+            and e is (T, 3) or (T, R, 3). The calculation is element-wise
+            across realisations so a realisation gives the same values
+            whichever others it is run with.
+        """
+        month = dates.month.values - 1
+        if rn.ndim > 1:
+            month = month[:, np.newaxis]
+        wet = markov_chain(rn - np.asarray(self.pww_array)[month] <= 0.0,
+                           rn - np.asarray(self.pwd_array)[month] <= 0.0, wet)
+        rain = np.where(wet & (rain_raw >= self.min_rain), rain_raw, 0.0)
+        rain_today = rain >= self.min_rain
+
+        if e is None:
+            x = np.broadcast_to(self.harmonic(), rn.shape + (3,))
+        else:
+            x = ar1_residuals(e, np.asarray(x, dtype=float))
+
+        tmax, tmin = self._temperature(dates.dayofyear.values, rain_today, x)
+        return wet, rain, rain_today, x, tmax, tmin
+
+    def _temperature(self, dayofyear, rain_today, x):
+        """Vectorized form of calc_temperature for arrays of days"""
+        d1 = self.txmd - self.txmw
+        dt = np.cos(0.0172 * (dayofyear - self.dt_day))
+        dt = dt.reshape(dt.shape + (1,) * (rain_today.ndim - 1))
+        txm = self.txmd + self.atx * dt
+        cv = self.cvtx + self.acvtx * dt
+        xcr1 = np.where(cv >= 0.0, cv, 0.06)
+        txs = txm * xcr1
+        txm1 = txm - d1
+        txs1 = txm1 * xcr1
+        txxs = np.where(rain_today, txs1, txs)
+        txxm = np.where(rain_today, txm1, txm)
+
+        tnm = self.tn + self.atn * dt
+        cv = self.cvtn + self.acvtn * dt
+        xcr2 = np.where(cv >= 0.0, cv, 0.06)
+        tns = tnm * xcr2
+
+        tmax1 = x[..., 0] * txxs + txxm
+        tmin1 = x[..., 1] * tns + tnm
+        return np.maximum(tmax1, tmin1), np.minimum(tmax1, tmin1)
+
+
+def markov_chain(wet_if_wet, wet_if_dry, wet=False):
+    """Run the first-order wet/dry Markov chain
+
+        Parameters
+        ----------
+        wet_if_wet, wet_if_dry : array[bool]
+            Outcome of each day's random draw if the previous day was wet
+            or dry. Any extra trailing dimensions are independent chains.
+        wet : bool or array[bool]
+            State of the day before the first day
+
+        Returns
+        -------
+        numpy.ndarray of bool
+    """
+    wet_if_wet = np.asarray(wet_if_wet)
+    wet_if_dry = np.asarray(wet_if_dry)
+    if wet_if_wet.ndim == 1:
+        # A single chain is quicker with plain Python booleans
+        state = bool(wet)
+        result = []
+        for ww, wd in zip(wet_if_wet.tolist(), wet_if_dry.tolist()):
+            state = ww if state else wd
+            result.append(state)
+        return np.array(result, dtype=bool)
+
+    result = np.empty(wet_if_wet.shape, dtype=bool)
+    state = np.broadcast_to(wet, wet_if_wet.shape[1:])
+    for t in range(len(wet_if_wet)):
+        state = np.where(state, wet_if_wet[t], wet_if_dry[t])
+        result[t] = state
+    return result
+
+
+def normal_deviates(rng, size):
+    """Standard normal deviates as drawn in Wgen.fourier
+
+        Box-Muller deviates outside +/-2.5 are redrawn (up to 100 tries)
+        and values are capped at 2.6. Only rejected elements are redrawn.
+    """
+    def draw(shape):
+        with np.errstate(divide='ignore', invalid='ignore'):
+            v = np.sqrt(-2.0 * np.log(rng.uniform(size=shape))) * np.cos(6.283185 * rng.uniform(size=shape))
+        return np.minimum(v, 2.6)
+
+    e = draw(size)
+    reject = np.abs(e) > 2.5
+    tries = 1
+    while reject.any() and tries < 100:
+        e[reject] = draw(int(reject.sum()))
+        reject[reject] = np.abs(e[reject]) > 2.5
+        tries += 1
+    return e
+
+
+def ar1_residuals(e, x0):
+    """AR(1) recursion x(t) = A x(t-1) + B e(t) for the temperature residuals
+
+        The sums are written out element by element in the same order as
+        Wgen.harmonic so each series is independent of any others it is
+        run with.
+
+        Parameters
+        ----------
+        e : numpy.ndarray
+            (T, ..., 3) standard normal deviates
+        x0 : numpy.ndarray
+            (..., 3) residuals of the day before the first day
+
+        Returns
+        -------
+        numpy.ndarray
+            (T, ..., 3) residuals
+    """
+    a = A_MATRIX.tolist()
+    b = B_MATRIX.tolist()
+    innovations = [e[..., 0] * b[i][0] + e[..., 1] * b[i][1] + e[..., 2] * b[i][2] for i in range(3)]
+    prev = list(np.broadcast_to(x0, e.shape[1:-1] + (3,))[..., i] for i in range(3))
+    if e.ndim == 2:
+        # A single series is quicker with plain Python floats
+        innovations = [i.tolist() for i in innovations]
+        prev = [float(p) for p in prev]
+
+    x = ([], [], [])
+    for r0, r1, r2 in zip(*innovations):
+        p0, p1, p2 = prev
+        prev = [r0 + (p0 * a[0][0] + p1 * a[0][1] + p2 * a[0][2]),
+                r1 + (p0 * a[1][0] + p1 * a[1][1] + p2 * a[1][2]),
+                r2 + (p0 * a[2][0] + p1 * a[2][1] + p2 * a[2][2])]
+        for i in range(3):
+            x[i].append(prev[i])
+    return np.stack([np.array(c, dtype=float).reshape(e.shape[:-1]) for c in x], axis=-1)
+
+
+def _ensemble_chunk(task):
+    """Generate one chunk of ensemble realisations."""
+    wgen, dates, seeds = task
+    draws = [wgen._draw(np.random.default_rng(s), dates) for s in seeds]
+    rain_raw = np.stack([d[0] for d in draws], axis=1)
+    rn = np.stack([d[1] for d in draws], axis=1)
+    e = None if wgen.temp_determ else np.stack([d[2] for d in draws], axis=1)
+    wet, rain, rain_today, x, tmax, tmin = wgen._simulate(dates, rain_raw, rn, e, wgen.wet, wgen.x)
+    return {'rain': rain.T, 'tmax': tmax.T, 'tmin': tmin.T}
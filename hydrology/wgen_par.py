@@ -0,0 +1,231 @@
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+
+# Fourier series frequency used by Wgen (radians per day)
+OMEGA = 0.0172
+
+
+def precipitation_parameters(rain, min_rain=0.01):
+    """Monthly Markov chain and gamma distribution parameters
+
+        A day is wet when its rain is at least min_rain, the same test
+        Wgen uses. The transition probabilities are counted for the month
+        of the second day of each pair. The gamma shape is estimated from
+        the wet day amounts with the Greenwood and Durand (1960)
+        approximation to the maximum likelihood estimate.
+
+        Parameters
+        ----------
+        rain : Series
+            Daily rain (in) indexed by date. Missing days are skipped.
+        min_rain : float
+            Wet day threshold (in)
+
+        Returns
+        -------
+        DataFrame
+            pww, pwd, alpha and beta indexed by month (1 to 12)
+    """
+    rain = rain.sort_index()
+    amount = rain.values.astype(float)
+    month = rain.index.month.values - 1
+    observed = ~np.isnan(amount)
+    wet = observed & (amount >= min_rain)
+
+    # Transitions need both days observed and consecutive
+    consecutive = np.diff(rain.index.values).astype('timedelta64[D]') == np.timedelta64(1, 'D')
+    pair = consecutive & observed[:-1] & observed[1:]
+    prev_wet = wet[:-1] & pair
+    prev_dry = ~wet[:-1] & pair
+    today = month[1:]
+    pww = (np.bincount(today, prev_wet & wet[1:], minlength=12)
+           / np.bincount(today, prev_wet, minlength=12))
+    pwd = (np.bincount(today, prev_dry & wet[1:], minlength=12)
+           / np.bincount(today, prev_dry, minlength=12))
+
+    wet_month = month[wet]
+    wet_amount = amount[wet]
+    wet_days = np.bincount(wet_month, minlength=12)
+    mean = np.bincount(wet_month, wet_amount, minlength=12) / wet_days
+    log_mean = np.bincount(wet_month, np.log(wet_amount), minlength=12) / wet_days
+    alpha = gamma_shape(np.log(mean) - log_mean)
+    beta = mean / alpha
+
+    return pd.DataFrame({'pww': pww, 'pwd': pwd, 'alpha': alpha, 'beta': beta},
+                        index=pd.Index(range(1, 13), name='month'))
+
+
+def gamma_shape(a):
+    """Greenwood and Durand (1960) estimate of the gamma shape parameter
+
+        Parameters
+        ----------
+        a : array[float]
+            ln(mean) - mean(ln(x)) of the sample
+
+        Returns
+        -------
+        numpy.ndarray
+    """
+    a = np.asarray(a, dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        low = (0.5000876 + 0.1648852 * a - 0.0544274 * a ** 2) / a
+        high = (8.898919 + 9.059950 * a + 0.9775373 * a ** 2) / (a * (17.79728 + 11.968477 * a + a ** 2))
+    return np.where(a <= 0.5772, low, high)
+
+
+def temperature_parameters(tmax, tmin, rain, min_rain=0.01, dt_day=200, period=14):
+    """Fourier coefficients of the temperature means and coefficients of variation
+
+        Daily values are grouped into periods of `period` days through the
+        year. The mean and coefficient of variation of each period are
+        then fitted with u + C cos(0.0172 (t - dt_day)), where t is the
+        middle day of the period. The phase is fixed at dt_day because
+        Wgen uses one phase for every series. Mean tmax is fitted for wet
+        and dry days with a shared amplitude.
+
+        Parameters
+        ----------
+        tmax, tmin, rain : Series
+            Daily values indexed by the same dates
+        min_rain : float
+            Wet day threshold (in)
+        dt_day : int
+            Day of the year with the highest temperature
+        period : int
+            Length of the averaging periods in days
+
+        Returns
+        -------
+        dict
+            txmd, txmw, atx, cvtx, acvtx, tn, atn, cvtn, acvtn and dt_day
+    """
+    frame = pd.DataFrame({'tmax': tmax, 'tmin': tmin, 'rain': rain}).dropna()
+    periods = 365 // period
+    group = np.minimum((frame.index.dayofyear.values - 1) // period, periods - 1)
+    cos = np.cos(OMEGA * (np.arange(periods) * period + (period + 1) / 2.0 - dt_day))
+    wet = (frame['rain'] >= min_rain).values
+
+    stats = frame[['tmax', 'tmin']].groupby(group).agg(['mean', 'std'])
+    cv_tmax = (stats['tmax', 'std'] / stats['tmax', 'mean']).values
+    cv_tmin = (stats['tmin', 'std'] / stats['tmin', 'mean']).values
+    cvtx, acvtx = _fourier_fit(cv_tmax, cos)
+    tn, atn = _fourier_fit(stats['tmin', 'mean'].values, cos)
+    cvtn, acvtn = _fourier_fit(cv_tmin, cos)
+
+    # Dry and wet means of tmax share one amplitude
+    means = frame['tmax'].groupby([group, wet]).mean()
+    periods_index = means.index.get_level_values(0).values
+    is_wet = means.index.get_level_values(1).values
+    design = np.column_stack([~is_wet, is_wet, cos[periods_index]]).astype(float)
+    (txmd, txmw, atx), *rest = np.linalg.lstsq(design, means.values, rcond=None)
+
+    values = {'txmd': txmd, 'txmw': txmw, 'atx': atx, 'cvtx': cvtx, 'acvtx': acvtx,
+              'tn': tn, 'atn': atn, 'cvtn': cvtn, 'acvtn': acvtn}
+    parameters = {name: float(value) for name, value in values.items()}
+    parameters['dt_day'] = dt_day
+    return parameters
+
+
+def _fourier_fit(values, cos):
+    """Least squares fit of u + C cos for one series of period values"""
+    design = np.column_stack([np.ones(len(cos)), cos])
+    (u, c), *rest = np.linalg.lstsq(design, values, rcond=None)
+    return u, c
+
+
+def estimate_parameters(data, min_rain=0.01, dt_day=200, period=14):
+    """Estimate the Wgen parameters of one station
+
+        Parameters
+        ----------
+        data : DataFrame
+            Daily values indexed by date with a rain column (in) and
+            optionally tmax and tmin columns (F)
+        min_rain : float
+            Wet day threshold (in)
+        dt_day : int
+            Day of the year with the highest temperature
+        period : int
+            Length of the temperature averaging periods in days
+
+        Returns
+        -------
+        dict
+            Values keyed by Wgen attribute name, see apply_parameters()
+    """
+    monthly = precipitation_parameters(data['rain'], min_rain)
+    parameters = {'pww_array': monthly['pww'].tolist(),
+                  'pwd_array': monthly['pwd'].tolist(),
+                  'alpha_array': monthly['alpha'].tolist(),
+                  'beta_array': monthly['beta'].tolist(),
+                  'min_rain': min_rain}
+    if 'tmax' in data and 'tmin' in data:
+        parameters.update(temperature_parameters(data['tmax'], data['tmin'], data['rain'],
+                                                 min_rain, dt_day, period))
+    return parameters
+
+
+def apply_parameters(wgen, parameters):
+    """Set estimated parameters on a Wgen object
+
+        Parameters
+        ----------
+        wgen : Wgen
+        parameters : dict
+            Values keyed by Wgen attribute name
+    """
+    for name, value in parameters.items():
+        if not hasattr(wgen, name):
+            raise AttributeError(name + ' is not a Wgen parameter')
+        setattr(wgen, name, value)
+    return wgen
+
+
+def estimate_stations(stations, workers=None, **kwargs):
+    """Estimate parameters for many stations
+
+        Parameters
+        ----------
+        stations : dict of DataFrame
+            Daily data for each station, see estimate_parameters()
+        workers : int, optional
+            Number of worker processes. None or 1 runs in this process.
+        kwargs
+            Passed on to estimate_parameters()
+
+        Returns
+        -------
+        dict
+            Parameters of each station keyed by station name
+    """
+    names = list(stations)
+    tasks = [(stations[name], kwargs) for name in names]
+    if workers is None or workers == 1:
+        results = [_estimate_station(task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_estimate_station, tasks))
+    return dict(zip(names, results))
+
+
+def _estimate_station(task):
+    """Estimate one station's parameters."""
+    data, kwargs = task
+    return estimate_parameters(data, **kwargs)
+
+
+def read_timeseries(path):
+    """Read a daily time series file such as data_external/timeseries_data1.csv
+
+        The first column holds the dates and the others are renamed to
+        rain, tmax, tmin and rad in order.
+
+        Returns
+        -------
+        DataFrame
+    """
+    data = pd.read_csv(path, skipinitialspace=True, index_col=0, parse_dates=True)
+    data.columns = ['rain', 'tmax', 'tmin', 'rad'][:len(data.columns)]
+    return data
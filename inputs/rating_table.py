@@ -0,0 +1,107 @@
+from bisect import bisect_right
+import numpy as np
+
+
+class RatingTable:
+    """Piecewise linear lookup table with arrays and slopes worked out once
+
+        Built for rating curves such as elevation-volume-area tables that
+        are looked up many times per time step. The points are checked and
+        sorted once and held as float64 arrays, with the slope of each
+        segment. A scalar lookup first tries the segment of the previous
+        lookup, which is usually right when the level changes slowly, and
+        otherwise finds it by bisection. Results are the same as
+        numpy.interp, including holding the end values outside the table.
+
+        The inverse lookup (y to x) needs y to be monotone; it is set up
+        on first use.
+
+        Attributes
+        ----------
+        x, y : numpy.ndarray
+            Table points sorted by x
+
+        Methods
+        -------
+        lookup(value)
+            y at x = value, for a scalar or an array
+        inverse(value)
+            x at y = value, for a scalar or an array
+    """
+
+    def __init__(self, x, y):
+        x = np.array(x, dtype=float)
+        y = np.array(y, dtype=float)
+        if x.ndim != 1 or x.shape != y.shape or len(x) == 0:
+            raise ValueError('x and y should be 1-D with the same number of points')
+        if np.isnan(x).any() or np.isnan(y).any():
+            raise ValueError('table values should not be nan')
+        order = np.argsort(x, kind='stable')
+        self.x = x[order]
+        self.y = y[order]
+        self._forward = _Segments(self.x, self.y)
+        self._backward = None
+
+    def lookup(self, value):
+        """y at x = value"""
+        return self._forward.lookup(value)
+
+    def inverse(self, value):
+        """x at y = value
+
+            Raises
+            ------
+            ValueError
+                If y is not monotone
+        """
+        if self._backward is None:
+            dy = np.diff(self.y)
+            if (dy >= 0.0).all():
+                self._backward = _Segments(self.y, self.x)
+            elif (dy <= 0.0).all():
+                self._backward = _Segments(self.y[::-1].copy(), self.x[::-1].copy())
+            else:
+                raise ValueError('y should be monotone for an inverse lookup')
+        return self._backward.lookup(value)
+
+
+class _Segments:
+    """Segments of one direction of a RatingTable"""
+
+    def __init__(self, xp, fp):
+        self.xp = xp
+        self.fp = fp
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.slopes = np.diff(fp) / np.diff(xp)
+        # Scalar lookups use Python floats, which are faster than numpy scalars
+        self._xp = xp.tolist()
+        self._fp = fp.tolist()
+        self._slopes = self.slopes.tolist()
+        self._last = len(self._xp) - 1
+        self._segment = 0
+
+    def lookup(self, value):
+        if np.ndim(value):
+            return np.interp(value, self.xp, self.fp)
+        value = float(value)
+        xp = self._xp
+        j = self._segment
+        # Same segment as last time: xp[j] <= value < xp[j + 1]
+        if not (j < self._last and xp[j] <= value < xp[j + 1]):
+            if value != value:
+                return value
+            if value < xp[0]:
+                return self._fp[0]
+            if value >= xp[-1]:
+                # numpy.interp gives fp[-1] at and above the last point
+                return self._fp[-1]
+            j = self._segment = bisect_right(xp, value) - 1
+        if value == xp[j]:
+            return self._fp[j]
+        # The same expression as numpy.interp, so results match it exactly
+        result = self._slopes[j] * (value - xp[j]) + self._fp[j]
+        if result != result:
+            result = self._slopes[j] * (value - xp[j + 1]) + self._fp[j + 1]
+            if result != result and self._fp[j] == self._fp[j + 1]:
+                result = self._fp[j]
+        return result
@@ -3,6 +3,7 @@ import numpy as np
 import matplotlib.pyplot as plt
 import pandas as pd
 import re       # import regex
+from inputs.rating_table import RatingTable
 
 
 class Table(Aegis):
@@ -19,6 +20,8 @@ class Table(Aegis):
         -------
         lookup(value)
             Returns interpolated value
+        lookup_x(value)
+            Returns x for a y value
         load_from_excel()
             Store data from excel into x and y arrays
         
@@ -29,15 +32,44 @@ class Table(Aegis):
         self.x_name = 'x'
         self.y = y
         self.y_name = 'y'
-        
+
+    @property
+    def x(self):
+        return self._x
+
+    @x.setter
+    def x(self, x):
+        self._x = x
+        self._rating = None
+
+    @property
+    def y(self):
+        return self._y
+
+    @y.setter
+    def y(self, y):
+        self._y = y
+        self._rating = None
+
+    @property
+    def rating(self):
+        """RatingTable of x and y, built on first use after they are set"""
+        if self._rating is None:
+            self._rating = RatingTable(self.x, self.y)
+        return self._rating
+
     def lookup(self, lookup_value):
-        return np.interp(lookup_value, self.x, self.y)
+        return self.rating.lookup(lookup_value)
     
     def lookup_y(self, x_lookup_value):
-        return np.interp(x_lookup_value, self.x, self.y)
+        return self.rating.lookup(x_lookup_value)
     
     def lookup_x(self, y_lookup_value):
-        return np.interp(y_lookup_value, self.y, self.x)
+        try:
+            return self.rating.inverse(y_lookup_value)
+        except ValueError:
+            # y is not monotone, so there is no single x for each y
+            return np.interp(y_lookup_value, self.y, self.x)
     
     def load_from_excel(self, filename, sheet, begin_cell):
         """Loads data from Excel file
@@ -0,0 +1,52 @@
+import unittest
+import numpy as np
+from inputs.rating_table import RatingTable
+
+
+class TestRatingTable(unittest.TestCase):
+    def setUp(self):
+        """Set up a new object to be tested"""
+        self.elevations = [0.0, 10.0, 20.0, 25.0, 40.0]
+        self.volumes = [0.0, 175.0, 590.0, 800.0, 1700.0]
+        self.table = RatingTable(self.elevations, self.volumes)
+
+    def tearDown(self):
+        """Destroy the object after running tests"""
+        del self.table
+
+    def testMatchesInterp(self):
+        """Scalar lookups in any order give exactly what numpy.interp gives"""
+        values = np.random.default_rng(1).uniform(-5.0, 45.0, 500)
+        values = np.concatenate([values, self.elevations, np.sort(values)])
+        for value in values:
+            self.assertEqual(self.table.lookup(value), np.interp(value, self.elevations, self.volumes))
+            self.assertEqual(self.table.inverse(value * 40.0),
+                             np.interp(value * 40.0, self.volumes, self.elevations))
+
+    def testArrayLookup(self):
+        values = np.linspace(-5.0, 45.0, 101)
+        np.testing.assert_array_equal(self.table.lookup(values), np.interp(values, self.elevations, self.volumes))
+
+    def testUnsorted(self):
+        table = RatingTable([20.0, 0.0, 10.0], [48.0, 0.0, 35.0])
+        self.assertEqual(table.lookup(12.0), 37.6)
+
+    def testDecreasingInverse(self):
+        table = RatingTable([0.0, 1.0, 2.0], [10.0, 4.0, 0.0])
+        self.assertAlmostEqual(table.inverse(7.0), 0.5)
+        self.assertAlmostEqual(table.inverse(2.0), 1.5)
+
+    def testNotMonotone(self):
+        table = RatingTable([0.0, 1.0, 2.0], [0.0, 4.0, 1.0])
+        with self.assertRaises(ValueError):
+            table.inverse(2.0)
+
+    def testBadTable(self):
+        with self.assertRaises(ValueError):
+            RatingTable([0.0, 1.0], [0.0, 1.0, 2.0])
+        with self.assertRaises(ValueError):
+            RatingTable([0.0, np.nan], [0.0, 1.0])
+
+
+if __name__ == '__main__':
+    unittest.main()
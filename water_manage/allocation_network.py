@@ -0,0 +1,163 @@
+import networkx as nx
+from water_manage.flow_network import Network
+
+
+class AllocationNetwork(Network):
+    """Allocate several supplies to many prioritized requests in one solve
+
+        Supply nodes (reservoirs, wells, diversions) feed demand nodes
+        through links with a capacity and a cost per unit of flow. Each
+        demand node has a Request with an amount and a priority. Every
+        time step is one minimum cost flow on the network:
+
+            source -> supply nodes (capacity = available supply)
+            links between nodes (capacity, weight = cost)
+            demand nodes -> sink (capacity = request amount,
+                                  weight = -benefit of the priority)
+            source -> sink spill (supply that is not delivered)
+
+        The benefit of each priority is larger than the next by more than
+        the cost of any path through the network, so a unit of supply
+        always goes to the highest priority request it can reach, as with
+        Allocator. Requests of equal priority are served through the
+        cheapest links first rather than curtailed in proportion.
+
+        The solver is a MinCostFlow that keeps its basis, so each time
+        step starts from the previous step's spanning tree. Changing a
+        supply, a link capacity or a request amount only updates the
+        solver's arrays; adding nodes or changing a priority rebuilds it.
+        Network simplex is only exact for whole numbers, so supplies,
+        amounts, capacities and costs are solved as whole multiples of
+        1 / scale. After every solve the deliveries and the remainder are
+        checked against the total supply.
+
+        Attributes
+        ----------
+        supplies : dict
+            Available amount of each supply node
+        requests : dict
+            Request of each demand node, keyed by node name
+        deliveries : dict
+            Delivery to each request and the 'remainder' left unused,
+            worked out on read if anything has changed
+        stale : bool
+            True when the deliveries need to be worked out again
+        scale : float
+            Quantities and costs are rounded to multiples of 1 / scale
+            (default 1e6)
+
+        Methods
+        -------
+        add_supply_node(name, amount)
+        add_link(upstream_name, downstream_name, capacity, cost)
+        add_request(request)
+        set_supply(name, amount)
+        allocate()
+        request_changed()
+    """
+
+    def __init__(self, scale=1e6):
+        Network.__init__(self, scale)
+        self.calc_method = 'min_cost'
+        self.supplies = {}
+        self.requests = {}
+        self.stale = True
+        self.flows = {}
+        self._deliveries = {}
+        self._weights_stale = True
+        self.dg.add_edge(self.source, self.sink, weight=0)
+
+    def add_supply_node(self, name, amount=0.0):
+        """Add a node that can supply up to amount each time step"""
+        self.reset_solvers()
+        self.supplies[name] = amount
+        self.dg.add_edge(self.source, name, capacity=amount, weight=0)
+        self.stale = True
+
+    def add_link(self, upstream_name, downstream_name, capacity=None, cost=0.0):
+        """Connect two nodes with a link of limited capacity and a cost per unit of flow"""
+        self.reset_solvers()
+        self.dg.add_edge(upstream_name, downstream_name, capacity=capacity, weight=cost)
+        self._weights_stale = True
+        self.stale = True
+
+    def add_request(self, request):
+        """Add a demand node for a Request, named after the request"""
+        self.reset_solvers()
+        request.add_allocator(self)
+        self.requests[request.name] = request
+        self.dg.add_edge(request.name, self.sink, capacity=request.amount, weight=0)
+        self.request_changed(priority=True)
+
+    def get_request(self, name):
+        return self.requests.get(name)
+
+    def request_changed(self, priority=False):
+        """Note that a request amount or priority has changed
+
+            Requests call this themselves when their amount or priority is
+            set.
+        """
+        self.stale = True
+        if priority:
+            self._weights_stale = True
+
+    def set_supply(self, name, amount):
+        self.supplies[name] = amount
+        self.link_capacity(self.source, name, amount)
+
+    def link_capacity(self, upstream_name, downstream_name, capacity):
+        if self.dg[upstream_name][downstream_name].get('capacity') != capacity:
+            self.stale = True
+        Network.link_capacity(self, upstream_name, downstream_name, capacity)
+
+    @property
+    def deliveries(self):
+        if self.stale:
+            self.allocate()
+        return self._deliveries
+
+    def _set_weights(self):
+        """Benefits of each priority, spaced by more than the cost of any path
+
+            The spacing is a whole number of solver units, larger than the
+            rounded cost of every link added together.
+        """
+        spacing = 1 + sum(round(abs(w) * self.scale) for u, v, w in self.dg.edges(data='weight', default=0)
+                          if v != self.sink)
+        priorities = sorted(set(request.priority for request in self.requests.values()))
+        rank = {p: len(priorities) - i for i, p in enumerate(priorities)}
+        for name, request in self.requests.items():
+            self.dg[name][self.sink]['weight'] = -spacing * rank[request.priority] / self.scale
+        self.reset_solvers()
+        self._weights_stale = False
+
+    def allocate(self):
+        """Solve the allocation for the current supplies and requests
+
+            Returns
+            -------
+            dict
+                Delivery to each request and the 'remainder' of the
+                supplies that is not delivered
+        """
+        if self._weights_stale:
+            self._set_weights()
+        for name, request in self.requests.items():
+            self.link_capacity(name, self.sink, request.amount)
+        total = sum(self.supplies.values())
+        self.dg.nodes[self.source]['demand'] = -total
+        self.dg.nodes[self.sink]['demand'] = total
+        solver = self.get_min_cost()
+        solver.set_demand(self.source, -total)
+        solver.set_demand(self.sink, total)
+        cost, self.flows = solver.solve()
+
+        self._deliveries = {name: max(float(self.flows[name][self.sink]), 0.0) for name in self.requests}
+        self._deliveries['remainder'] = float(self.flows[self.source][self.sink])
+        # Each supply and the total are rounded to solver units on their own
+        tolerance = (len(self.supplies) + 1) / self.scale
+        if abs(sum(self._deliveries.values()) - total) > tolerance:
+            raise nx.NetworkXUnfeasible('deliveries and remainder do not add up to the supply')
+        self.stale = False
+        return self._deliveries
@@ -1,12 +1,15 @@
+import numpy as np
 from water_manage.request import Request
 
 
 class Allocator:
     """The Allocator is used to allocate multiple demands of a finite and limited source amount.
         
-        This object does not carry state so the update function
-        can be called immediately each time any of the requests
-        or supply is updated.
+        Deliveries are worked out when they are read, and only if the
+        supply or a request has changed since the last update. Requests
+        tell the allocator that holds them when their amount or priority
+        is set, so add requests with add_request() rather than appending
+        to the list.
         
         Attributes
         ----------
@@ -20,11 +23,16 @@ class Allocator:
             Note that curtailment of request is shared among all demands proportional to it's demand.
         total_delivery: float
             Sum of all delivery amounts
+        stale : bool
+            True when the deliveries need to be worked out again
 
         Methods
         -------
         update() : calculates the delivery to each request
+        allocate_array() : deliveries for one supply or an array of supplies at once
         add_request() : add new request to the list
+        get_request() : find a request by name
+        request_changed() : called by requests when their amount or priority is set
         
     """
     def __init__(self, supply=0.0, requests=None):
@@ -38,25 +46,44 @@ class Allocator:
         self.remain_amount = self._supply
         self._deliveries = {}
         self.update_counter = 0
+        self._by_name = {}
+        for request in self.requests:
+            request.add_allocator(self)
+            self._by_name[request.name] = request
+        self.request_changed(priority=True)
         self.update()
 
+    def request_changed(self, priority=False):
+        """Note that a request amount or priority has changed
+
+            Requests call this themselves when their amount or priority is
+            set. Deliveries are then worked out again on the next read
+            and, when a priority changed, the requests are sorted now.
+        """
+        self.stale = True
+        self._arrays = None
+        self._total_requests = None
+        if priority:
+            self.sort_requests()
+
     @property
     def supply(self):
         return self._supply
     
     @supply.setter
     def supply(self, amount):
-        self._supply = amount
-        self.update()
+        if amount != self._supply:
+            self._supply = amount
+            self.stale = True
         
     @property
     def deliveries(self):
-        self.update()
+        if self.stale:
+            self.update()
         return self._deliveries
     
     def edit_priority(self, request_name, new_priority):
         self.get_request(request_name).priority = new_priority
-        self.update()
         
     # def add_request(self, name, amount, priority=1):
     #     new_request = Request(name, amount, priority)
@@ -66,15 +93,13 @@ class Allocator:
     def add_request(self, new_request):
         """Add a request to the allocator and update the list."""
         self.requests.append(new_request)
-        self.update()
+        self.num_requests = len(self.requests)
+        new_request.add_allocator(self)
+        self._by_name[new_request.name] = new_request
+        self.request_changed(priority=True)
         
     def get_request(self, name):
-        request = None
-        for i in range(self.num_requests):
-            if name == self.requests[i].name:
-                request = self.requests[i]
-                break
-        return request
+        return self._by_name.get(name)
     
     def update(self):
         """Iterate over each demand and allocate supply.
@@ -83,8 +108,6 @@ class Allocator:
             the supply and continue down the list by providing the remainder supply until
             remainder is zero.
             
-            TODO: skip over functions here if supply > sum(requests)
-            
             If 1 or more requests have equal priority, then add all these up and allocate
             as one entity then divide amount supplied in proportion to each request amount.
             
@@ -95,41 +118,50 @@ class Allocator:
             -------
             None
         """
-        self.remain_amount = self._supply
+        deliveries, remainder = self.allocate_array(self._supply)
+        deliveries = deliveries.tolist()
+        for request, delivery in zip(self.requests, deliveries):
+            request.delivery = delivery
+        self._deliveries = dict(zip([request.name for request in self.requests], deliveries))
+        self._deliveries['remainder'] = self.remain_amount = float(remainder)
+        self.update_counter += 1
+        self.stale = False
+
+    def allocate_array(self, supply):
+        """Allocate one supply or a whole array of supplies at once
+
+            Works on arrays of the request amounts in priority order.
+            The supply left for each request is a cumulative subtraction
+            of the amounts before it, done in the same order as a loop
+            over the requests, so the deliveries are identical to
+            allocating each supply one at a time. The arrays are kept
+            until a request changes.
+
+            Parameters
+            ----------
+            supply : float or array[float]
+                Supply for one time step, or (S,) supplies such as many
+                time steps or many nodes
+
+            Returns
+            -------
+            deliveries : numpy.ndarray
+                (n,) or (S, n) delivery to each request in self.requests order
+            remainder : float or numpy.ndarray
+                Supply left after all requests
+        """
         self.num_requests = len(self.requests)
-        self.sort_requests()
-        i = 0
-        while True:
-            # Iterate over the requests until the end is hit.
-            if i == self.num_requests:
-                # After we iterate over all requests, add just one more for remainder
-                self._deliveries['remainder'] = self.remain_amount
-                break
-                
-            first_index = i
-            # Group all requests with equal priority
-            request_group = [self.requests[i]]
-
-            while True:
-                # Find all subsequent requests that have the same priority
-                # The group of requests with the same priority are called a "request_group"
-                # Start with the first in the request_group
-                if i == self.num_requests - 1:
-                    # We are looking at the last request in the list
-                    i += 1
-                    break
-                this_request = self.requests[i]
-                next_request = self.requests[i + 1]
-                if this_request.priority == next_request.priority:
-                    # append to request_group
-                    request_group.append(self.requests[i + 1])
-                    # cluster_request_amount += self.requests[cluster_index + 1].amount
-                    i += 1
-                else:
-                    # If the end of the list is reached, stop iterating over list of requests
-                    i += 1
-                    break
-            self.allocate(request_group, first_index)
+        return allocate_groups(supply, *self._request_arrays())
+
+    def _request_arrays(self):
+        """Request amounts in priority order with the start index and total
+            amount of each group of equal priority"""
+        if self._arrays is None:
+            priorities = np.array([request.priority for request in self.requests])
+            amounts = np.array([request.amount for request in self.requests], dtype=float)
+            starts = group_starts(priorities)
+            self._arrays = amounts, starts, group_totals(amounts, starts)
+        return self._arrays
             
     def allocate(self, requests, index=0):
         """Perform allocation of the supply from all requests of the same priority.
@@ -160,13 +192,88 @@ class Allocator:
             self.remain_amount = 0.0
 
     def total_deliveries(self):
-        return sum(self._deliveries.values())
+        return sum(self.deliveries.values())
     
     def total_requests(self):
-        total = 0.0
-        for req in self.requests:
-            total += req.amount
-        return total
+        if self._total_requests is None:
+            total = 0.0
+            for req in self.requests:
+                total += req.amount
+            self._total_requests = total
+        return self._total_requests
     
     def sort_requests(self):
-        self.requests = sorted(self.requests, key=lambda x: x.priority)
\ No newline at end of file
+        self.requests.sort(key=lambda x: x.priority)
+
+
+def group_starts(priorities):
+    """Index of the first request of each run of equal sorted priorities"""
+    return np.flatnonzero(np.diff(priorities, prepend=np.nan) != 0)
+
+
+def group_totals(amounts, starts):
+    """Total amount of each priority group, added in order as sum() does
+
+        amounts may be (n,) or (S, n) for S sets of amounts.
+    """
+    amounts = np.asarray(amounts, dtype=float)
+    ends = np.append(starts[1:], amounts.shape[-1]).tolist()
+    if not ends:
+        return np.zeros(amounts.shape[:-1] + (0,))
+    return np.stack([np.add.accumulate(amounts[..., start:end], axis=-1)[..., -1]
+                     for start, end in zip(starts.tolist(), ends)], axis=-1)
+
+
+def allocate_groups(supply, amounts, starts, totals):
+    """Allocate supplies to requests sorted by priority
+
+        The supply left for each request is a cumulative subtraction of
+        the amounts before it, done in the same order as a loop over the
+        requests. A group of equal priority that cannot be met in full is
+        curtailed in proportion to each amount and leaves nothing for the
+        groups after it.
+
+        Parameters
+        ----------
+        supply : float or array[float]
+            Supply for one time step, or (S,) supplies
+        amounts : numpy.ndarray
+            (n,) request amounts in priority order, or (S, n) amounts
+            for each supply
+        starts : numpy.ndarray
+            Index of the first request of each priority group
+        totals : numpy.ndarray
+            (g,) total amount of each group, or (S, g) with (S, n) amounts
+
+        Returns
+        -------
+        deliveries : numpy.ndarray
+            (n,) or (S, n) delivery to each request
+        remainder : float or numpy.ndarray
+            Supply left after all requests
+    """
+    supply = np.asarray(supply, dtype=float)
+    supplies = supply.reshape(-1, 1)
+    count = amounts.shape[-1]
+
+    # Supply left before each request if no group were short
+    left = np.hstack([supplies, np.broadcast_to(amounts, (len(supplies), count))])
+    left = np.subtract.accumulate(left, axis=1)
+    group_left = left[:, starts]
+    # Groups asking for nothing get nothing, even with a rounding deficit
+    full = (group_left >= totals) | (totals == 0.0)
+    # Once a group is short, every later group starts with nothing
+    short_before = np.hstack([np.zeros((len(supplies), 1), dtype=bool),
+                              np.logical_or.accumulate(~full, axis=1)[:, :-1]])
+    group_left = np.where(short_before, 0.0, group_left)
+    full = (group_left >= totals) | (totals == 0.0)
+
+    sizes = np.diff(np.append(starts, count))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shortage = np.repeat(totals - group_left, sizes, axis=1)
+        deliveries = np.where(np.repeat(full, sizes, axis=1), amounts,
+                              amounts - shortage * amounts / np.repeat(totals, sizes, axis=-1))
+    remainder = np.where(full.all(axis=1), left[:, -1], 0.0)
+    if supply.ndim == 0:
+        return deliveries[0], float(remainder[0])
+    return deliveries.reshape(supply.shape + (count,)), remainder.reshape(supply.shape)
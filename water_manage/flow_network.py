@@ -1,6 +1,11 @@
+import os
 import networkx as nx
+import numpy as np
 import matplotlib.pyplot as plt
 from hydrology.catchment import Catchment
+from water_manage.routing import Router
+from water_manage.min_cost_flow import MinCostFlow
+from water_manage.graph_io import GraphTable, read_graphml, read_edgelist, read_adjacency
 
 
 class Network:
@@ -11,34 +16,86 @@ class Network:
         source
         sink
         dg : DiGraph
+        time_step : float
+            Length of a time step for channel reaches (default 1.0)
+        calc_method : str
+            'max' (networkx maximum_flow), 'min_cost' (networkx network
+            simplex) or 'route' (array routing for tree-shaped networks)
+        router : Router
+            Built on the first 'route' calculation and dropped whenever
+            nodes or edges are added
+        min_cost : MinCostFlow
+            Persistent solver for 'min_cost' that starts each solve from
+            the previous basis. Dropped whenever nodes or edges are added.
+        scale : float
+            'min_cost' solves capacities, demands and weights as whole
+            multiples of 1 / scale (default 1e6), as network simplex is
+            only exact for whole numbers
+            
+        Flows are cached between calls: 'route' only revisits the part of
+        the network downstream of changed capacities and 'max' reuses its
+        last flows until a capacity or the topology changes. Call
+        reset_solvers() after editing self.dg directly.
         
         Methods
         -------
         add_source()
         add_junction()
+        add_reach() : route the flow leaving a node through a channel reach
+        advance() : move channel reach states on to the next time step
         draw() : Draw the network
         outflow() : calculates the total discharge from the network to the sink node
-        load_from_file()
+        route_series() : flows at every node for a whole series of inputs
+        load_from_file() : GML, GraphML, CSV edge list or adjacency list
+        load_table() : build the network from a GraphTable
+        save_snapshot() : write the network and its state to a .npz file
+        load_snapshot() : restart from a file written by save_snapshot()
     
     """
-    def __init__(self):
+    def __init__(self, scale=1e6):
         self.dg = nx.DiGraph()
         self.dg.add_node('source')
         self.dg.add_node('sink')
         self.source = 'source'
         self.sink = 'sink'
         self.calc_method = 'max'
+        self.router = None
+        self.min_cost = None
+        self.max_flows = None
+        self.time_step = 1.0
+        self.scale = scale
+        
+    def reset_solvers(self):
+        """Drop the router and min cost solver so they are rebuilt from the
+            graph when next used. Call this after adding or removing nodes
+            or edges of self.dg directly."""
+        self.router = None
+        self.min_cost = None
+        self.max_flows = None
+        
+    def get_router(self):
+        if self.router is None:
+            self.router = Router(self.dg, self.source, self.sink, self.time_step)
+        return self.router
+        
+    def get_min_cost(self):
+        if self.min_cost is None:
+            self.min_cost = MinCostFlow(self.dg, scale=self.scale, weight_scale=self.scale)
+        return self.min_cost
         
     def add_catchment(self, node_name, downstream_name='sink'):
+        self.reset_solvers()
         self.dg.add_node(node_name, node_type='Catchment')
         self.dg.add_edge(self.source, node_name)
         self.dg.add_edge(node_name, downstream_name, capacity=0.0)
     
     def add_junction(self, name, downstream_name='sink'):
+        self.reset_solvers()
         self.dg.add_node(name, node_type='Junction')
         self.dg.add_edge(name, downstream_name)
         
     def add_supply(self, name, downstream_name, capacity=0.0):
+        self.reset_solvers()
         self.dg.add_edge(name, downstream_name, capacity=capacity)
         
     def add_splitter(self, name, downstream_nodes, source='source'):
@@ -48,11 +105,13 @@ class Network:
             ----------
             downstream_nodes : list of str
                 This list includes the names of all downstream nodes to connect to."""
+        self.reset_solvers()
         self.dg.add_edge(source, name)
         for i in range(len(downstream_nodes)):
             self.dg.add_edge(name, downstream_nodes[i])
         
     def add_demand(self, name, source='source', sink='sink', demand=None, cost=None):
+        self.reset_solvers()
         self.dg.add_edge(source, name, capacity=demand, weight=cost)
         self.dg.add_edge(name, sink)
         
@@ -64,12 +123,50 @@ class Network:
         nx.draw(network_copy, with_labels=True)
         plt.show()
         
+    def add_reach(self, node_name, k=0.0, x=0.0, lag=0):
+        """Route the flow leaving a node through a channel reach
+        
+            Only the 'route' method uses reaches. Reach states are kept by
+            the router and start empty whenever it is rebuilt.
+        
+            Parameters
+            ----------
+            k : float
+                Muskingum travel time, in the same units as time_step
+            x : float
+                Muskingum weighting of inflow against outflow (0 to 0.5)
+            lag : int
+                Whole time steps the flow is delayed before routing"""
+        self.reset_solvers()
+        succ = list(self.dg.successors(node_name))[0]
+        edge = self.dg[node_name][succ]
+        edge['muskingum_k'] = k
+        edge['muskingum_x'] = x
+        edge['lag'] = lag
+        
+    def advance(self):
+        """Move reach states on to the next time step. Call this between
+            time steps when the network has reaches."""
+        if self.router is not None:
+            self.router.advance()
+        
     def update_capacity(self, node_name, capacity):
         succ = list(self.dg.successors(node_name))[0]
-        self.dg[node_name][succ]['capacity'] = capacity
+        self.link_capacity(node_name, succ, capacity)
         
     def link_capacity(self, upstream_name, downstream_name, capacity):
-        self.dg[upstream_name][downstream_name]['capacity'] = capacity
+        edge = self.dg[upstream_name][downstream_name]
+        if edge.get('capacity') == capacity:
+            return
+        edge['capacity'] = capacity
+        self.max_flows = None
+        if self.min_cost is not None:
+            self.min_cost.set_capacity(upstream_name, downstream_name, capacity)
+        if self.router is not None:
+            if upstream_name == self.source:
+                self.router.set_supply(downstream_name, capacity)
+            else:
+                self.router.set_capacity(upstream_name, capacity)
     
     def update_all(self, capacity_dict):
         """Change this so the parameter is a simple dict of node: flow values
@@ -93,6 +190,9 @@ class Network:
             -------
             Flow (calculated using the Maximum_Flow algorithm of Networkx)
         """
+        if self.calc_method == 'route':
+            self.get_router().route()
+            return self.router.outflow()
         
         flow_dict = self.calc_flows()
         pred_list = list(self.dg.predecessors('sink'))
@@ -110,26 +210,227 @@ class Network:
         """
         flow_dict = {}
         if self.calc_method == 'max':
-            flow_value, flow_dict = nx.maximum_flow(self.dg, self.source, self.sink, capacity='capacity')
+            if self.max_flows is None:
+                flow_value, self.max_flows = nx.maximum_flow(self.dg, self.source, self.sink, capacity='capacity')
+            flow_dict = self.max_flows
         elif self.calc_method == 'min_cost':
-            flow_cost, flow_dict = nx.network_simplex(self.dg)
+            solver = self.get_min_cost()
+            solver.refresh()
+            flow_cost, flow_dict = solver.solve()
+        elif self.calc_method == 'route':
+            self.get_router().route()
+            flow_dict = self.router.flow_dict()
             
         return flow_dict
     
+    def route_series(self, capacity_matrix, inputs=None):
+        """Route flows for every time step at once on a pure routing network
+
+            Parameters
+            ----------
+            capacity_matrix : array[float]
+                (T, number of inputs) outflows of the input nodes, such as
+                catchment runoff for each day
+            inputs : list of str, optional
+                Input node names in column order. By default, every node
+                fed by the source in router order.
+
+            Returns
+            -------
+            numpy.ndarray
+                (T, number of nodes) flow leaving each node, with columns
+                in the order of self.get_router().nodes
+        """
+        router = self.get_router()
+        if inputs is None:
+            inputs = [router.nodes[i] for i in np.flatnonzero(router.supply > 0.0)]
+        return router.route_series(capacity_matrix, inputs)
+    
     def outflow_at_node(self, node_name):
+        if self.calc_method == 'route':
+            self.get_router().route()
+            return self.router.flow_at(node_name)
         succ = list(self.dg.successors(node_name))[0]
         flow_dict = self.calc_flows()
         return flow_dict[node_name][succ]
     
-    def load_from_file(self, filename):
-        self.dg = nx.read_gml(filename)
-        # Convert catchment labels to Catchment objects
-        for node in self.dg.copy().nodes():
-            try:
-                if self.dg.nodes[node]['node_type'] == 'Catchment':
-                    self.dg.add_edge(self.source, node)
-            except KeyError:
-                pass
-
-        # nx.set_node_attributes(self.dg, labels, 'labels')
+    def load_from_file(self, filename, source_name=None):
+        """Load a network from a file, replacing the current one
+
+            The format is picked from the file extension: .gml (networkx
+            GML), .graphml (read one element at a time), .csv (edge list)
+            and anything else as an adjacency list. See load_table() for
+            how catchments and the sink are found.
+
+            Parameters
+            ----------
+            filename : str
+            source_name : str, optional
+                Name of the node in the file that feeds the catchments
+
+            Returns
+            -------
+            list of str
+                Names of the catchment nodes
+        """
+        extension = os.path.splitext(filename)[1].lower()
+        if extension == '.gml':
+            table = GraphTable.from_graph(nx.read_gml(filename))
+        elif extension == '.graphml':
+            table = read_graphml(filename)
+        elif extension == '.csv':
+            table = read_edgelist(filename)
+        else:
+            table = read_adjacency(filename)
+        return self.load_table(table, source_name)
+
+    def load_table(self, table, source_name=None, complete=True):
+        """Build the network from a GraphTable, replacing the current one
+
+            Catchments are the nodes with node_type 'Catchment' when the
+            file gives node types, otherwise the nodes fed by the source
+            node, otherwise the headwater nodes. Each catchment is fed by
+            the source and, as with add_catchment(), its outlet capacity
+            starts at 0.0 unless the file sets it. Nodes that drain
+            nowhere drain to the sink.
+
+            Parameters
+            ----------
+            table : GraphTable
+            source_name : str, optional
+                Name of the node in the table that is the source. Defaults
+                to self.source.
+            complete : bool
+                Add the catchment supplies, sink outlets and catchment
+                capacities. Snapshots are saved complete and loaded with
+                False so they come back exactly as they were.
+
+            Returns
+            -------
+            list of str
+                Names of the catchment nodes
+        """
+        self.reset_solvers()
+        names = list(table.names)
+        source = table.index.get(self.source if source_name is None else source_name, -1)
+        if source >= 0:
+            names[source] = self.source
+        for name in (self.source, self.sink):
+            if name not in names:
+                names.append(name)
+        source = names.index(self.source)
+        sink = names.index(self.sink)
+        count = len(names)
+        upstream = table.upstream
+        downstream = table.downstream
+
+        fed = np.zeros(count, dtype=bool)
+        fed[downstream[upstream == source]] = True
+        if table.node_type:
+            catchment = np.array([table.node_type.get(name) == 'Catchment' for name in table.names]
+                                 + [False] * (count - len(table.names)))
+        elif fed.any():
+            catchment = fed.copy()
+        else:
+            catchment = np.bincount(downstream, minlength=count) == 0
+        terminal = np.bincount(upstream, minlength=count) == 0
+        catchment[[source, sink]] = False
+        terminal[[source, sink]] = False
+        if not complete:
+            fed[:] = True
+            terminal[:] = False
+
+        # New edges: catchment supplies and terminal outlets
+        new_supply = np.flatnonzero(catchment & ~fed)
+        new_outlet = np.flatnonzero(terminal)
+        upstream = np.concatenate([upstream, np.full(len(new_supply), source), new_outlet])
+        downstream = np.concatenate([downstream, new_supply, np.full(len(new_outlet), sink)])
+        attributes = {name: np.concatenate([values, np.full(len(new_supply) + len(new_outlet), np.nan)])
+                      for name, values in table.attributes.items()}
+        capacity = attributes.setdefault('capacity', np.full(len(upstream), np.nan))
+        if complete:
+            capacity[catchment[upstream] & np.isnan(capacity)] = 0.0
+
+        self.dg = nx.DiGraph()
+        self.dg.add_nodes_from(names)
+        nx.set_node_attributes(self.dg, table.node_type, 'node_type')
+        catchment_names = [names[i] for i in np.flatnonzero(catchment).tolist()]
+        nx.set_node_attributes(self.dg, dict.fromkeys(catchment_names, 'Catchment'), 'node_type')
+        columns = list(attributes)
+        rows = zip(*(attributes[name].tolist() for name in columns))
+        self.dg.add_edges_from((names[u], names[v], {name: value for name, value in zip(columns, row)
+                                                     if value == value})
+                               for u, v, row in zip(upstream.tolist(), downstream.tolist(), rows))
+
+        if self.calc_method == 'route':
+            # Build the router from the arrays rather than from the graph
+            keep = np.arange(count) != source
+            position = np.cumsum(keep) - 1
+            self.router = Router.from_arrays([name for name, k in zip(names, keep.tolist()) if k],
+                                             np.where(upstream == source, -1, position[upstream]),
+                                             position[downstream], attributes,
+                                             self.source, self.sink, self.time_step)
+        return catchment_names
+
+    def save_snapshot(self, filename):
+        """Write the network and its state to a NumPy .npz file
+
+            The topology, node types, numeric edge values (capacities and
+            reach parameters) and the channel reach states are written as
+            arrays, so load_snapshot() can restart from exactly this
+            point.
+
+            Parameters
+            ----------
+            filename : str
+        """
+        np.savez(filename, **self._snapshot_arrays())
+
+    def load_snapshot(self, filename):
+        """Replace the network with one written by save_snapshot()
+
+            Parameters
+            ----------
+            filename : str
+        """
+        with np.load(filename) as data:
+            self._restore_snapshot({name: data[name] for name in data.files})
+
+    def _snapshot_arrays(self):
+        table = GraphTable.from_graph(self.dg)
+        arrays = {'names': np.array([str(name) for name in table.names], dtype=str),
+                  'node_type': np.array([str(table.node_type.get(name) or '') for name in table.names],
+                                        dtype=str),
+                  'upstream': table.upstream,
+                  'downstream': table.downstream,
+                  'settings': np.array([self.source, self.sink, self.calc_method]),
+                  'time_step': np.array(self.time_step)}
+        for name, values in table.attributes.items():
+            arrays['edge_' + name] = values
+        if self.router is not None and self.router.reaches is not None:
+            owner = np.flatnonzero(self.router.reach_of >= 0)
+            owner = owner[np.argsort(self.router.reach_of[owner])]
+            arrays['reach_nodes'] = np.array([self.router.nodes[i] for i in owner.tolist()], dtype=str)
+            for name, values in self.router.reaches.get_state().items():
+                arrays['reach_' + name] = values
+        return arrays
+
+    def _restore_snapshot(self, data):
+        self.source, self.sink, self.calc_method = data['settings'].tolist()
+        self.time_step = float(data['time_step'])
+        table = GraphTable()
+        table.names = data['names'].tolist()
+        table.index = {name: i for i, name in enumerate(table.names)}
+        table.node_type = {name: node_type for name, node_type in zip(table.names, data['node_type'].tolist())
+                           if node_type}
+        table.upstream = data['upstream']
+        table.downstream = data['downstream']
+        table.attributes = {name[5:]: values for name, values in data.items() if name.startswith('edge_')}
+        Network.load_table(self, table, complete=False)
+        if 'reach_nodes' in data:
+            router = self.get_router()
+            index = router.reach_of[[router.index[name] for name in data['reach_nodes'].tolist()]]
+            state = {name[6:]: values for name, values in data.items()
+                     if name.startswith('reach_') and name != 'reach_nodes'}
+            router.reaches.set_state(state, index)
 
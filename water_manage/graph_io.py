@@ -0,0 +1,212 @@
+import csv
+from xml.etree import ElementTree
+import numpy as np
+
+# GraphML attribute types read as numbers
+NUMERIC_TYPES = ('int', 'long', 'float', 'double')
+
+
+class GraphTable:
+    """Nodes and edges read from a network file, held as compact arrays
+
+        Node names are numbered as they are first seen and each edge is
+        a pair of positions, so a file is read without building a
+        networkx attribute dict per node and edge.
+
+        Attributes
+        ----------
+        names : list of str
+            Node names in the order they were first seen
+        index : dict
+            Position of each node name
+        node_type : dict
+            Type of each node that has one ('Catchment', 'Junction', ...)
+        upstream, downstream : numpy.ndarray
+            Positions of the two ends of each edge
+        attributes : dict of numpy.ndarray
+            Numeric edge values keyed by attribute name, nan where an edge
+            does not have the attribute
+
+        Methods
+        -------
+        add_node(name, node_type=None)
+        add_edge(upstream_name, downstream_name, values=None)
+        finish()
+        from_graph(dg)
+    """
+
+    def __init__(self):
+        self.names = []
+        self.index = {}
+        self.node_type = {}
+        self.upstream = np.zeros(0, dtype=int)
+        self.downstream = np.zeros(0, dtype=int)
+        self.attributes = {}
+        self._upstream = []
+        self._downstream = []
+        self._values = {}
+
+    def add_node(self, name, node_type=None):
+        """Position of a node, adding it if it has not been seen"""
+        i = self.index.get(name)
+        if i is None:
+            i = self.index[name] = len(self.names)
+            self.names.append(name)
+        if node_type is not None:
+            self.node_type[name] = node_type
+        return i
+
+    def add_edge(self, upstream_name, downstream_name, values=None):
+        """Add an edge with an optional dict of numeric values"""
+        edge = len(self._upstream)
+        self._upstream.append(self.add_node(upstream_name))
+        self._downstream.append(self.add_node(downstream_name))
+        if values:
+            for name, value in values.items():
+                self._values.setdefault(name, ([], []))
+                self._values[name][0].append(edge)
+                self._values[name][1].append(value)
+
+    def finish(self):
+        """Move the edges added so far into the arrays"""
+        self.upstream = np.concatenate([self.upstream, np.array(self._upstream, dtype=int)])
+        self.downstream = np.concatenate([self.downstream, np.array(self._downstream, dtype=int)])
+        count = len(self.upstream)
+        for name, values in self.attributes.items():
+            self.attributes[name] = np.concatenate([values, np.full(count - len(values), np.nan)])
+        for name, (edges, values) in self._values.items():
+            array = self.attributes.setdefault(name, np.full(count, np.nan))
+            array[np.array(edges, dtype=int) + count - len(self._upstream)] = values
+        self._upstream = []
+        self._downstream = []
+        self._values = {}
+        return self
+
+    @classmethod
+    def from_graph(cls, dg):
+        """Table of a networkx graph, keeping node_type and numeric edge values"""
+        table = cls()
+        for node, data in dg.nodes(data=True):
+            table.add_node(node, data.get('node_type'))
+        for u, v, data in dg.edges(data=True):
+            table.add_edge(u, v, {name: value for name, value in data.items() if _is_number(value)})
+        return table.finish()
+
+
+def _is_number(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def read_graphml(filename):
+    """Read a GraphML file one element at a time
+
+        Node and edge elements are dropped as soon as they are read, so
+        memory use grows with the arrays rather than the XML tree. Edges
+        are read from source to target whatever the edgedefault. The
+        node_type attribute is kept for nodes and numeric attributes for
+        edges; other attributes are skipped.
+
+        Parameters
+        ----------
+        filename : str
+
+        Returns
+        -------
+        GraphTable
+    """
+    table = GraphTable()
+    keys = {}
+    defaults = {}
+    graph = None
+    for event, elem in ElementTree.iterparse(filename, events=('start', 'end')):
+        tag = elem.tag.rpartition('}')[2]
+        if event == 'start':
+            if tag == 'graph' and graph is None:
+                graph = elem
+            continue
+        if tag == 'key':
+            name = elem.get('attr.name', elem.get('id'))
+            kind = elem.get('for', 'all')
+            numeric = elem.get('attr.type', 'string') in NUMERIC_TYPES
+            keys[elem.get('id')] = (name, kind, numeric)
+            default = next((child.text for child in elem if child.tag.rpartition('}')[2] == 'default'), None)
+            if default is not None and numeric and kind in ('edge', 'all'):
+                defaults[name] = float(default)
+        elif tag == 'node':
+            node_type = None
+            for data in elem:
+                name, kind, numeric = keys.get(data.get('key'), (None, None, False))
+                if name == 'node_type':
+                    node_type = data.text
+            table.add_node(elem.get('id'), node_type)
+            _drop(graph, elem)
+        elif tag == 'edge':
+            values = dict(defaults)
+            for data in elem:
+                name, kind, numeric = keys.get(data.get('key'), (None, None, False))
+                if numeric and kind in ('edge', 'all'):
+                    values[name] = float(data.text)
+            table.add_edge(elem.get('source'), elem.get('target'), values)
+            _drop(graph, elem)
+    return table.finish()
+
+
+def _drop(graph, elem):
+    """Free an element that has been read"""
+    elem.clear()
+    if graph is not None and len(graph) and graph[-1] is elem:
+        del graph[-1]
+
+
+def read_edgelist(filename):
+    """Read a CSV edge list
+
+        The first row is a header. The first two columns hold the
+        upstream and downstream node names and any other columns hold
+        numeric edge values such as capacity, lag, muskingum_k and
+        muskingum_x. Empty cells are not set.
+
+        Parameters
+        ----------
+        filename : str
+
+        Returns
+        -------
+        GraphTable
+    """
+    table = GraphTable()
+    with open(filename, newline='') as f:
+        reader = csv.reader(f, skipinitialspace=True)
+        header = [name.strip() for name in next(reader)]
+        for row in reader:
+            if not row or row[0].startswith('#'):
+                continue
+            values = {name: float(value) for name, value in zip(header[2:], row[2:]) if value.strip()}
+            table.add_edge(row[0].strip(), row[1].strip(), values)
+    return table.finish()
+
+
+def read_adjacency(filename):
+    """Read an adjacency list such as data_external/watershed_adj_input
+
+        Each line holds a node name followed by the names of the nodes it
+        drains to, separated by white space. Text after a # is ignored.
+
+        Parameters
+        ----------
+        filename : str
+
+        Returns
+        -------
+        GraphTable
+    """
+    table = GraphTable()
+    with open(filename) as f:
+        for line in f:
+            names = line.partition('#')[0].split()
+            if not names:
+                continue
+            table.add_node(names[0])
+            for name in names[1:]:
+                table.add_edge(names[0], name)
+    return table.finish()
@@ -0,0 +1,532 @@
+from itertools import chain, islice, repeat
+from math import ceil, sqrt
+import networkx as nx
+
+inf = float('inf')
+
+
+class MinCostFlow:
+    """A persistent network simplex solver for minimum cost flow
+
+        The solver follows networkx.network_simplex (an artificial root
+        joined to every node, a spanning tree basis held as depth-first
+        threads and block pivoting) but keeps the basis between solves.
+        Only capacities and demands are expected to change between time
+        steps, so the next solve starts from the previous spanning tree:
+        the flows on the tree are recomputed for the new capacities and
+        demands and pivoting carries on from there. Parts of the tree that
+        can no longer carry their flow are hung from the artificial root
+        and pivoted back in. The first solve, or one that pivots for too
+        long, starts from the artificial basis just like network_simplex.
+
+        The graph's nodes, edges and weights are read once. Capacities and
+        demands are read again by refresh() or set with set_capacity()
+        and set_demand(). Edge capacities of None are treated as infinite.
+
+        Like network_simplex, the pivoting is only exact for whole
+        numbers: with fractional values the tree flows pick up rounding
+        error, and a solve can cycle or lose flow. Capacities, demands and
+        weights must therefore be whole numbers, or a scale must be given
+        that they are multiplied by and rounded with. Flows and the cost
+        are returned in the original units. After each solve the flow into
+        and out of every node is checked against its demand; a warm start
+        that fails the check is solved again from a cold start.
+
+        Parameters
+        ----------
+        dg : DiGraph
+        demand, capacity, weight : str
+            Names of the node and edge attributes
+        scale : float, optional
+            Capacities and demands are rounded to multiples of 1 / scale
+        weight_scale : float, optional
+            Weights are rounded to multiples of 1 / weight_scale
+
+        Attributes
+        ----------
+        dg : DiGraph
+            The graph the solver was built from
+        node_list : list
+            Nodes in solver order
+        edge_list : list of tuple
+            (u, v) of each edge in solver order (self loops not included)
+        warm_started : bool
+            True if the last solve started from the previous basis
+        pivots : int
+            Number of pivots of the last solve
+
+        Methods
+        -------
+        refresh()
+        set_capacity(u, v, capacity)
+        set_demand(node, demand)
+        solve()
+    """
+
+    def __init__(self, dg, demand='demand', capacity='capacity', weight='weight', scale=None, weight_scale=None):
+        self.dg = dg
+        self.demand_name = demand
+        self.capacity_name = capacity
+        self.weight_name = weight
+        self.scale = scale
+        self.weight_scale = weight_scale
+
+        self.node_list = list(dg)
+        self.node_indices = {u: i for i, u in enumerate(self.node_list)}
+        self.edge_list = [(u, v) for u, v in dg.edges() if u != v]
+        self.edge_indices = {e: i for i, e in enumerate(self.edge_list)}
+        self.edge_count = len(self.edge_list)
+        self.edge_sources = [self.node_indices[u] for u, v in self.edge_list]
+        self.edge_targets = [self.node_indices[v] for u, v in self.edge_list]
+        self.edge_weights = []
+        for u, v in self.edge_list:
+            w = dg[u][v].get(weight, 0)
+            if abs(w) == inf:
+                raise nx.NetworkXError('edge ' + repr((u, v)) + ' has infinite weight')
+            self.edge_weights.append(_whole(w, weight_scale, 'weight'))
+        self.self_loops = [(u, v) for u, v in dg.edges() if u == v]
+
+        self.node_demands = [0] * len(self.node_list)
+        self.edge_capacities = [inf] * self.edge_count
+        self.refresh()
+
+        self.edge_flow = None
+        self.node_potentials = None
+        self.parent = None
+        self.parent_edge = None
+        self.subtree_size = None
+        self.next_node_dft = None
+        self.prev_node_dft = None
+        self.last_descendent_dft = None
+        self.warm_started = False
+        self.pivots = 0
+
+    def refresh(self):
+        """Read capacities and demands from the graph again"""
+        nodes = self.dg.nodes
+        scale = self.scale
+        self.node_demands = [_whole(nodes[u].get(self.demand_name, 0), scale, 'demand') for u in self.node_list]
+        dg = self.dg
+        name = self.capacity_name
+        capacities = self.edge_capacities
+        for i, (u, v) in enumerate(self.edge_list):
+            c = dg[u][v].get(name, inf)
+            capacities[i] = inf if c is None else _whole(c, scale, 'capacity')
+
+    def set_capacity(self, u, v, capacity):
+        self.edge_capacities[self.edge_indices[(u, v)]] = (inf if capacity is None
+                                                           else _whole(capacity, self.scale, 'capacity'))
+
+    def set_demand(self, node, demand):
+        self.node_demands[self.node_indices[node]] = _whole(demand, self.scale, 'demand')
+
+    def solve(self):
+        """Find a minimum cost flow for the current capacities and demands
+
+            Returns
+            -------
+            flow_cost : float
+            flow_dict : dict
+                Flows keyed by node and then by downstream node, as
+                returned by networkx.network_simplex
+
+            Raises
+            ------
+            ValueError
+                If a value is not a whole number and no scale was given
+            NetworkXUnfeasible
+                If no flow satisfies all node demands
+            NetworkXUnbounded
+                If there is a negative cost cycle of infinite capacity
+        """
+        if sum(self.node_demands) != 0:
+            raise nx.NetworkXUnfeasible('total node demand is not zero')
+        for e, c in zip(self.edge_list, self.edge_capacities):
+            if c < 0:
+                raise nx.NetworkXUnfeasible('edge ' + repr(e) + ' has negative capacity')
+
+        n = len(self.node_list)
+        m = self.edge_count
+        faux_inf = 3 * max(sum(c for c in self.edge_capacities[:m] if c < inf),
+                           sum(abs(w) for w in self.edge_weights[:m]),
+                           sum(abs(d) for d in self.node_demands)) or 1
+
+        self.warm_started = self.parent is not None
+        if self.warm_started:
+            self._warm_start(n, faux_inf)
+        else:
+            self._cold_start(n, faux_inf)
+
+        # A warm basis need not be strongly feasible, so guard against
+        # cycling by falling back to a cold start
+        limit = 20 * (self.edge_count + n) + 100
+        self.pivots = self._pivot(limit)
+        if self.pivots > limit or (self.warm_started and not self._balanced()):
+            self._cold_start(n, faux_inf)
+            self.warm_started = False
+            self.pivots = self._pivot(inf)
+
+        # Flows carried over from earlier solves pick up rounding error, so
+        # artificial flows are compared against a tolerance
+        tolerance = 1e-12 * faux_inf
+        if any(abs(self.edge_flow[i]) > tolerance for i in range(m, m + n)):
+            raise nx.NetworkXUnfeasible('no flow satisfies all node demands')
+        if any(self.edge_flow[i] * 2 >= faux_inf for i in range(self.edge_count)):
+            raise nx.NetworkXUnbounded('negative cycle with infinite capacity found')
+        if not self._balanced():
+            raise nx.NetworkXUnfeasible('flows do not balance the node demands')
+
+        flow_cost = sum(w * x for w, x in zip(self.edge_weights, self.edge_flow))
+        if self.scale is not None:
+            flow_cost /= self.scale
+        if self.weight_scale is not None:
+            flow_cost /= self.weight_scale
+        flow_dict = {u: {} for u in self.node_list}
+        for (u, v), x in zip(self.edge_list, self.edge_flow):
+            flow_dict[u][v] = x if self.scale is None else x / self.scale
+        for u, v in self.self_loops:
+            data = self.dg[u][v]
+            w = data.get(self.weight_name, 0)
+            c = data.get(self.capacity_name, inf)
+            if w < 0:
+                if c is None or c == inf:
+                    raise nx.NetworkXUnbounded('negative cycle with infinite capacity found')
+                flow_cost += w * c
+                flow_dict[u][v] = c
+            else:
+                flow_dict[u][v] = 0
+        return flow_cost, flow_dict
+
+    def _balanced(self):
+        """True if the real edge flows meet every node demand"""
+        net = list(self.node_demands)
+        for i in range(self.edge_count):
+            x = self.edge_flow[i]
+            if x:
+                net[self.edge_sources[i]] += x
+                net[self.edge_targets[i]] -= x
+        return not any(net)
+
+    def _cold_start(self, n, faux_inf):
+        """Artificial basis of network_simplex: every node joined to the root"""
+        m = self.edge_count
+        del self.edge_sources[m:]
+        del self.edge_targets[m:]
+        for i, d in enumerate(self.node_demands):
+            # Zero-demand nodes point towards the root for strong feasibility
+            if d > 0:
+                self.edge_sources.append(-1)
+                self.edge_targets.append(i)
+            else:
+                self.edge_sources.append(i)
+                self.edge_targets.append(-1)
+        self._set_artificial_costs(n, faux_inf)
+
+        self.edge_flow = list(chain(repeat(0, m), (abs(d) for d in self.node_demands)))
+        self.node_potentials = [faux_inf if d <= 0 else -faux_inf for d in self.node_demands] + [0]
+        self.parent = list(chain(repeat(-1, n), [None]))
+        self.parent_edge = list(range(m, m + n)) + [None]
+        self.subtree_size = list(chain(repeat(1, n), [n + 1]))
+        self.next_node_dft = list(chain(range(1, n), [-1, 0]))
+        self.prev_node_dft = list(range(-1, n))
+        self.last_descendent_dft = list(chain(range(n), [n - 1]))
+
+    def _set_artificial_costs(self, n, faux_inf):
+        m = self.edge_count
+        self.edge_weights[m:] = [faux_inf] * n
+        self.edge_capacities[m:] = [faux_inf] * n
+
+    def _warm_start(self, n, faux_inf):
+        """Recompute the flows and potentials of the previous spanning tree
+
+            Non-tree edges stay at the bound they were at and the tree
+            edge flows follow from the new demands. Where a tree edge
+            would carry a flow outside its bounds, the subtree below it is
+            cut off and hung from the root by its artificial edge, which
+            carries the imbalance at the big-M cost until pivoting removes
+            it. The rest of the previous basis is kept.
+        """
+        m = self.edge_count
+        self._set_artificial_costs(n, faux_inf)
+        in_tree = [False] * (m + n)
+        for e in self.parent_edge:
+            if e is not None:
+                in_tree[e] = True
+
+        flow = self.edge_flow
+        capacities = self.edge_capacities
+        required = list(self.node_demands) + [0]
+        for i in range(m + n):
+            if in_tree[i]:
+                continue
+            x = capacities[i] if flow[i] != 0 and capacities[i] < inf else 0
+            flow[i] = x
+            if x:
+                required[self.edge_sources[i]] += x
+                required[self.edge_targets[i]] -= x
+
+        # Tree edge flows from the leaves up
+        for v in reversed(self._thread()):
+            e = self.parent_edge[v]
+            p = self.parent[v]
+            x = required[v] if self.edge_targets[e] == v else -required[v]
+            if x < 0 or x > capacities[e]:
+                a = m + v
+                if e != a:
+                    flow[e] = 0
+                    self._remove_edge(p, v)
+                    self._add_edge(a, -1, v)
+                    p = -1
+                if required[v] > 0:
+                    self.edge_sources[a] = -1
+                    self.edge_targets[a] = v
+                else:
+                    self.edge_sources[a] = v
+                    self.edge_targets[a] = -1
+                x = abs(required[v])
+                e = a
+            flow[e] = x
+            required[p] += required[v]
+
+        # Potentials from the root down so every tree edge has zero reduced cost
+        potentials = self.node_potentials
+        potentials[-1] = 0
+        for v in self._thread():
+            e = self.parent_edge[v]
+            p = self.parent[v]
+            if self.edge_targets[e] == v:
+                potentials[v] = potentials[p] - self.edge_weights[e]
+            else:
+                potentials[v] = potentials[p] + self.edge_weights[e]
+
+    def _thread(self):
+        """Nodes in depth-first order from the root (the root not included)"""
+        order = []
+        v = self.next_node_dft[-1]
+        while v != -1:
+            order.append(v)
+            v = self.next_node_dft[v]
+        return order
+
+    def _pivot(self, limit):
+        """Pivot until optimal or until the limit is passed"""
+        pivots = 0
+        for i, p, q in self._find_entering_edges():
+            pivots += 1
+            if pivots > limit:
+                break
+            Wn, We = self._find_cycle(i, p, q)
+            j, s, t = self._find_leaving_edge(Wn, We)
+            self._augment_flow(Wn, We, self._residual_capacity(j, s))
+            # Do nothing more if the entering edge is the same as the leaving edge
+            if i != j:
+                if self.parent[t] != s:
+                    # Ensure that s is the parent of t
+                    s, t = t, s
+                if We.index(i) > We.index(j):
+                    # Ensure that q is in the subtree rooted at t
+                    p, q = q, p
+                self._remove_edge(s, t)
+                self._make_root(q)
+                self._add_edge(i, p, q)
+                self._update_potentials(i, p, q)
+        return pivots
+
+    def _find_apex(self, p, q):
+        """Lowest common ancestor of nodes p and q in the spanning tree"""
+        size_p = self.subtree_size[p]
+        size_q = self.subtree_size[q]
+        while True:
+            while size_p < size_q:
+                p = self.parent[p]
+                size_p = self.subtree_size[p]
+            while size_p > size_q:
+                q = self.parent[q]
+                size_q = self.subtree_size[q]
+            if size_p == size_q:
+                if p != q:
+                    p = self.parent[p]
+                    size_p = self.subtree_size[p]
+                    q = self.parent[q]
+                    size_q = self.subtree_size[q]
+                else:
+                    return p
+
+    def _trace_path(self, p, w):
+        """Nodes and edges on the path from node p to its ancestor w"""
+        Wn = [p]
+        We = []
+        while p != w:
+            We.append(self.parent_edge[p])
+            p = self.parent[p]
+            Wn.append(p)
+        return Wn, We
+
+    def _find_cycle(self, i, p, q):
+        """Nodes and edges on the cycle made by adding edge i == (p, q)
+            to the spanning tree, oriented from p to q"""
+        w = self._find_apex(p, q)
+        Wn, We = self._trace_path(p, w)
+        Wn.reverse()
+        We.reverse()
+        if We != [i]:
+            We.append(i)
+        WnR, WeR = self._trace_path(q, w)
+        del WnR[-1]
+        Wn += WnR
+        We += WeR
+        return Wn, We
+
+    def _augment_flow(self, Wn, We, f):
+        for i, p in zip(We, Wn):
+            if self.edge_sources[i] == p:
+                self.edge_flow[i] += f
+            else:
+                self.edge_flow[i] -= f
+
+    def _trace_subtree(self, p):
+        yield p
+        last = self.last_descendent_dft[p]
+        while p != last:
+            p = self.next_node_dft[p]
+            yield p
+
+    def _remove_edge(self, s, t):
+        """Remove an edge (s, t) where parent[t] == s from the spanning tree"""
+        size_t = self.subtree_size[t]
+        prev_t = self.prev_node_dft[t]
+        last_t = self.last_descendent_dft[t]
+        next_last_t = self.next_node_dft[last_t]
+        self.parent[t] = None
+        self.parent_edge[t] = None
+        self.next_node_dft[prev_t] = next_last_t
+        self.prev_node_dft[next_last_t] = prev_t
+        self.next_node_dft[last_t] = t
+        self.prev_node_dft[t] = last_t
+        while s is not None:
+            self.subtree_size[s] -= size_t
+            if self.last_descendent_dft[s] == last_t:
+                self.last_descendent_dft[s] = prev_t
+            s = self.parent[s]
+
+    def _make_root(self, q):
+        """Make node q the root of its subtree"""
+        ancestors = []
+        while q is not None:
+            ancestors.append(q)
+            q = self.parent[q]
+        ancestors.reverse()
+        for p, q in zip(ancestors, islice(ancestors, 1, None)):
+            size_p = self.subtree_size[p]
+            last_p = self.last_descendent_dft[p]
+            prev_q = self.prev_node_dft[q]
+            last_q = self.last_descendent_dft[q]
+            next_last_q = self.next_node_dft[last_q]
+            self.parent[p] = q
+            self.parent[q] = None
+            self.parent_edge[p] = self.parent_edge[q]
+            self.parent_edge[q] = None
+            self.subtree_size[p] = size_p - self.subtree_size[q]
+            self.subtree_size[q] = size_p
+            self.next_node_dft[prev_q] = next_last_q
+            self.prev_node_dft[next_last_q] = prev_q
+            self.next_node_dft[last_q] = q
+            self.prev_node_dft[q] = last_q
+            if last_p == last_q:
+                self.last_descendent_dft[p] = prev_q
+                last_p = prev_q
+            self.prev_node_dft[p] = last_q
+            self.next_node_dft[last_q] = p
+            self.next_node_dft[last_p] = q
+            self.prev_node_dft[q] = last_p
+            self.last_descendent_dft[q] = last_p
+
+    def _add_edge(self, i, p, q):
+        """Add edge (p, q) to the spanning tree where q is the root of a subtree"""
+        last_p = self.last_descendent_dft[p]
+        next_last_p = self.next_node_dft[last_p]
+        size_q = self.subtree_size[q]
+        last_q = self.last_descendent_dft[q]
+        self.parent[q] = p
+        self.parent_edge[q] = i
+        self.next_node_dft[last_p] = q
+        self.prev_node_dft[q] = last_p
+        self.prev_node_dft[next_last_p] = last_q
+        self.next_node_dft[last_q] = next_last_p
+        while p is not None:
+            self.subtree_size[p] += size_q
+            if self.last_descendent_dft[p] == last_p:
+                self.last_descendent_dft[p] = last_q
+            p = self.parent[p]
+
+    def _update_potentials(self, i, p, q):
+        """Update the potentials of the subtree rooted at q, joined to p by edge i"""
+        if q == self.edge_targets[i]:
+            d = self.node_potentials[p] - self.edge_weights[i] - self.node_potentials[q]
+        else:
+            d = self.node_potentials[p] + self.edge_weights[i] - self.node_potentials[q]
+        for q in self._trace_subtree(q):
+            self.node_potentials[q] += d
+
+    def _reduced_cost(self, i):
+        if self.edge_capacities[i] == 0:
+            # At both bounds at once, so the edge can never enter the basis.
+            # network_simplex leaves these edges out, but here a capacity
+            # may be zero for only some of the time steps.
+            return 0
+        c = (self.edge_weights[i]
+             - self.node_potentials[self.edge_sources[i]]
+             + self.node_potentials[self.edge_targets[i]])
+        return c if self.edge_flow[i] == 0 else -c
+
+    def _find_entering_edges(self):
+        """Yield entering edges (block search with Dantzig's rule) until none is found"""
+        edge_count = self.edge_count
+        if edge_count == 0:
+            return
+        B = int(ceil(sqrt(edge_count)))
+        M = (edge_count + B - 1) // B
+        m = 0
+        f = 0
+        while m < M:
+            l = f + B
+            if l <= edge_count:
+                edges = range(f, l)
+            else:
+                l -= edge_count
+                edges = chain(range(f, edge_count), range(l))
+            f = l
+            i = min(edges, key=self._reduced_cost)
+            c = self._reduced_cost(i)
+            if c >= 0:
+                m += 1
+            else:
+                if self.edge_flow[i] == 0:
+                    p = self.edge_sources[i]
+                    q = self.edge_targets[i]
+                else:
+                    p = self.edge_targets[i]
+                    q = self.edge_sources[i]
+                yield i, p, q
+                m = 0
+
+    def _residual_capacity(self, i, p):
+        """Residual capacity of edge i in the direction away from node p"""
+        return (self.edge_capacities[i] - self.edge_flow[i]
+                if self.edge_sources[i] == p else self.edge_flow[i])
+
+    def _find_leaving_edge(self, Wn, We):
+        j, s = min(zip(reversed(We), reversed(Wn)), key=lambda i_p: self._residual_capacity(*i_p))
+        t = self.edge_targets[j] if self.edge_sources[j] == s else self.edge_sources[j]
+        return j, s, t
+
+
+def _whole(value, scale, name):
+    """A capacity, demand or weight as a whole number of solver units"""
+    if abs(value) == inf:
+        return value
+    if scale is not None:
+        return int(round(value * scale))
+    if value != int(value):
+        raise ValueError(name + ' ' + repr(value) + ' is not a whole number; give MinCostFlow a scale')
+    return value
@@ -0,0 +1,192 @@
+import numpy as np
+from scipy.signal import lfilter
+
+
+def muskingum_coefficients(k, x, time_step=1.0):
+    """Muskingum routing coefficients
+
+        O(t) = c0 I(t) + c1 I(t-1) + c2 O(t-1)
+
+        A travel time k of zero passes the inflow straight through.
+
+        Parameters
+        ----------
+        k : array[float]
+            Travel time through the reach, in the same units as time_step
+        x : array[float]
+            Weighting of inflow against outflow (0 to 0.5)
+        time_step : float
+
+        Returns
+        -------
+        c0, c1, c2 : numpy.ndarray
+    """
+    k = np.asarray(k, dtype=float)
+    x = np.asarray(x, dtype=float)
+    d = 2.0 * k * (1.0 - x) + time_step
+    c0 = np.where(k > 0.0, (time_step - 2.0 * k * x) / d, 1.0)
+    c1 = np.where(k > 0.0, (time_step + 2.0 * k * x) / d, 0.0)
+    c2 = np.where(k > 0.0, (2.0 * k * (1.0 - x) - time_step) / d, 0.0)
+    if (c0 < 0.0).any() or (c2 < 0.0).any():
+        raise ValueError('Muskingum parameters need 2 k x <= time_step <= 2 k (1 - x)')
+    return c0, c1, c2
+
+
+class Reaches:
+    """Lag and Muskingum routing for many channel reaches held as arrays
+
+        Each reach delays its inflow by a whole number of time steps and
+        then routes it with the Muskingum method (a travel time of zero
+        gives pure lag). The state of every reach is kept in arrays with
+        an element per reach, so all the reaches in a group are advanced
+        with one set of array operations.
+
+        A time step is computed with outflow(), which does not change the
+        state, so it can be called again for the same step. advance()
+        then keeps the last computed step as the state for the next one.
+
+        Attributes
+        ----------
+        count : int
+            Number of reaches
+        lag : numpy.ndarray
+            Lag of each reach in time steps
+        c0, c1, c2 : numpy.ndarray
+            Muskingum coefficients
+        history : numpy.ndarray
+            (count, max lag) past inflows, oldest first
+        previous_inflow : numpy.ndarray
+            Lagged inflow of the previous time step
+        previous_outflow : numpy.ndarray
+            Outflow of the previous time step
+
+        Methods
+        -------
+        outflow(index, inflow)
+        advance()
+        outflow_series(index, inflow)
+        get_state()
+        set_state(state, index)
+    """
+
+    def __init__(self, lag, k, x, time_step=1.0):
+        self.lag = np.asarray(lag, dtype=int)
+        if (self.lag < 0).any():
+            raise ValueError('lag should be a positive number of time steps')
+        self.count = len(self.lag)
+        self.c0, self.c1, self.c2 = (np.broadcast_to(c, (self.count,)).copy()
+                                     for c in muskingum_coefficients(k, x, time_step))
+        self.history = np.zeros((self.count, max(int(self.lag.max(initial=0)), 1)))
+        self.previous_inflow = np.zeros(self.count)
+        self.previous_outflow = np.zeros(self.count)
+        self._inflow = np.zeros(self.count)
+        self._lagged = np.zeros(self.count)
+        self._outflow = np.zeros(self.count)
+        self._pending = False
+
+    def _lagged_inflow(self, index, inflow):
+        lag = self.lag[index]
+        past = self.history[index, -np.maximum(lag, 1)]
+        return np.where(lag > 0, past, inflow)
+
+    def outflow(self, index, inflow):
+        """Outflow of the selected reaches for this time step
+
+            Parameters
+            ----------
+            index : array[int]
+                Reaches to compute
+            inflow : array[float]
+                Inflow of each selected reach for this time step
+
+            Returns
+            -------
+            numpy.ndarray
+        """
+        lagged = self._lagged_inflow(index, inflow)
+        out = (self.c0[index] * lagged + self.c1[index] * self.previous_inflow[index]
+               + self.c2[index] * self.previous_outflow[index])
+        self._inflow[index] = inflow
+        self._lagged[index] = lagged
+        self._outflow[index] = out
+        self._pending = True
+        return out
+
+    def advance(self):
+        """Keep the last computed time step as the state for the next step"""
+        if not self._pending:
+            return
+        self.history[:, :-1] = self.history[:, 1:]
+        self.history[:, -1] = self._inflow
+        self.previous_inflow[:] = self._lagged
+        self.previous_outflow[:] = self._outflow
+        self._pending = False
+
+    def get_state(self):
+        """Copies of the state arrays, including a computed step that has
+            not been kept by advance() yet
+
+            Returns
+            -------
+            dict of numpy.ndarray
+        """
+        return {'history': self.history.copy(),
+                'previous_inflow': self.previous_inflow.copy(),
+                'previous_outflow': self.previous_outflow.copy(),
+                'inflow': self._inflow.copy(),
+                'lagged': self._lagged.copy(),
+                'outflow': self._outflow.copy(),
+                'pending': np.array(self._pending)}
+
+    def set_state(self, state, index=slice(None)):
+        """Restore state arrays from get_state()
+
+            Parameters
+            ----------
+            state : dict of numpy.ndarray
+            index : array[int], optional
+                Reach that each row of the state belongs to
+        """
+        self.history[index] = state['history']
+        self.previous_inflow[index] = state['previous_inflow']
+        self.previous_outflow[index] = state['previous_outflow']
+        self._inflow[index] = state['inflow']
+        self._lagged[index] = state['lagged']
+        self._outflow[index] = state['outflow']
+        self._pending = bool(state['pending'])
+
+    def outflow_series(self, index, inflow):
+        """Route whole inflow series through the selected reaches
+
+            Starts from the current state and leaves the reaches in the
+            state at the end of the series. Each reach is filtered over
+            the whole series at once with scipy.signal.lfilter.
+
+            Parameters
+            ----------
+            index : array[int]
+                Reaches to compute
+            inflow : array[float]
+                (T, len(index)) inflow series
+
+            Returns
+            -------
+            numpy.ndarray
+                (T, len(index)) outflow series
+        """
+        inflow = np.asarray(inflow, dtype=float)
+        outflow = np.empty(inflow.shape)
+        if not len(inflow):
+            return outflow
+        for j, r in enumerate(np.asarray(index).tolist()):
+            lag = int(self.lag[r])
+            series = np.concatenate([self.history[r], inflow[:, j]])
+            lagged = series[len(series) - len(inflow) - lag:len(series) - lag] if lag else inflow[:, j]
+            zi = [self.c1[r] * self.previous_inflow[r] + self.c2[r] * self.previous_outflow[r]]
+            outflow[:, j], zf = lfilter([self.c0[r], self.c1[r]], [1.0, -self.c2[r]], lagged, zi=zi)
+
+            self.history[r] = series[-self.history.shape[1]:]
+            self.previous_inflow[r] = lagged[-1]
+            self.previous_outflow[r] = outflow[-1, j]
+        self._pending = False
+        return outflow
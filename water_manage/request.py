@@ -12,10 +12,52 @@ class Request:
         priority : int
             The priority number where a lower number indicates higher priority
             The lowest possible priority is 1
-        TODO add a delivery attribute that is changed after allocation
+        delivery : float
+            The amount delivered on the last allocation
+        allocators : list
+            The allocators holding this request, which are all told when
+            the amount or priority changes. A request can be shared, for
+            example by an Allocator and an AllocationNetwork.
+
+        Methods
+        -------
+        add_allocator(allocator) : tell an allocator about later changes
     """
+    __slots__ = ('name', '_amount', '_priority', 'delivery', 'allocators')
+
     def __init__(self, name, amount=0.0, priority=1):
         self.name = name
-        self.amount = amount
-        self.priority = priority
-        #self.delivery = amount
+        self._amount = amount
+        self._priority = priority
+        self.delivery = 0.0
+        self.allocators = []
+
+    def __repr__(self):
+        return 'Request(%r, %s, %s)' % (self.name, self._amount, self._priority)
+
+    def add_allocator(self, allocator):
+        """Tell an allocator when the amount or priority changes"""
+        if not any(held is allocator for held in self.allocators):
+            self.allocators.append(allocator)
+
+    @property
+    def amount(self):
+        return self._amount
+
+    @amount.setter
+    def amount(self, amount):
+        if amount != self._amount:
+            self._amount = amount
+            for allocator in self.allocators:
+                allocator.request_changed()
+
+    @property
+    def priority(self):
+        return self._priority
+
+    @priority.setter
+    def priority(self, priority):
+        if priority != self._priority:
+            self._priority = priority
+            for allocator in self.allocators:
+                allocator.request_changed(priority=True)
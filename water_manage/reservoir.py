@@ -1,9 +1,10 @@
 from water_manage.store import Store
-from water_manage.allocator import Allocator
+from water_manage.allocator import Allocator, allocate_groups, group_starts, group_totals
 from water_manage.request import Request
 from utils.attr_setter import AttrMap
 import numpy as np
 from inputs.table import Table
+from inputs.rating_table import RatingTable
 
 
 class Reservoir(Store):
@@ -48,22 +49,42 @@ class Reservoir(Store):
         spillway_flow()
             Calculate the spillway flow based on the depth of
             water above the spillway crest
+
+        set_geometry(elevations, areas, volumes)
+            Replace the stage-storage-area table
+
+        set_bowl(bowl, spillway_crest, outlet_elevation)
+            Use the survey of a Bowl as the stage-storage-area table
+
+        spillway_rating(water_level)
+            Spillway flow at one or more water levels
+
+        storage_indication(time_step)
+            Storage-indication curve for level-pool routing
+
+        route(inflows, time_step)
+            Route an inflow hydrograph through the pool
+
+        simulate(inflow, demands, evap_rate)
+            Mass balance over whole inflow and demand series
     """
     volume = AttrMap('quantity')
     
-    def __init__(self, init_vol=100.0):
+    def __init__(self, init_vol=100.0, bowl=None, spillway_crest=None, outlet_elevation=None):
         Store.__init__(self, quantity=init_vol)
-        self.elevations = [0.0, 10.0, 20.0]
-        self.areas = [0.0, 35.0, 48.0]
-        self.elev_area = Table([0.0, 10.0, 20.0], [0.0, 35.0, 48.0])
-        self.volumes = [0.0, 175.0, 590.0]
-        self.elev_volume = Table([0.0, 10.0, 20.0], [0.0, 175.0, 590.0])
-        # TODO stage-storage as dataframe: self.geometry = pd.DataFrame([0.0,5.0,10.0], [0.0, 100.0, 120.0])
         self.spillway_crest = 10.0
-        self.spillway_volume = np.interp(self.spillway_crest, self.elevations, self.volumes)
-        self.spillway_type = 'broad'
         self.bottom = 0.0
         self.outlet_elevation = 3.75
+        if bowl is None:
+            self.set_geometry([0.0, 10.0, 20.0], [0.0, 35.0, 48.0], [0.0, 175.0, 590.0])
+        else:
+            self.set_bowl(bowl)
+        if spillway_crest is not None:
+            self.spillway_crest = spillway_crest
+        if outlet_elevation is not None:
+            self.outlet_elevation = outlet_elevation
+        # TODO stage-storage as dataframe: self.geometry = pd.DataFrame([0.0,5.0,10.0], [0.0, 100.0, 120.0])
+        self.spillway_type = 'broad'
         self.weir_coef = 3.2
         self.weir_length = 1.0
         self.allocator = Allocator(0.0,
@@ -75,6 +96,49 @@ class Reservoir(Store):
     def __repr__(self):
         return 'Reservoir(initial_volume=%s)' % (self.volume)
 
+    def set_geometry(self, elevations, areas, volumes):
+        """Replace the stage-storage-area table
+
+            The lookup tables are built here once, so reading the water
+            level, area or spill does not convert the lists again.
+
+            Parameters
+            ----------
+            elevations, areas, volumes : list(float)
+                Area and volume at each elevation, with volume increasing
+                with elevation
+        """
+        self.elevations = np.asarray(elevations, dtype=float).tolist()
+        self.areas = np.asarray(areas, dtype=float).tolist()
+        self.volumes = np.asarray(volumes, dtype=float).tolist()
+        self.elev_area = Table(self.elevations, self.areas)
+        self.elev_volume = Table(self.elevations, self.volumes)
+        self.volume_area = RatingTable(self.volumes, self.areas)
+        self._storage_indication = (None, None)
+
+    def set_bowl(self, bowl, spillway_crest=None, outlet_elevation=None):
+        """Use the survey of a Bowl as the stage-storage-area table
+
+            The bottom is the lowest surveyed elevation. A survey rarely
+            shares the default crest and outlet elevations, so unless they
+            are given the spillway crest is put at the top of the survey
+            and the outlet at the bottom.
+
+            Parameters
+            ----------
+            bowl : Bowl
+            spillway_crest, outlet_elevation : float, optional
+        """
+        self.set_geometry(bowl.elevations, bowl.areas, bowl.volumes)
+        self.bottom = self.elevations[0]
+        self.spillway_crest = self.elevations[-1] if spillway_crest is None else spillway_crest
+        self.outlet_elevation = self.elevations[0] if outlet_elevation is None else outlet_elevation
+
+    @property
+    def spillway_volume(self):
+        """Volume below the spillway crest"""
+        return self.elev_volume.lookup_y(self.spillway_crest)
+
     @property
     def water_level(self):
         return self.elev_volume.lookup_x(self.volume)
@@ -90,7 +154,7 @@ class Reservoir(Store):
     @property
     def area(self) -> float:
         """Water surface area of the reservoir."""
-        return np.interp(self.volume, self.volumes, self.areas)
+        return self.volume_area.lookup(self.volume)
     
     def calc_overflow(self):
         """Calculate the spillway flow based on the weir equation
@@ -103,9 +167,10 @@ class Reservoir(Store):
             
         """
         
-        if self.water_level > self.spillway_crest:
+        water_level = self.water_level
+        if water_level > self.spillway_crest:
             
-            h = self.water_level - self.spillway_crest
+            h = water_level - self.spillway_crest
             v = self.volume - self.spillway_volume
             # The Kindsvater-Carter: rectangular, sharp-crested weir (suppressed)
             # Ce * Le|ft| * He|ft|^(3/2) * 1 cfs
@@ -118,8 +183,179 @@ class Reservoir(Store):
             
             # TODO put "q" in terms of display units before updating reservoir
             self.update(0.0, q)
-            self.water_level = np.interp(self.volume,
-                                         self.volumes, self.elevations)
+            self.water_level = self.elev_volume.lookup_x(self.volume)
+
+    def spillway_rating(self, water_level):
+        """Weir flow over the spillway crest at one or more water levels"""
+        h = np.maximum(np.asarray(water_level, dtype=float) - self.spillway_crest, 0.0)
+        return self.weir_coef * self.weir_length * h**(3.0/2.0)
+
+    def storage_indication(self, time_step=1.0, points=50):
+        """Storage-indication curve: outflow O against 2S/dt + O
+
+            Worked out at the elevations of the geometry table and at
+            points elevations from the spillway crest to the top of the
+            table, closest together just above the crest where the weir
+            flow curves most. The curve is kept and only
+            built again when the time step, the geometry or the spillway
+            changes.
+
+            Parameters
+            ----------
+            time_step : float
+                Routing time step, in the time units of the flow rates
+            points : int
+                Number of elevations between the crest and the top of the table
+
+            Returns
+            -------
+            RatingTable
+                x is 2S/dt + O and y is O
+        """
+        key = (time_step, points, self.spillway_crest, self.weir_coef, self.weir_length)
+        if self._storage_indication[0] != key:
+            # Closer together near the crest, where the weir flow curves most
+            head = max(self.elevations[-1] - self.spillway_crest, 0.0) * np.linspace(0.0, 1.0, points)**2
+            elevations = np.union1d(self.elevations, self.spillway_crest + head)
+            storage = self.elev_volume.lookup_y(elevations)
+            outflow = self.spillway_rating(elevations)
+            self._storage_indication = (key, RatingTable(2.0 * storage / time_step + outflow, outflow))
+        return self._storage_indication[1]
+
+    def route(self, inflows, time_step=1.0):
+        """Level-pool (storage-indication) routing of an inflow hydrograph
+
+            Each step solves the storage equation
+
+                2*S2/dt + O2 = I1 + I2 + 2*S1/dt - O1
+
+            with one lookup of the storage-indication curve, so the step
+            is implicit in the outflow and stays stable for any time step,
+            unlike calc_overflow(). The pool starts at the current volume
+            and is left at the volume at the end of the hydrograph. The
+            geometry table should reach above the highest level the flood
+            will reach; above it the outflow is held at its top value.
+
+            Parameters
+            ----------
+            inflows : array[float]
+                (n,) inflow rates at the start of each time step and the
+                end of the last one
+            time_step : float
+                Time between inflows, in the time units of the flow rates
+
+            Returns
+            -------
+            numpy.ndarray
+                (n,) spillway outflow rates at the same times as the inflows
+        """
+        inflows = np.asarray(inflows, dtype=float)
+        curve = self.storage_indication(time_step)
+        lookup = curve.lookup
+        outflows = np.empty(len(inflows))
+        if len(inflows) == 0:
+            return outflows
+        storage = self.volume
+        outflow = float(self.spillway_rating(self.water_level))
+        outflows[0] = outflow
+        inflow_list = inflows.tolist()
+        indication = 2.0 * storage / time_step - outflow
+        for i in range(1, len(inflow_list)):
+            total = inflow_list[i - 1] + inflow_list[i] + indication
+            outflow = lookup(total)
+            indication = total - 2.0 * outflow
+            outflows[i] = outflow
+        self.quantity = max(indication + outflows[-1], 0.0) * time_step / 2.0
+        return outflows
+
+    def simulate(self, inflow, demands=None, evap_rate=0.0, priorities=None, initial_volume=None):
+        """Mass balance over whole inflow and demand series
+
+            Runs the time steps in one loop over arrays, and runs many
+            traces (such as stochastic inflows) side by side. Each step:
+
+            1. evaporation is evap_rate times the area at the start of
+               the step;
+            2. the stored water plus the inflow is allocated to the
+               evaporation and the demands by priority, as Allocator
+               does, with equal priorities curtailed in proportion;
+            3. water left above the spillway crest, or above capacity if
+               that is lower, spills.
+
+            The requests of the reservoir's allocator are used with their
+            priorities: 'evaporation' takes the evaporation, requests named
+            in demands take those amounts and the others keep their
+            current amount. Demands with other names are added. The
+            reservoir's own volume is not changed.
+
+            Parameters
+            ----------
+            inflow : array[float]
+                (T,) inflow each time step, or (S, T) for S traces
+            demands : dict, optional
+                Amount requested each time step keyed by request name,
+                each a float, a (T,) array or an (S, T) array
+            evap_rate : float or array[float]
+                Evaporation rate in terms of length, a float, (T,) or (S, T)
+            priorities : dict, optional
+                Priority of demands that are not requests of the allocator
+                (default 1)
+            initial_volume : float or array[float], optional
+                Volume at the start, or (S,) volumes (default self.volume)
+
+            Returns
+            -------
+            dict
+                'volume', 'level' and 'spill' at the end of each step and
+                'deliveries', a dict of the delivery to each request, all
+                shaped like inflow
+        """
+        inflow = np.asarray(inflow, dtype=float)
+        traces = np.atleast_2d(inflow)
+        count, steps = traces.shape
+        demands = dict(demands or {})
+        priorities = priorities or {}
+
+        # Requests in the allocator's priority order, then the new demands
+        names = [request.name for request in self.allocator.requests]
+        request_priorities = [request.priority for request in self.allocator.requests]
+        amounts = [demands.pop(name, request.amount) for name, request in
+                   zip(names, self.allocator.requests)]
+        for name, amount in demands.items():
+            names.append(name)
+            request_priorities.append(priorities.get(name, 1))
+            amounts.append(amount)
+        order = np.argsort(request_priorities, kind='stable')
+        names = [names[i] for i in order]
+        starts = group_starts(np.array(request_priorities)[order])
+        amounts = [np.broadcast_to(np.asarray(amounts[i], dtype=float), (count, steps)) for i in order]
+        evap = names.index('evaporation') if 'evaporation' in names else None
+        evap_rate = np.broadcast_to(np.asarray(evap_rate, dtype=float), (count, steps))
+
+        full_volume = min(self.capacity, self.spillway_volume)
+        volume = np.broadcast_to(np.asarray(self.volume if initial_volume is None else initial_volume,
+                                            dtype=float), (count,)).copy()
+        volumes = np.empty((count, steps))
+        spills = np.empty((count, steps))
+        deliveries = np.empty((count, steps, len(names)))
+        area = self.volume_area.lookup
+        for t in range(steps):
+            step_amounts = np.stack([amount[:, t] for amount in amounts], axis=-1)
+            if evap is not None:
+                step_amounts[:, evap] = evap_rate[:, t] * area(volume)
+            delivered, volume = allocate_groups(volume + traces[:, t], step_amounts, starts,
+                                                group_totals(step_amounts, starts))
+            spill = np.maximum(volume - full_volume, 0.0)
+            volume = volume - spill
+            volumes[:, t] = volume
+            spills[:, t] = spill
+            deliveries[:, t] = delivered
+
+        shape = inflow.shape
+        return {'volume': volumes.reshape(shape),
+                'level': self.elev_volume.lookup_x(volumes).reshape(shape),
+                'spill': spills.reshape(shape),
+                'deliveries': {name: deliveries[..., i].reshape(shape) for i, name in enumerate(names)}}
 
     @property
     def evaporation(self):
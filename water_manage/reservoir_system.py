@@ -0,0 +1,318 @@
+import numpy as np
+from water_manage.flow_network import Network
+
+
+class ReservoirSystem(Network):
+    """Many reservoirs held as arrays and advanced together
+
+        The volumes, geometry tables, spillways and outlets of R
+        reservoirs are kept as arrays, with the elevation, area and
+        volume tables padded to the longest table by repeating each last
+        point. Each time step is a few array operations over all the
+        reservoirs instead of an update of every Reservoir object.
+
+        Reservoirs are nodes of the network graph. The water a reservoir
+        releases or spills flows to the next reservoir downstream, found
+        by following the graph through other nodes such as junctions.
+        Reservoirs are advanced in levels: every reservoir in a level has
+        all the reservoirs that drain to it in earlier levels, so a
+        cascade is worked out within one time step.
+
+        Each step, for every reservoir:
+
+            1. evaporation is evap_rate times the area at the start of
+               the step, up to the water held;
+            2. the release is met from the water above the outlet;
+            3. water above capacity spills, then the weir flow over the
+               spillway crest (weir_coef * weir_length * h**1.5 for the
+               time step, as Reservoir.calc_overflow) spills, up to the
+               water above the crest.
+
+        The tables are looked up with one searchsorted over all the rows,
+        each row shifted so the rows follow one another in a single
+        increasing array.
+
+        Attributes
+        ----------
+        names : list of str
+            Reservoir names in the order of the arrays
+        index : dict
+            Position of each reservoir name
+        volume : numpy.ndarray
+            (R,) volume of each reservoir
+        elevations, areas, volumes : numpy.ndarray
+            (R, P) padded geometry tables
+        spillway_crest, weir_coef, weir_length, outlet_elevation, capacity : numpy.ndarray
+            (R,) spillway and outlet settings
+        spillway_volume, outlet_volume : numpy.ndarray
+            (R,) volume below the spillway crest and below the outlet
+        downstream : numpy.ndarray
+            Position of the next reservoir downstream, -1 if none
+
+        Methods
+        -------
+        add_reservoir(name, reservoir, downstream_name)
+        from_reservoirs(reservoirs, downstream)
+        build()
+        water_level()
+        area()
+        step(inflow, release, evap_rate)
+        simulate(inflow, release, evap_rate)
+        save_volumes()
+    """
+
+    def __init__(self):
+        Network.__init__(self)
+        self.names = []
+        self.index = {}
+        self.reservoirs = {}
+        self.volume = np.zeros(0)
+        self._built = False
+
+    def add_reservoir(self, name, reservoir, downstream_name='sink'):
+        """Add a reservoir, taking its geometry, settings and volume
+
+            Parameters
+            ----------
+            name : str
+            reservoir : Reservoir
+            downstream_name : str
+                Node that the reservoir releases and spills to
+        """
+        self.reset_solvers()
+        self.dg.add_node(name, node_type='Reservoir')
+        # Adding a reservoir again moves it to the new downstream node
+        self.dg.remove_edges_from(list(self.dg.out_edges(name)))
+        self.dg.add_edge(name, downstream_name)
+        if name not in self.index:
+            self.index[name] = len(self.names)
+            self.names.append(name)
+        self.reservoirs[name] = reservoir
+        self._built = False
+
+    @classmethod
+    def from_reservoirs(cls, reservoirs, downstream=None):
+        """System of a dict of reservoirs
+
+            Parameters
+            ----------
+            reservoirs : dict
+                Reservoir keyed by name
+            downstream : dict, optional
+                Name of the node each reservoir drains to (default 'sink')
+        """
+        system = cls()
+        downstream = downstream or {}
+        for name, reservoir in reservoirs.items():
+            system.add_reservoir(name, reservoir, downstream.get(name, system.sink))
+        return system.build()
+
+    def build(self):
+        """Fill the arrays from the reservoirs and find the cascade levels
+
+            Called on the first step after reservoirs are added. Call it
+            again after changing a reservoir's geometry or settings.
+        """
+        reservoirs = [self.reservoirs[name] for name in self.names]
+        points = max([len(r.elevations) for r in reservoirs], default=2)
+        self.elevations = _padded([r.elevations for r in reservoirs], points)
+        self.areas = _padded([r.areas for r in reservoirs], points)
+        self.volumes = _padded([r.volumes for r in reservoirs], points)
+        self.counts = np.array([len(r.elevations) for r in reservoirs], dtype=int)
+        if (self.counts < 2).any():
+            raise ValueError('each reservoir needs at least two elevations')
+        self._last = self.counts - 1
+
+        self.spillway_crest = np.array([r.spillway_crest for r in reservoirs], dtype=float)
+        self.weir_coef = np.array([r.weir_coef for r in reservoirs], dtype=float)
+        self.weir_length = np.array([r.weir_length for r in reservoirs], dtype=float)
+        self.outlet_elevation = np.array([r.outlet_elevation for r in reservoirs], dtype=float)
+        self.capacity = np.array([r.capacity for r in reservoirs], dtype=float)
+        self.volume = np.array([r.volume for r in reservoirs], dtype=float)
+        self._volume_elevation = _RowTable(self.volumes, self.elevations, self._last)
+        self._volume_area = _RowTable(self.volumes, self.areas, self._last)
+        elevation_volume = _RowTable(self.elevations, self.volumes, self._last)
+        self.spillway_volume = elevation_volume(self.spillway_crest)
+        self.outlet_volume = elevation_volume(self.outlet_elevation)
+
+        self.downstream = np.array([self._next_reservoir(name) for name in self.names], dtype=int)
+        self._set_levels()
+        self._built = True
+        return self
+
+    def _next_reservoir(self, name):
+        """Position of the first reservoir reached downstream, -1 if none"""
+        seen = {name}
+        node = name
+        while True:
+            successors = [n for n in self.dg.successors(node) if n not in seen]
+            if not successors or successors[0] == self.sink:
+                return -1
+            node = successors[0]
+            if node in self.index:
+                return self.index[node]
+            seen.add(node)
+
+    def _set_levels(self):
+        """Group the reservoirs so each comes after everything upstream of it"""
+        level = np.zeros(len(self.names), dtype=int)
+        for _ in range(len(self.names)):
+            draining = self.downstream >= 0
+            below = np.zeros(len(self.names), dtype=int)
+            np.maximum.at(below, self.downstream[draining], level[draining] + 1)
+            if (below <= level).all():
+                break
+            level = np.maximum(level, below)
+        else:
+            if len(self.names):
+                raise ValueError('the reservoirs drain to each other in a loop')
+        self.levels = [np.flatnonzero(level == i) for i in range(level.max() + 1 if len(level) else 0)]
+
+    def water_level(self, volume=None):
+        """Water level of each reservoir"""
+        if not self._built:
+            self.build()
+        volume = self.volume if volume is None else volume
+        return self._volume_elevation(volume)
+
+    def area(self, volume=None):
+        """Water surface area of each reservoir"""
+        if not self._built:
+            self.build()
+        volume = self.volume if volume is None else volume
+        return self._volume_area(volume)
+
+    def step(self, inflow, release=0.0, evap_rate=0.0):
+        """Advance all the reservoirs by one time step
+
+            Parameters
+            ----------
+            inflow : array[float]
+                (R,) local inflow to each reservoir, not counting the
+                water from reservoirs upstream
+            release : float or array[float]
+                Release requested from each reservoir
+            evap_rate : float or array[float]
+                Evaporation rate in terms of length
+
+            Returns
+            -------
+            dict
+                (R,) 'inflow' (including water from upstream),
+                'evaporation', 'release', 'spill' and 'outflow'
+                (release + spill) of each reservoir
+        """
+        if not self._built:
+            self.build()
+        count = len(self.names)
+        inflow = np.array(np.broadcast_to(np.asarray(inflow, dtype=float), count))
+        release = np.broadcast_to(np.asarray(release, dtype=float), count)
+        evaporation = np.minimum(np.broadcast_to(evap_rate, count) * self.area(), self.volume + inflow)
+        released = np.zeros(count)
+        spill = np.zeros(count)
+        volume = self.volume.copy()
+        for rows in self.levels:
+            water = volume[rows] + inflow[rows] - evaporation[rows]
+            released[rows] = np.clip(water - self.outlet_volume[rows], 0.0, release[rows])
+            water -= released[rows]
+            overflow = np.maximum(water - self.capacity[rows], 0.0)
+            water -= overflow
+            head = np.maximum(self._volume_elevation(water, rows) - self.spillway_crest[rows], 0.0)
+            weir = self.weir_coef[rows] * self.weir_length[rows] * head**(3.0/2.0) * self.time_step
+            weir = np.minimum(weir, np.maximum(water - self.spillway_volume[rows], 0.0))
+            spill[rows] = overflow + weir
+            volume[rows] = water - weir
+            draining = rows[self.downstream[rows] >= 0]
+            np.add.at(inflow, self.downstream[draining], released[draining] + spill[draining])
+        self.volume = volume
+        return {'inflow': inflow, 'evaporation': evaporation, 'release': released, 'spill': spill,
+                'outflow': released + spill}
+
+    def simulate(self, inflow, release=0.0, evap_rate=0.0):
+        """Run step() over a whole series
+
+            Parameters
+            ----------
+            inflow : array[float]
+                (T, R) local inflow to each reservoir each time step
+            release : float or array[float]
+                Release requested, a float, (R,) or (T, R)
+            evap_rate : float or array[float]
+                Evaporation rate, a float, (R,) or (T, R)
+
+            Returns
+            -------
+            dict
+                (T, R) 'volume' and 'level' at the end of each step and
+                the arrays returned by step()
+        """
+        if not self._built:
+            self.build()
+        inflow = np.asarray(inflow, dtype=float)
+        shape = inflow.shape
+        release = np.broadcast_to(np.asarray(release, dtype=float), shape)
+        evap_rate = np.broadcast_to(np.asarray(evap_rate, dtype=float), shape)
+        results = {name: np.empty(shape) for name in
+                   ('volume', 'inflow', 'evaporation', 'release', 'spill', 'outflow')}
+        for t in range(shape[0]):
+            for name, values in self.step(inflow[t], release[t], evap_rate[t]).items():
+                results[name][t] = values
+            results['volume'][t] = self.volume
+        results['level'] = self._volume_elevation(results['volume'])
+        return results
+
+    def save_volumes(self):
+        """Copy the volumes back to the Reservoir objects"""
+        for name, volume in zip(self.names, self.volume.tolist()):
+            self.reservoirs[name].quantity = volume
+
+
+def _padded(rows, points):
+    """(R, points) array of lists, each padded by repeating its last value"""
+    return np.array([list(row) + [row[-1]] * (points - len(row)) for row in rows], dtype=float).reshape(-1, points)
+
+
+class _RowTable:
+    """numpy.interp on row r of padded tables for the value of reservoir r
+
+        The rows are shifted to start at 0 and spaced apart, then
+        flattened into one increasing array, so one searchsorted finds
+        the segment of every value in O(log(R * P)).
+
+        Parameters
+        ----------
+        xp, fp : numpy.ndarray
+            (R, P) tables, increasing along each row
+        last : numpy.ndarray
+            (R,) position of the last real point of each row
+    """
+
+    def __init__(self, xp, fp, last):
+        count, points = xp.shape
+        rows = np.arange(count)
+        self.low = xp[:, 0]
+        self.high = xp[rows, last]
+        self.fp_low = fp[:, 0]
+        self.fp_high = fp[rows, last]
+        shifted = xp - self.low[:, np.newaxis]
+        self.offset = rows * (shifted.max(initial=0.0) + 1.0)
+        self.keys = (shifted + self.offset[:, np.newaxis]).ravel()
+        self.xp = xp.ravel()
+        self.fp = fp.ravel()
+        with np.errstate(divide='ignore', invalid='ignore'):
+            self.slopes = np.diff(self.fp) / np.diff(self.xp)
+        self.first_segment = rows * points
+        self.last_segment = self.first_segment + last - 1
+
+    def __call__(self, values, rows=slice(None)):
+        """Values of fp at values[..., i], one for each row in rows"""
+        values = np.asarray(values, dtype=float)
+        low = self.low[rows]
+        high = self.high[rows]
+        keys = np.clip(values, low, high) - low + self.offset[rows]
+        k = np.searchsorted(self.keys, keys, side='right') - 1
+        k = np.clip(k, self.first_segment[rows], self.last_segment[rows])
+        with np.errstate(invalid='ignore'):
+            result = self.slopes[k] * (values - self.xp[k]) + self.fp[k]
+        result = np.where(values <= low, self.fp_low[rows], result)
+        return np.where(values >= high, self.fp_high[rows], result)
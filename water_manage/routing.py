@@ -0,0 +1,386 @@
+import heapq
+import numpy as np
+from scipy import sparse
+from water_manage.reach import Reaches
+
+# Edge attributes the router reads
+EDGE_ATTRIBUTES = ('capacity', 'lag', 'muskingum_k', 'muskingum_x')
+
+
+class Router:
+    """Route flows down a tree-shaped network with array operations
+
+        For a network where every node drains to a single downstream node,
+        the maximum flow from the source to the sink is a topological
+        accumulation: the flow leaving a node is the smaller of its outlet
+        capacity and everything that reaches it. The router numbers the
+        nodes once, groups them into levels so that every node drains to
+        a later level, and then routes a time step with one vectorized
+        pass per level. The total reaching the sink is the same as
+        networkx.maximum_flow on the same graph. Where a node's capacity
+        is less than its inflow, the excess is held back at that node
+        rather than on the edges upstream of it.
+
+        Attributes
+        ----------
+        nodes : list of str
+            Node names in topological order (the source is not included)
+        index : dict
+            Position of each node in the arrays
+        downstream : numpy.ndarray
+            Index of the node each node drains to (-1 for the sink)
+        capacity : numpy.ndarray
+            Capacity of the edge leaving each node (inf if not set)
+        supply : numpy.ndarray
+            Capacity of the edge from the source into each node (0 if the
+            node is not connected to the source)
+        levels : list of numpy.ndarray
+            Node indices grouped so every node drains to a later level
+        upstream : list of list of int
+            Indices of the nodes draining to each node
+        dirty : set of int
+            Nodes whose capacity or supply changed since the last route()
+        reaches : Reaches
+            Channel reaches on the edges that have reach attributes, or
+            None
+        reach_of : numpy.ndarray
+            Reach index of the edge leaving each node (-1 if none)
+        inflow : numpy.ndarray
+            Total flow reaching each node on the last route()
+        flow : numpy.ndarray
+            Flow leaving each node on the last route()
+
+        Methods
+        -------
+        set_capacity(node_name, capacity)
+        set_supply(node_name, supply)
+        route()
+        from_arrays(names, upstream, downstream, attributes)
+        route_all()
+        advance()
+        accumulation_matrix(inputs)
+        route_series(capacity_matrix, inputs)
+        outflow()
+        flow_at(node_name)
+        flow_dict()
+    """
+
+    def __init__(self, dg, source='source', sink='sink', time_step=1.0):
+        names = [node for node in dg.nodes if node != source]
+        index = {node: i for i, node in enumerate(names)}
+        edges = list(dg.edges(data=True))
+        upstream = np.array([index.get(u, -1) for u, v, data in edges], dtype=int)
+        downstream = np.array([index[v] for u, v, data in edges], dtype=int)
+        attributes = {}
+        for name in EDGE_ATTRIBUTES:
+            values = [data.get(name) for u, v, data in edges]
+            if any(value is not None for value in values):
+                attributes[name] = np.array([np.nan if value is None else value for value in values], dtype=float)
+        self._build(names, upstream, downstream, attributes, source, sink, time_step)
+
+    @classmethod
+    def from_arrays(cls, names, upstream, downstream, attributes=None, source='source', sink='sink',
+                    time_step=1.0):
+        """Build a router straight from edge arrays without a networkx graph
+
+            Parameters
+            ----------
+            names : list of str
+                Node names, not including the source
+            upstream, downstream : array[int]
+                Positions in names of the two ends of each edge. An
+                upstream position of -1 is an edge from the source.
+            attributes : dict of array[float], optional
+                Edge values keyed by attribute name ('capacity', 'lag',
+                'muskingum_k', 'muskingum_x'), with nan where not set
+            source, sink : str
+            time_step : float
+
+            Returns
+            -------
+            Router
+        """
+        router = cls.__new__(cls)
+        router._build(list(names), np.asarray(upstream, dtype=int), np.asarray(downstream, dtype=int),
+                      attributes or {}, source, sink, time_step)
+        return router
+
+    def _build(self, names, upstream, downstream, attributes, source, sink, time_step):
+        count = len(names)
+        from_source = upstream < 0
+        out_degree = np.bincount(upstream[~from_source], minlength=count)
+        for i in np.flatnonzero(out_degree != 1).tolist():
+            if names[i] != sink:
+                raise ValueError('Routing needs a tree: ' + str(names[i]) + ' has '
+                                 + str(out_degree[i]) + ' downstream nodes')
+        self.source = source
+        self.sink = sink
+
+        # Number the nodes in topological order (Kahn's algorithm)
+        drains_to = np.full(count, -1, dtype=int)
+        drains_to[upstream[~from_source]] = downstream[~from_source]
+        remaining = np.bincount(drains_to[drains_to >= 0], minlength=count).tolist()
+        drains = drains_to.tolist()
+        order = [i for i in range(count) if remaining[i] == 0]
+        for i in order:
+            d = drains[i]
+            if d >= 0:
+                remaining[d] -= 1
+                if remaining[d] == 0:
+                    order.append(d)
+        if len(order) < count:
+            raise ValueError('Routing needs a tree: the network has a cycle')
+        rank = np.empty(count, dtype=int)
+        rank[order] = np.arange(count)
+        self.nodes = [names[i] for i in order]
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+
+        self.downstream = np.full(count, -1, dtype=int)
+        routed = drains_to[order] >= 0
+        self.downstream[routed] = rank[drains_to[order][routed]]
+        # Each edge belongs to the node it leaves, or to the node it feeds
+        # for edges from the source
+        owner = np.where(from_source, rank[downstream], rank[np.maximum(upstream, 0)])
+        capacity = attributes.get('capacity')
+        capacity = np.full(len(upstream), np.nan) if capacity is None else np.asarray(capacity, dtype=float)
+        capacity = np.where(np.isnan(capacity), np.inf, capacity)
+        self.capacity = np.full(count, np.inf)
+        self.capacity[owner[~from_source]] = capacity[~from_source]
+        self.supply = np.zeros(count)
+        self.supply[owner[from_source]] = capacity[from_source]
+
+        # A node's level is the longest path to it from a headwater node
+        depth = np.zeros(count, dtype=int)
+        for i in range(count):
+            if self.downstream[i] >= 0:
+                depth[self.downstream[i]] = max(depth[self.downstream[i]], depth[i] + 1)
+        self.levels = [np.flatnonzero(routed & (depth == d)) for d in range(depth.max() + 1 if count else 0)]
+        self.levels = [level for level in self.levels if len(level)]
+
+        # Channel reaches
+        self.reach_of = np.full(count, -1, dtype=int)
+        values = {name: attributes.get(name) for name in ('lag', 'muskingum_k', 'muskingum_x')}
+        has_reach = np.zeros(len(upstream), dtype=bool)
+        for name, value in values.items():
+            if value is not None:
+                has_reach |= ~np.isnan(np.asarray(value, dtype=float))
+        has_reach &= ~from_source
+        self.reaches = None
+        if has_reach.any():
+            def reach_values(name, default):
+                value = values[name]
+                if value is None:
+                    return np.full(has_reach.sum(), default)
+                value = np.asarray(value, dtype=float)[has_reach]
+                return np.where(np.isnan(value), default, value)
+            self.reaches = Reaches(reach_values('lag', 0).astype(int), reach_values('muskingum_k', 0.0),
+                                   reach_values('muskingum_x', 0.0), time_step)
+            self.reach_of[owner[has_reach]] = np.arange(has_reach.sum())
+        self._level_reaches = []
+        for level in self.levels:
+            position = np.flatnonzero(self.reach_of[level] >= 0)
+            self._level_reaches.append((position, self.reach_of[level][position]))
+
+        self.upstream = [[] for i in range(count)]
+        for i in np.flatnonzero(routed).tolist():
+            self.upstream[self.downstream[i]].append(i)
+
+        self.inflow = np.zeros(count)
+        self.flow = np.zeros(count)
+        self.full_route = True
+        self.dirty = set()
+        self._accumulation = {}
+
+    def set_capacity(self, node_name, capacity):
+        """Set the capacity of the edge leaving a node"""
+        i = self.index[node_name]
+        if self.capacity[i] != capacity:
+            self.capacity[i] = capacity
+            self.dirty.add(i)
+
+    def set_supply(self, node_name, supply):
+        """Set the capacity of the edge from the source into a node"""
+        i = self.index[node_name]
+        if self.supply[i] != supply:
+            self.supply[i] = supply
+            self.dirty.add(i)
+
+    def route(self):
+        """Bring the flows up to date with the capacities
+
+            Returns
+            -------
+            numpy.ndarray
+                Flow leaving each node
+        """
+        if self.full_route or self.reaches is not None or len(self.dirty) * 8 > len(self.nodes):
+            self.route_all()
+        elif self.dirty:
+            self._route_dirty()
+        return self.flow
+
+    def route_all(self):
+        """Push the flows from the headwaters down to the sink in one
+            vectorized pass per level"""
+        inflow = self.supply.copy()
+        flow = self.flow
+        for level, (position, reach) in zip(self.levels, self._level_reaches):
+            out = np.maximum(np.minimum(self.capacity[level], inflow[level]), 0.0)
+            flow[level] = out
+            if len(reach):
+                out = out.copy()
+                out[position] = self.reaches.outflow(reach, out[position])
+            np.add.at(inflow, self.downstream[level], out)
+        self.inflow = inflow
+        self.full_route = False
+        self.dirty.clear()
+        return flow
+
+    def _route_dirty(self):
+        """Revisit the dirty nodes and whatever they change downstream
+
+            Nodes are numbered in topological order, so taking the lowest
+            index from a heap visits every node after all of its upstream
+            nodes.
+        """
+        flow = self.flow
+        inflow = self.inflow
+        supply = self.supply
+        capacity = self.capacity
+        downstream = self.downstream
+        upstream = self.upstream
+        heap = list(self.dirty)
+        heapq.heapify(heap)
+        queued = set(heap)
+        while heap:
+            i = heapq.heappop(heap)
+            total = supply[i]
+            for u in upstream[i]:
+                total += flow[u]
+            inflow[i] = total
+            d = downstream[i]
+            if d < 0:
+                continue
+            out = max(min(capacity[i], total), 0.0)
+            if out != flow[i]:
+                flow[i] = out
+                if d not in queued:
+                    queued.add(d)
+                    heapq.heappush(heap, d)
+        self.dirty.clear()
+
+    def accumulation_matrix(self, inputs):
+        """Sparse matrix that adds the flow from each input node into every
+            node at or below it
+
+            Parameters
+            ----------
+            inputs : list of str
+                Nodes whose outflows are routed
+
+            Returns
+            -------
+            scipy.sparse.csr_matrix
+                (len(inputs), node count) matrix of ones and zeros. Column
+                j of a product with it is the flow leaving node j (or for
+                the sink, reaching it).
+        """
+        rows = []
+        columns = []
+        for row, name in enumerate(inputs):
+            i = self.index[name]
+            while i >= 0:
+                rows.append(row)
+                columns.append(i)
+                i = self.downstream[i]
+        data = np.ones(len(rows))
+        return sparse.csr_matrix((data, (rows, columns)), shape=(len(inputs), len(self.nodes)))
+
+    def advance(self):
+        """Move the reach states on to the next time step"""
+        if self.reaches is not None:
+            self.reaches.advance()
+
+    def route_series(self, capacity_matrix, inputs):
+        """Route a whole series of input node outflows in one product
+
+            This only holds for pure routing, where the input nodes are
+            headwater nodes fed by the source and every other edge has an
+            unlimited capacity, so the flow at a node is the sum of the
+            outflows above it. The router's own flows are not changed.
+
+            With channel reaches the flows are worked out one level at a
+            time and every reach filters its whole series at once. The
+            reaches start from their current state and are left in the
+            state at the end of the series.
+
+            Parameters
+            ----------
+            capacity_matrix : array[float]
+                (T, len(inputs)) outflow capacity of each input node.
+                Negative values carry no flow, as in route().
+            inputs : list of str
+                Names of the input nodes in column order
+
+            Returns
+            -------
+            numpy.ndarray
+                (T, node count) flow leaving each node in self.nodes order
+        """
+        capacity_matrix = np.asarray(capacity_matrix, dtype=float)
+        if capacity_matrix.ndim != 2 or capacity_matrix.shape[1] != len(inputs):
+            raise ValueError('capacity_matrix needs a column for each input node')
+        indices = [self.index[name] for name in inputs]
+        limited = np.isfinite(self.capacity) & (self.downstream >= 0)
+        limited[indices] = False
+        if limited.any():
+            raise ValueError('route_series needs unlimited capacity below the input nodes: '
+                             + str(self.nodes[np.flatnonzero(limited)[0]]) + ' is limited')
+        for i in indices:
+            if self.upstream[i] or self.supply[i] != np.inf:
+                raise ValueError('route_series needs headwater input nodes fed by the source: '
+                                 + str(self.nodes[i]))
+
+        if self.reaches is not None:
+            return self._route_series_reaches(np.maximum(capacity_matrix, 0.0), indices)
+
+        matrix = self._accumulation.get(tuple(inputs))
+        if matrix is None:
+            matrix = self.accumulation_matrix(inputs)
+            self._accumulation = {tuple(inputs): matrix}
+        # (A^T X^T)^T keeps the sparse matrix on the left
+        return np.asarray((matrix.T @ np.maximum(capacity_matrix, 0.0).T).T)
+
+    def _route_series_reaches(self, capacity_matrix, indices):
+        inflow = np.zeros((len(capacity_matrix), len(self.nodes)))
+        inflow[:, indices] = capacity_matrix
+        for level, (position, reach) in zip(self.levels, self._level_reaches):
+            out = inflow[:, level]
+            if len(reach):
+                out[:, position] = self.reaches.outflow_series(reach, out[:, position])
+            np.add.at(inflow.T, self.downstream[level], out.T)
+        # Columns hold the flow leaving each node and, for the sink, reaching it
+        return inflow
+
+    def outflow(self):
+        """Total flow reaching the sink as of the last route()"""
+        return float(self.inflow[self.index[self.sink]])
+
+    def flow_at(self, node_name):
+        """Flow leaving a node on the last route()"""
+        return float(self.flow[self.index[node_name]])
+
+    def flow_dict(self):
+        """Flows in the dict of dicts form returned by networkx"""
+        routed = self.downstream >= 0
+        upstream = np.bincount(self.downstream[routed], self.flow[routed], minlength=len(self.nodes))
+        from_source = np.maximum(np.minimum(self.supply, self.flow - upstream), 0.0)
+        flows = {self.source: {}}
+        for i, node in enumerate(self.nodes):
+            flows[node] = {}
+            d = self.downstream[i]
+            if d >= 0:
+                flows[node][self.nodes[d]] = float(self.flow[i])
+            if self.supply[i] > 0.0:
+                flows[self.source][node] = float(from_source[i])
+        return flows
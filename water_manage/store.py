@@ -86,18 +86,27 @@ class Store:
             self.overflow = 0.0
             self._capacity = new_capacity
 
-    def update(self):
+    def update(self, inflow=None, request=None):
         """Updates the _quantity given inflow and request being applied
 
         If _quantity ends up out of bounds (upper or lower) then it is
         set to the bound and overflow or outflow is updated
 
+        Parameters
+        ----------
+        inflow, request : float, optional
+            Replace the inflow and request before updating
+
         Raises
         ------
         NotImplementedError
             Raise if either value is negative
         """
-        
+        if inflow is not None:
+            self.inflow = inflow
+        if request is not None:
+            self.request = request
+
         self._quantity += (self.inflow - self.request)
 
         if self._quantity > self._capacity:
@@ -1,15 +1,120 @@
-from water_manage.store import Store
+import numpy as np
+from validation import error_checks as ec
+
+
+class StoreView:
+    """A Store-like view of a single element of a StoreArray
+
+        The view does not hold any state of its own. Reading or writing
+        an attribute reads or writes the matching element of the parent
+        array so that existing code written against Store objects keeps
+        working.
+
+        Attributes
+        ----------
+        quantity, capacity, inflow, request, overflow, outflow : float
+            See Store for a description of each attribute
+    """
+    __slots__ = ('_parent', '_index')
+
+    def __init__(self, parent, index):
+        self._parent = parent
+        self._index = index
+
+    @property
+    def quantity(self):
+        return float(self._parent.quantity[self._index])
+
+    @quantity.setter
+    def quantity(self, amount):
+        """Set the amount and apply the current inflow and request,
+            just like Store.quantity does."""
+        ec.check_positive(amount, "quantity")
+        self._parent.quantity[self._index] = amount
+        self.update()
+
+    @property
+    def capacity(self):
+        return float(self._parent.capacity[self._index])
+
+    @capacity.setter
+    def capacity(self, new_capacity):
+        ec.check_positive(new_capacity, "capacity")
+        p = self._parent
+        i = self._index
+        if new_capacity < p.quantity[i]:
+            p.overflow[i] = p.quantity[i] - new_capacity
+            p.quantity[i] = new_capacity
+        else:
+            p.overflow[i] = 0.0
+        p.capacity[i] = new_capacity
+
+    @property
+    def inflow(self):
+        return float(self._parent.inflow[self._index])
+
+    @inflow.setter
+    def inflow(self, amount):
+        self._parent.inflow[self._index] = amount
+
+    @property
+    def request(self):
+        return float(self._parent.request[self._index])
+
+    @request.setter
+    def request(self, amount):
+        self._parent.request[self._index] = amount
+
+    @property
+    def overflow(self):
+        return float(self._parent.overflow[self._index])
+
+    @property
+    def outflow(self):
+        return float(self._parent.outflow[self._index])
+
+    def update(self, inflow=None, request=None):
+        """Update this element only (see StoreArray.update)"""
+        p = self._parent
+        i = self._index
+        if inflow is not None:
+            p.inflow[i] = inflow
+        if request is not None:
+            p.request[i] = request
+        p.apply(slice(i, i + 1))
 
 
 class StoreArray:
-    """Create an array of store objects
-    
+    """Create an array of stores held as contiguous float64 arrays
+
+        Each attribute of Store is kept as one numpy array with an element
+        per store so that the whole array is updated in a single vectorized
+        pass. Indexing the array returns a StoreView that behaves like a
+        Store object.
+
         Attributes
         ----------
-        
+        count : int
+            Number of stores in the array
+        quantity : numpy.ndarray
+            The amount in each store
+        capacity : numpy.ndarray
+            The upper bound on quantity for each store
+        inflow : numpy.ndarray
+            Inflow applied on the next update
+        request : numpy.ndarray
+            Requested outflow applied on the next update
+        overflow : numpy.ndarray
+            Amount in excess of capacity after the last update
+        outflow : numpy.ndarray
+            Outflow delivered on the last update (limited by the quantity)
+        stores : list of StoreView
+            Store-like views of each element
+
         Methods
         -------
         update()
+        apply()
         set_quantities()
         set_capacity()
     """
@@ -18,73 +123,97 @@ class StoreArray:
         """The default is 3 stores only because this was initially
         used in the AWBM implementation.
         """
-        self.stores = []
         self.count = count
-    
-        i = 0
-        while i < self.count:
-            self.stores.append(Store(0.0))
-            i += 1
+        self.quantity = np.zeros(count)
+        self.capacity = np.full(count, float("inf"))
+        self.inflow = np.zeros(count)
+        self.request = np.zeros(count)
+        self.overflow = np.zeros(count)
+        self.outflow = np.zeros(count)
+        self.stores = [StoreView(self, i) for i in range(count)]
 
     def __getitem__(self, index):
         """Access to individual stores within the array"""
         return self.stores[index]
 
+    def __len__(self):
+        return self.count
+
     def set_capacity(self, capacity_array):
-        """Set the _capacity of all items"""
-        i = 0
-        while i < self.count:
-            self.stores[i].capacity = capacity_array[i]
-            i += 1
+        """Set the _capacity of all items
+
+            Quantities above the new capacity are clipped and the excess
+            is reported as overflow.
+        """
+        capacity_array = np.array(capacity_array, dtype=float)
+        ec.check_equal_length(self.capacity, capacity_array)
+        if (capacity_array < 0.0).any():
+            raise ValueError('capacity should be a positive')
+
+        self.overflow = np.maximum(self.quantity - capacity_array, 0.0)
+        np.minimum(self.quantity, capacity_array, out=self.quantity)
+        self.capacity = capacity_array
 
     def set_quantities(self, quantity_array):
         """Set the quantities all at once using an array input.
 
+            As with Store.quantity, the current inflow and request are
+            applied after the new quantities are set.
+
             Parameters
             ----------
             quantity_array : Array[float]
         """
-        for i in range(self.count):
-            self.stores[i].quantity = quantity_array[i]
+        quantity_array = np.asarray(quantity_array, dtype=float)
+        ec.check_equal_length(self.quantity, quantity_array)
+        if (quantity_array < 0.0).any():
+            raise ValueError('quantity should be a positive')
+        self.quantity[:] = quantity_array
+        self.apply()
 
-    def update(self, inflow, outflow):
+    def update(self, inflow=None, request=None):
         """Update the state of the store array by accumulating inflow
         and applying requested outflow.
 
         Parameters
         ----------
-        inflow, outflow : list(float)
+        inflow, request : list(float) or numpy.ndarray, optional
+            New inflow and request for every store. If omitted, the
+            values already held by the array are used.
+
+        """
+        if inflow is not None:
+            self.inflow[:] = inflow
+        if request is not None:
+            self.request[:] = request
+        self.apply()
 
+    def apply(self, index=slice(None)):
+        """Vectorized equivalent of Store.update for the selected stores
+
+            Parameters
+            ----------
+            index : slice or array of int
+                The stores to update (all stores by default)
         """
-        i = 0
-        while i < self.count:
-            self.stores[i].update(inflow[i], outflow[i])
-            i += 1
+        q = self.quantity[index] + (self.inflow[index] - self.request[index])
+        cap = self.capacity[index]
+        self.overflow[index] = np.where(q > cap, q - cap, 0.0)
+        q = np.minimum(q, cap)
+        self.outflow[index] = np.where(q < 0.0, self.request[index] + q, self.request[index])
+        self.quantity[index] = np.maximum(q, 0.0)
 
     def total_quantity(self):
         """Return the total _quantity by adding all store quantities"""
-        sum_quantity = 0.0
-        for i in range(self.count):
-            sum_quantity += self.stores[i].quantity
-        return sum_quantity
+        return float(self.quantity.sum())
 
     def total_overflow(self):
         """Sum of overflows for all stores"""
-        sum_overflow = 0.0
-        i = 0
-        while i < self.count:
-            sum_overflow += self.stores[i].overflow
-            i += 1
-        return sum_overflow
+        return float(self.overflow.sum())
 
     def total_outflow(self):
         """Sum of all outflows from the stores"""
-        sum_outflow = 0.0
-        i = 0
-        while i < self.count:
-            sum_outflow += self.stores[i].outflow
-            i += 1
-        return sum_outflow
+        return float(self.outflow.sum())
 
     def transfer(self, from_index, to_index, amount):
         """Used to transfer material from one store in the array to another
@@ -97,14 +226,8 @@ class StoreArray:
             to_index : int
                 The index that you want material moved to.
             amount : Quantity (rate)
-            
+
         """
-        i = 0
-        while i < self.count:
-            if i == from_index:
-                from_store = self.stores[from_index]
-                from_store.update(0.0, amount)
-                self.stores[to_index].update(from_store.outflow, 0.0)
-                break
-            else:
-                i += 1
+        from_store = self.stores[from_index]
+        from_store.update(0.0, amount)
+        self.stores[to_index].update(from_store.outflow, 0.0)
@@ -0,0 +1,99 @@
+import unittest
+import random
+from water_manage.allocation_network import AllocationNetwork
+from water_manage.allocator import Allocator
+from water_manage.request import Request
+
+
+class TestAllocationNetwork(unittest.TestCase):
+    def setUp(self):
+        """Reservoir and well feeding three demands"""
+        self.a = AllocationNetwork()
+        self.a.add_supply_node('R1', 50.0)
+        self.a.add_supply_node('W1', 20.0)
+        self.requests = [Request('town', 30.0, 1), Request('farm', 40.0, 2), Request('mine', 25.0, 3)]
+        for r in self.requests:
+            self.a.add_request(r)
+        self.a.add_link('R1', 'town', cost=1.0)
+        self.a.add_link('R1', 'farm', 30.0, 1.0)
+        self.a.add_link('R1', 'mine', cost=2.0)
+        self.a.add_link('W1', 'farm', cost=5.0)
+        self.a.add_link('W1', 'mine', cost=0.5)
+
+    def testPriorities(self):
+        self.assertEqual(self.a.deliveries, {'town': 30.0, 'farm': 40.0, 'mine': 0.0, 'remainder': 0.0})
+        self.a.set_supply('R1', 10.0)
+        self.assertEqual(self.a.deliveries, {'town': 10.0, 'farm': 20.0, 'mine': 0.0, 'remainder': 0.0})
+        self.assertTrue(self.a.min_cost.warm_started)
+        self.requests[1].priority = 0
+        self.assertEqual(self.a.deliveries, {'town': 0.0, 'farm': 30.0, 'mine': 0.0, 'remainder': 0.0})
+        self.requests[1].amount = 5.0
+        self.a.set_supply('R1', 100.0)
+        self.assertEqual(self.a.deliveries, {'town': 30.0, 'farm': 5.0, 'mine': 25.0, 'remainder': 60.0})
+        # The well supplies the mine through the cheaper link
+        self.assertEqual(self.a.flows['W1']['mine'], 20.0)
+
+    def testSharedRequest(self):
+        """A request held by an Allocator and the network updates both"""
+        allocator = Allocator(70.0, [self.requests[0]])
+        self.assertEqual(allocator.deliveries['town'], 30.0)
+        self.assertEqual(self.a.deliveries['town'], 30.0)
+        self.requests[0].amount = 12.0
+        self.assertEqual(allocator.deliveries['town'], 12.0)
+        self.assertEqual(self.a.deliveries['town'], 12.0)
+        self.requests[0].priority = 3
+        self.assertTrue(allocator.stale)
+        self.assertTrue(self.a.stale)
+        deliveries = self.a.deliveries
+        self.assertEqual(deliveries['farm'], 40.0)
+        self.assertAlmostEqual(deliveries['town'] + deliveries['mine'], 30.0)
+        self.assertEqual(allocator.deliveries['town'], 12.0)
+
+    def testMatchesAllocator(self):
+        """With one supply and distinct priorities the result is the Allocator's"""
+        rng = random.Random(3)
+        a = AllocationNetwork()
+        a.add_supply_node('S1')
+        requests = [Request('r' + str(i), 0.0, i) for i in range(6)]
+        for r in requests:
+            a.add_request(r)
+            a.add_link('S1', r.name, cost=rng.randint(0, 4))
+        allocator = Allocator(0.0, [Request(r.name, 0.0, r.priority) for r in requests])
+        for step in range(20):
+            supply = rng.randint(0, 120)
+            a.set_supply('S1', supply)
+            allocator.supply = supply
+            for r in requests:
+                r.amount = allocator.get_request(r.name).amount = rng.randint(0, 30)
+            for name, delivery in allocator.deliveries.items():
+                self.assertAlmostEqual(a.deliveries[name], delivery)
+
+    def testFloatsMatchAllocator(self):
+        """Fractional supplies, amounts and costs give the Allocator's total at each priority"""
+        for seed in range(20):
+            rng = random.Random(seed)
+            a = AllocationNetwork()
+            a.add_supply_node('S1')
+            requests = [Request('r' + str(i), rng.uniform(0.0, 40.0), rng.randint(1, 4))
+                        for i in range(rng.randint(1, 8))]
+            for r in requests:
+                a.add_request(r)
+                a.add_link('S1', r.name, cost=rng.uniform(0.0, 3.0))
+            allocator = Allocator(0.0, [Request(r.name, r.amount, r.priority) for r in requests])
+            for step in range(5):
+                supply = rng.uniform(0.0, 150.0)
+                a.set_supply('S1', supply)
+                allocator.supply = supply
+                for r in requests:
+                    r.amount = allocator.get_request(r.name).amount = rng.uniform(0.0, 40.0)
+                deliveries = a.deliveries
+                for priority in set(r.priority for r in requests):
+                    names = [r.name for r in requests if r.priority == priority]
+                    self.assertAlmostEqual(sum(deliveries[n] for n in names),
+                                           sum(allocator.deliveries[n] for n in names), 5)
+                self.assertAlmostEqual(deliveries['remainder'], allocator.deliveries['remainder'], 5)
+                self.assertAlmostEqual(sum(deliveries.values()), supply, 5)
+
+
+if __name__ == '__main__':
+    unittest.main()
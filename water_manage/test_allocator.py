@@ -1,4 +1,5 @@
 import unittest
+import numpy as np
 from water_manage.allocator import Allocator
 from water_manage.request import Request
 
@@ -84,6 +85,30 @@ class TestAllocator(unittest.TestCase):
                           'remainder': 4.329999999999998}
         self.assertDictEqual(outflows, outlfow_actual)
 
+    def testAllocateArray(self):
+        """An array of supplies gives the same deliveries as one at a time"""
+        supplies = np.array([0.0, 12.5, 30.0, 46.0, 60.0, 81.0, 100.0])
+        deliveries, remainder = self.a1.allocate_array(supplies)
+        self.assertEqual(deliveries.shape, (7, 4))
+        for supply, delivery, left in zip(supplies, deliveries, remainder):
+            self.a1.supply = supply
+            expected = self.a1.deliveries
+            self.assertEqual(delivery.tolist(), [expected[r.name] for r in self.a1.requests])
+            self.assertEqual(left, expected['remainder'])
+
+    def testLazyUpdate(self):
+        """Deliveries are only worked out again after a change"""
+        count = self.a1.update_counter
+        for i in range(3):
+            self.a1.deliveries
+        self.a1.supply = self.supply
+        self.assertEqual(self.a1.update_counter, count)
+        self.a1.get_request('mine').amount = 5
+        self.assertTrue(self.a1.stale)
+        self.assertEqual(self.a1.total_requests(), 51)
+        self.assertEqual(self.a1.deliveries['remainder'], 9)
+        self.assertEqual(self.a1.update_counter, count + 1)
+
     def testDefaultRequests(self):
         """Make sure the default request is zero."""
         a2 = Allocator()
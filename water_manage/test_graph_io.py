@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from water_manage.flow_network import Network
+from water_manage.graph_io import read_graphml, read_edgelist, read_adjacency
+from water_manage.routing import Router
+
+DATA = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data_external')
+
+
+class TestGraphIO(unittest.TestCase):
+    def testReadGraphML(self):
+        table = read_graphml(os.path.join(DATA, 'watershed_edgelist.graphml'))
+        self.assertEqual(table.names, ['c1', 'c2', 'c3', 'c4', 'j1', 'j2'])
+        self.assertEqual(table.upstream.tolist(), [0, 1, 2, 3, 4])
+        self.assertEqual(table.downstream.tolist(), [4, 4, 4, 5, 5])
+        self.assertEqual(table.attributes['weight'].tolist(), [1.0] * 5)
+
+    def testLoadAdjacency(self):
+        n = Network()
+        catchments = n.load_from_file(os.path.join(DATA, 'watershed_adj_input'), source_name='a')
+        self.assertEqual(catchments, ['c1', 'c2', 'c3', 'c4', 'c5', 'c6'])
+        self.assertEqual(list(n.dg.successors('J1')), ['sink'])
+        runoff = dict(zip(catchments, np.arange(1.0, 7.0)))
+        n.update_all(runoff)
+        self.assertAlmostEqual(n.outflow(), 21.0)
+        n.calc_method = 'route'
+        self.assertAlmostEqual(n.outflow(), 21.0)
+        self.assertAlmostEqual(n.outflow_at_node('n2'), 3.0 + 4.0 + 5.0 + 6.0)
+
+    def testLoadEdgelist(self):
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'edges.csv')
+            with open(filename, 'w') as f:
+                f.write('upstream,downstream,capacity,lag\n'
+                        'C1,J1,,\n'
+                        'C2,J1,,2\n'
+                        'J1,J2,4.0,\n'
+                        'C3,J2,,\n')
+            table = read_edgelist(filename)
+            n = Network()
+            n.calc_method = 'route'
+            catchments = n.load_table(table)
+        self.assertEqual(catchments, ['C1', 'C2', 'C3'])
+        self.assertEqual(n.dg['C2']['J1'], {'capacity': 0.0, 'lag': 2.0})
+        # The router built from the arrays matches one built from the graph
+        from_graph = Router(n.dg)
+        self.assertEqual(from_graph.nodes, n.router.nodes)
+        np.testing.assert_array_equal(from_graph.capacity, n.router.capacity)
+        np.testing.assert_array_equal(from_graph.supply, n.router.supply)
+        np.testing.assert_array_equal(from_graph.reaches.lag, n.router.reaches.lag)
+        flows = []
+        for t in range(4):
+            n.advance()
+            n.update_all({'C1': 1.0, 'C2': 2.0, 'C3': 3.0})
+            flows.append(n.outflow())
+        self.assertEqual(flows, [4.0, 4.0, 6.0, 6.0])
+
+    def testReadAdjacencyComments(self):
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'adjacency')
+            with open(filename, 'w') as f:
+                f.write('# headwaters\nC1 J1\n\nC2 J1  # second\nJ1\n')
+            table = read_adjacency(filename)
+        self.assertEqual(table.names, ['C1', 'J1', 'C2'])
+        self.assertEqual(table.downstream.tolist(), [1, 1])
+
+
+if __name__ == '__main__':
+    unittest.main()
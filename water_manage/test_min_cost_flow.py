@@ -0,0 +1,118 @@
+import unittest
+import random
+import networkx as nx
+from water_manage.min_cost_flow import MinCostFlow
+
+
+class TestMinCostFlow(unittest.TestCase):
+    def setUp(self):
+        """Supply network of hubs feeding demand nodes"""
+        self.rng = random.Random(4)
+        self.g = nx.DiGraph()
+        self.hubs = ['H' + str(i) for i in range(12)]
+        self.demands = ['D' + str(i) for i in range(40)]
+        for h in self.hubs:
+            self.g.add_edge('S', h, capacity=100, weight=self.rng.randint(1, 8))
+        for i in range(40):
+            a, b = self.rng.sample(self.hubs, 2)
+            self.g.add_edge(a, b, capacity=self.rng.randint(20, 200), weight=self.rng.randint(1, 5))
+        for d in self.demands:
+            for h in self.rng.sample(self.hubs, 2):
+                self.g.add_edge(h, d, capacity=self.rng.randint(5, 20), weight=self.rng.randint(1, 20))
+        self.g.add_edge('S', 'spill', weight=100)
+        self.solver = MinCostFlow(self.g)
+
+    def set_demands(self):
+        total = 0
+        for d in self.demands:
+            self.g.nodes[d]['demand'] = self.rng.randint(0, 10)
+            total += self.g.nodes[d]['demand']
+        self.g.nodes['S']['demand'] = -total - 5
+        self.g.nodes['spill']['demand'] = 5
+
+    def testMatchesNetworkSimplex(self):
+        """Warm-started solves give the same cost as network_simplex"""
+        for step in range(15):
+            self.set_demands()
+            for u, v in self.rng.sample(list(self.g.edges()), 10):
+                if u != 'S':
+                    self.g[u][v]['capacity'] = self.rng.randint(5, 200)
+            expected_cost, expected_flows = nx.network_simplex(self.g)
+            self.solver.refresh()
+            cost, flows = self.solver.solve()
+            self.assertEqual(cost, expected_cost)
+            self.assertEqual(self.solver.warm_started, step > 0)
+            for node in self.g:
+                net = (sum(flows[u][node] for u in self.g.predecessors(node))
+                       - sum(flows[node][v] for v in self.g.successors(node)))
+                self.assertEqual(net, self.g.nodes[node].get('demand', 0))
+            for u, v, data in self.g.edges(data=True):
+                self.assertTrue(0 <= flows[u][v] <= data.get('capacity', float('inf')))
+
+    def testInfeasible(self):
+        self.set_demands()
+        self.solver.refresh()
+        self.solver.solve()
+        self.solver.set_demand('D0', 10000)
+        self.solver.set_demand('S', self.g.nodes['S']['demand'] - 10000 + self.g.nodes['D0']['demand'])
+        with self.assertRaises(nx.NetworkXUnfeasible):
+            self.solver.solve()
+        # The solver recovers once the demands can be met again
+        self.solver.refresh()
+        self.assertEqual(self.solver.solve()[0], nx.network_simplex(self.g)[0])
+
+    def testZeroCapacity(self):
+        """Edges closed to zero capacity carry nothing and do not stall pivoting"""
+        for step in range(5):
+            self.set_demands()
+            # Closing links between hubs keeps every demand within reach
+            for u, v in self.rng.sample(list(self.g.edges()), 30):
+                if u in self.hubs and v in self.hubs:
+                    self.g[u][v]['capacity'] = self.rng.choice([0, 50])
+            self.solver.refresh()
+            cost, flows = self.solver.solve()
+            self.assertEqual(cost, nx.network_simplex(self.g)[0])
+            for u, v, data in self.g.edges(data=True):
+                if data.get('capacity') == 0:
+                    self.assertEqual(flows[u][v], 0)
+
+    def testFloatWarmStart(self):
+        """Fractional capacities and demands are solved in scaled units and conserve mass"""
+        scale = 1000
+        for u, v in self.g.edges():
+            if 'capacity' in self.g[u][v]:
+                self.g[u][v]['capacity'] += self.rng.random()
+        solver = MinCostFlow(self.g, scale=scale)
+        for step in range(10):
+            total = 0.0
+            for d in self.demands:
+                self.g.nodes[d]['demand'] = round(self.rng.uniform(0.0, 10.0), 3)
+                total += self.g.nodes[d]['demand']
+            self.g.nodes['spill']['demand'] = 5.25
+            self.g.nodes['S']['demand'] = -total - 5.25
+            scaled = self.g.copy()
+            for node, data in scaled.nodes(data=True):
+                data['demand'] = round(data.get('demand', 0) * scale)
+            for u, v, data in scaled.edges(data=True):
+                if 'capacity' in data:
+                    data['capacity'] = round(data['capacity'] * scale)
+            # Rounded demands may not add to zero; the spill takes the difference
+            scaled.nodes['spill']['demand'] -= sum(d for n, d in scaled.nodes(data='demand'))
+            self.g.nodes['spill']['demand'] = scaled.nodes['spill']['demand'] / scale
+            solver.refresh()
+            cost, flows = solver.solve()
+            self.assertEqual(solver.warm_started, step > 0)
+            self.assertAlmostEqual(cost, nx.network_simplex(scaled)[0] / scale, 6)
+            for node in self.g:
+                net = (sum(flows[u][node] for u in self.g.predecessors(node))
+                       - sum(flows[node][v] for v in self.g.successors(node)))
+                self.assertAlmostEqual(net, scaled.nodes[node]['demand'] / scale, 9)
+
+    def testFractionalWithoutScale(self):
+        self.g['S']['H0']['capacity'] = 50.5
+        with self.assertRaises(ValueError):
+            MinCostFlow(self.g)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,9 @@
 import unittest
 from water_manage.flow_network import Network
+import networkx as nx
 import numpy as np
 import os
+import tempfile
 
 
 class TestMyNetwork(unittest.TestCase):
@@ -90,6 +92,181 @@ class TestMyNetwork(unittest.TestCase):
         self.n1.update_all(capacity)
         self.assertAlmostEqual(self.n1.outflow(), expected_sum, self.precision)
         
+    def testRouteMatchesMaxFlow(self):
+        """Array routing gives the same outflows as maximum_flow on a random tree"""
+        rng = np.random.default_rng(5)
+        self.n1.add_junction('J0', 'sink')
+        for i in range(1, 60):
+            self.n1.add_junction('J' + str(i), 'J' + str(rng.integers(i)))
+        for i in range(200):
+            self.n1.add_catchment('C' + str(i), 'J' + str(rng.integers(60)))
+        capacity = {'C' + str(i): rng.uniform(-1, 5) for i in range(200)}
+        self.n1.update_all(capacity)
+        expected = self.n1.calc_flows()
+        self.n1.calc_method = 'route'
+        flows = self.n1.calc_flows()
+        for i in range(60):
+            node = 'J' + str(i)
+            succ = list(self.n1.dg.successors(node))[0]
+            self.assertAlmostEqual(flows[node][succ], expected[node][succ], self.precision)
+            self.assertAlmostEqual(self.n1.outflow_at_node(node), expected[node][succ], self.precision)
+
+        # Limit some junctions so the flow is held back part way down. The
+        # flows on edges above a limit are not unique, but the outflow is.
+        for i in range(0, 60, 7):
+            self.n1.update_capacity('J' + str(i), 50.0)
+        for step in range(3):
+            self.n1.update_all({'C' + str(i): rng.uniform(-1, 5) for i in range(200)})
+            self.n1.calc_method = 'max'
+            expected = self.n1.outflow()
+            self.n1.calc_method = 'route'
+            self.assertAlmostEqual(self.n1.outflow(), expected, self.precision)
+
+    def testSnapshot(self):
+        """Topology, capacities and reach states survive a snapshot"""
+        self.n1.calc_method = 'route'
+        self.n1.add_junction('J1')
+        self.n1.add_catchment('C1', 'J1')
+        self.n1.add_catchment('C2', 'J1')
+        self.n1.add_reach('C2', k=2.0, x=0.1, lag=2)
+        for t in range(5):
+            self.n1.advance()
+            self.n1.update_all({'C1': 1.0 + t, 'C2': 2.0 * t})
+            self.n1.outflow()
+        with tempfile.TemporaryDirectory() as folder:
+            filename = os.path.join(folder, 'network.npz')
+            self.n1.save_snapshot(filename)
+            n2 = Network()
+            n2.load_snapshot(filename)
+        self.assertEqual(n2.calc_method, 'route')
+        self.assertEqual(dict(n2.dg.nodes(data=True)), dict(self.n1.dg.nodes(data=True)))
+        self.assertEqual(n2.dg['C2']['J1']['capacity'], 8.0)
+        self.assertEqual(n2.outflow(), self.n1.outflow())
+        for t in range(5):
+            for n in (self.n1, n2):
+                n.advance()
+                n.update_all({'C1': 1.0, 'C2': 0.0})
+            self.assertEqual(n2.outflow(), self.n1.outflow())
+
+    def testIncrementalRoute(self):
+        """Routing only the changed nodes gives the same flows as a full pass"""
+        rng = np.random.default_rng(8)
+        self.n1.calc_method = 'route'
+        self.n1.add_junction('J0', 'sink')
+        for i in range(1, 40):
+            self.n1.add_junction('J' + str(i), 'J' + str(rng.integers(i)))
+        for i in range(300):
+            self.n1.add_catchment('C' + str(i), 'J' + str(rng.integers(40)))
+        self.n1.update_capacity('J5', 20.0)
+        self.n1.update_all({'C' + str(i): rng.uniform(0, 5) for i in range(300)})
+        router = self.n1.get_router()
+        self.n1.outflow()
+
+        for step in range(20):
+            changed = rng.choice(300, 5, replace=False)
+            self.n1.update_all({'C' + str(i): rng.uniform(0, 5) for i in changed})
+            self.assertEqual(len(router.dirty), 5)
+            outflow = self.n1.outflow()
+            self.assertEqual(len(router.dirty), 0)
+            flow = router.flow.copy()
+            router.route_all()
+            np.testing.assert_allclose(flow, router.flow, rtol=1e-12)
+            self.assertAlmostEqual(outflow, router.outflow(), 9)
+
+        # Setting the same capacity again leaves nothing to do
+        self.n1.update_capacity('C0', router.capacity[router.index['C0']])
+        self.assertEqual(len(router.dirty), 0)
+
+    def testRouteSeries(self):
+        """Whole-series routing matches routing one step at a time"""
+        rng = np.random.default_rng(9)
+        self.n1.add_junction('J0', 'sink')
+        for i in range(1, 20):
+            self.n1.add_junction('J' + str(i), 'J' + str(rng.integers(i)))
+        names = ['C' + str(i) for i in range(50)]
+        for name in names:
+            self.n1.add_catchment(name, 'J' + str(rng.integers(20)))
+        runoff = rng.uniform(-1, 5, (30, 50))
+
+        flows = self.n1.route_series(runoff, names)
+        router = self.n1.get_router()
+        self.assertEqual(flows.shape, (30, len(router.nodes)))
+        self.n1.calc_method = 'route'
+        for t in range(30):
+            self.n1.update_all(dict(zip(names, runoff[t])))
+            self.assertAlmostEqual(flows[t, router.index['sink']], self.n1.outflow(), self.precision)
+            np.testing.assert_allclose(flows[t], router.flow + np.where(router.downstream < 0, router.inflow, 0.0),
+                                       rtol=1e-12, atol=1e-12)
+
+        self.n1.update_capacity('J3', 10.0)
+        with self.assertRaises(ValueError):
+            self.n1.route_series(runoff, names)
+
+    def testMaxFlowCached(self):
+        """maximum_flow is only run again after a capacity changes"""
+        self.n1.add_catchment('C1')
+        self.n1.update_capacity('C1', 2.0)
+        flows = self.n1.calc_flows()
+        self.assertIs(self.n1.calc_flows(), flows)
+        self.assertEqual(self.n1.outflow_at_node('C1'), 2.0)
+        self.n1.update_capacity('C1', 3.0)
+        self.assertIsNot(self.n1.calc_flows(), flows)
+        self.assertEqual(self.n1.outflow(), 3.0)
+
+    def testRouterRebuilt(self):
+        """Adding nodes after routing rebuilds the router"""
+        self.n1.calc_method = 'route'
+        self.n1.add_catchment('C1')
+        self.n1.update_capacity('C1', 2.0)
+        self.assertEqual(self.n1.outflow(), 2.0)
+        self.n1.add_junction('J1', 'sink')
+        self.n1.add_catchment('C2', 'J1')
+        self.n1.update_capacity('C2', 3.0)
+        self.assertEqual(self.n1.outflow(), 5.0)
+        self.n1.add_splitter('S1', ['C1', 'J1'])
+        with self.assertRaises(ValueError):
+            self.n1.outflow()
+
+    def testMinCost(self):
+        """The persistent min cost solver follows changes to the graph"""
+        self.n1.calc_method = 'min_cost'
+        self.n1.add_demand('D1', cost=2, demand=10.0)
+        self.n1.add_demand('D2', cost=1, demand=4.0)
+        self.n1.dg.nodes['source']['demand'] = -6
+        self.n1.dg.nodes['sink']['demand'] = 6
+        flows = self.n1.calc_flows()
+        self.assertEqual(flows['source'], {'D1': 2, 'D2': 4.0})
+        self.n1.link_capacity('source', 'D2', 1.0)
+        flows = self.n1.calc_flows()
+        self.assertEqual(flows['source'], {'D1': 5, 'D2': 1.0})
+        self.assertTrue(self.n1.min_cost.warm_started)
+
+    def testMinCostFractional(self):
+        """Fractional capacities and demands give the flows of networkx"""
+        self.n1.add_catchment('C1', 'J1')
+        self.n1.add_catchment('C2', 'J1')
+        self.n1.add_junction('J1', 'J2')
+        self.n1.add_junction('J2')
+        self.n1.link_capacity('J2', 'sink', 6.35)
+        self.n1.update_all({'C1': 5.4, 'C2': 2.65})
+        self.n1.calc_method = 'min_cost'
+        flows = self.n1.calc_flows()
+        self.assertEqual(flows['C1']['J1'], 0.0)
+        value = nx.maximum_flow_value(self.n1.dg, 'source', 'sink')
+        self.n1.dg.nodes['source']['demand'] = -value
+        self.n1.dg.nodes['sink']['demand'] = value
+        flows = self.n1.calc_flows()
+        self.assertAlmostEqual(flows['J2']['sink'], 6.35)
+        self.assertAlmostEqual(self.n1.outflow(), value)
+        self.n1.update_all({'C1': 1.25, 'C2': 0.5})
+        self.n1.dg.nodes['source']['demand'] = -1.75
+        self.n1.dg.nodes['sink']['demand'] = 1.75
+        flows = self.n1.calc_flows()
+        cost, expected = nx.network_simplex(self.n1.dg)
+        for u, targets in expected.items():
+            for v, flow in targets.items():
+                self.assertAlmostEqual(flows[u][v], flow)
+
     def testReadFromGML(self):
         filename = "C:\\Users\\jlillywhite\\PyCharmProjects\\AegisProject\\water_manage\\test_data\\network_GML_input.gml"
         self.n1.load_from_file(filename)
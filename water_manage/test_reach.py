@@ -0,0 +1,80 @@
+import unittest
+import numpy as np
+from water_manage.reach import Reaches, muskingum_coefficients
+from water_manage.flow_network import Network
+
+
+class TestReaches(unittest.TestCase):
+    def setUp(self):
+        self.rng = np.random.default_rng(6)
+        self.inflow = self.rng.uniform(0, 10, (50, 4))
+        self.reaches = Reaches([0, 2, 0, 3], [2.0, 1.0, 0.0, 0.0], [0.2, 0.1, 0.0, 0.0])
+
+    def testMuskingum(self):
+        """Step by step outflow matches the Muskingum equation"""
+        c0, c1, c2 = muskingum_coefficients(2.0, 0.2)
+        self.assertAlmostEqual(c0 + c1 + c2, 1.0)
+        expected = 0.0
+        previous = 0.0
+        for t in range(50):
+            out = self.reaches.outflow(np.arange(4), self.inflow[t])
+            # Asking again for the same step does not move the state
+            out = self.reaches.outflow(np.arange(4), self.inflow[t])
+            self.reaches.advance()
+            expected = c0 * self.inflow[t, 0] + c1 * previous + c2 * expected
+            previous = self.inflow[t, 0]
+            self.assertAlmostEqual(out[0], expected)
+            self.assertEqual(out[2], self.inflow[t, 2])
+            self.assertEqual(out[3], self.inflow[t - 3, 3] if t >= 3 else 0.0)
+
+    def testSeriesMatchesSteps(self):
+        """The whole-series mode continues from and leaves the same state"""
+        steps = Reaches([0, 2, 0, 3], [2.0, 1.0, 0.0, 0.0], [0.2, 0.1, 0.0, 0.0])
+        expected = []
+        for t in range(50):
+            expected.append(steps.outflow(np.arange(4), self.inflow[t]))
+            steps.advance()
+        first = self.reaches.outflow_series(np.arange(4), self.inflow[:20])
+        rest = self.reaches.outflow_series(np.arange(4), self.inflow[20:])
+        np.testing.assert_allclose(np.vstack([first, rest]), expected, rtol=1e-12)
+        np.testing.assert_allclose(self.reaches.history, steps.history)
+        np.testing.assert_allclose(self.reaches.previous_outflow, steps.previous_outflow)
+
+    def testUnstable(self):
+        with self.assertRaises(ValueError):
+            muskingum_coefficients(0.2, 0.4, 1.0)
+
+
+class TestNetworkReaches(unittest.TestCase):
+    def setUp(self):
+        self.n = Network()
+        self.n.calc_method = 'route'
+        self.n.add_junction('J1', 'sink')
+        self.n.add_junction('J2', 'J1')
+        self.n.add_catchment('C1', 'J1')
+        self.n.add_catchment('C2', 'J2')
+        self.n.add_catchment('C3', 'J2')
+        self.n.add_reach('J2', k=1.5, x=0.2, lag=1)
+        self.n.add_reach('C1', lag=2)
+        self.runoff = np.random.default_rng(7).uniform(0, 5, (40, 3))
+        self.names = ['C1', 'C2', 'C3']
+
+    def testStepsMatchSeries(self):
+        expected = self.n.route_series(self.runoff, self.names)
+        sink = self.n.get_router().index['sink']
+        self.n.reset_solvers()
+        for t in range(40):
+            self.n.advance()
+            self.n.update_all(dict(zip(self.names, self.runoff[t])))
+            self.assertAlmostEqual(self.n.outflow(), expected[t, sink], 9)
+            self.assertAlmostEqual(self.n.outflow(), expected[t, sink], 9)
+        # Every drop that went in comes out eventually
+        for t in range(200):
+            self.n.advance()
+            self.n.update_all(dict.fromkeys(self.names, 0.0))
+            self.n.outflow()
+        self.assertLess(self.n.outflow(), 1e-9)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,50 @@
+import unittest
+import numpy as np
+import pandas as pd
+from water_manage.allocator import Allocator
+from water_manage.request import Request
+from water_manage.request_table import RequestTable
+
+
+class TestRequestTable(unittest.TestCase):
+    def setUp(self):
+        """Same requests as the Allocator tests"""
+        self.frame = pd.DataFrame({'name': ['pumping', 'farm', 'mine', 'evaporation'],
+                                   'amount': [10.0, 18.0, 35.0, 18.0],
+                                   'priority': [2, 2, 3, 1]})
+        self.table = RequestTable.from_frame(self.frame)
+
+    def testMatchesAllocator(self):
+        allocator = Allocator(0.0, [Request(*row) for row in self.frame.itertuples(index=False)])
+        for supply in [0.0, 20.0, 40.0, 60.0, 81.0, 100.0]:
+            allocator.supply = supply
+            deliveries, remainder = self.table.allocate(supply)
+            expected = allocator.deliveries
+            self.assertEqual(self.table.delivery.tolist(), [expected[name] for name in self.table.names])
+            self.assertEqual(remainder, expected['remainder'])
+            self.assertEqual(allocator.get_request('farm').delivery, expected['farm'])
+
+    def testChanges(self):
+        self.table.allocate(60.0)
+        self.assertEqual(self.table.get_request('mine').delivery, 14.0)
+        self.table.set_priority('mine', 1)
+        self.table.set_amount('evaporation', 20.0)
+        self.table.allocate(60.0)
+        frame = self.table.to_frame()
+        self.assertEqual(frame.loc['mine', 'delivery'], 35.0)
+        self.assertAlmostEqual(frame['delivery'].sum(), 60.0)
+
+    def testManySupplies(self):
+        rng = np.random.default_rng(5)
+        table = RequestTable(['r' + str(i) for i in range(500)], rng.uniform(0, 10, 500),
+                             rng.integers(1, 40, 500))
+        supplies = rng.uniform(0, 3000, 20)
+        deliveries, remainder = table.allocate(supplies)
+        self.assertEqual(deliveries.shape, (20, 500))
+        np.testing.assert_allclose(deliveries.sum(axis=1) + remainder, supplies)
+        for supply, delivery in zip(supplies[:3], deliveries):
+            np.testing.assert_array_equal(table.allocate(supply)[0], delivery)
+
+
+if __name__ == '__main__':
+    unittest.main()
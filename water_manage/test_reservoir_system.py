@@ -0,0 +1,112 @@
+import unittest
+import numpy as np
+from water_manage.reservoir import Reservoir
+from water_manage.reservoir_system import ReservoirSystem
+
+
+class TestReservoirSystem(unittest.TestCase):
+    def setUp(self):
+        """Cascade of two reservoirs through a junction, and one on its own"""
+        self.upper = Reservoir(150.0)
+        self.lower = Reservoir(100.0)
+        self.lower.set_geometry([0.0, 5.0, 10.0, 20.0, 30.0], [0.0, 20.0, 35.0, 48.0, 60.0],
+                                [0.0, 50.0, 175.0, 590.0, 1130.0])
+        self.side = Reservoir(170.0)
+        self.s = ReservoirSystem()
+        self.s.add_reservoir('lower', self.lower)
+        self.s.add_junction('J1', 'lower')
+        self.s.add_reservoir('upper', self.upper, 'J1')
+        self.s.add_reservoir('side', self.side)
+
+    def tearDown(self):
+        """Destroy the object after running tests"""
+        del self.s
+
+    def testBuild(self):
+        self.s.build()
+        self.assertEqual(self.s.elevations.shape, (3, 5))
+        self.assertEqual(self.s.downstream.tolist(), [-1, 0, -1])
+        self.assertEqual([rows.tolist() for rows in self.s.levels], [[1, 2], [0]])
+
+    def testInterpolation(self):
+        self.s.build()
+        volumes = np.random.default_rng(2).uniform(-10.0, 1200.0, (50, 3))
+        # Values on the table points, including the repeated padding
+        volumes[:5] = self.s.volumes[:, :5].T
+        levels = self.s.water_level(volumes)
+        for i, name in enumerate(self.s.names):
+            reservoir = self.s.reservoirs[name]
+            np.testing.assert_allclose(levels[:, i], np.interp(volumes[:, i], reservoir.volumes,
+                                                               reservoir.elevations), rtol=1e-12)
+        np.testing.assert_allclose(self.s.area(), [self.lower.area, self.upper.area, self.side.area])
+
+    def testCascade(self):
+        """What the upper reservoir passes on reaches the lower one in the same step"""
+        result = self.s.step([0.0, 40.0, 0.0], release=[0.0, 2.0, 1.0])
+        self.assertEqual(result['release'][1], 2.0)
+        head = (150.0 + 40.0 - 2.0 - 175.0) / 41.5
+        self.assertAlmostEqual(result['spill'][1], 3.2 * head**1.5)
+        self.assertAlmostEqual(result['inflow'][0], result['outflow'][1])
+        self.assertAlmostEqual(self.s.volume[0], 100.0 + result['outflow'][1])
+        self.assertAlmostEqual(self.s.volume[2], 169.0)
+
+    def testOutlet(self):
+        """Nothing is released from below the outlet"""
+        outlet_volume = np.interp(self.side.outlet_elevation, self.side.elevations, self.side.volumes)
+        self.s.build()
+        self.s.volume[2] = outlet_volume + 3.0
+        result = self.s.step([0.0, 0.0, 0.0], release=10.0)
+        self.assertAlmostEqual(result['release'][2], 3.0)
+        self.assertAlmostEqual(self.s.volume[2], outlet_volume)
+
+    def testSimulate(self):
+        """Matches each reservoir stepped on its own with water passed down"""
+        inflow = np.random.default_rng(4).gamma(2.0, 3.0, (60, 3))
+        result = self.s.simulate(inflow, release=4.0, evap_rate=0.01)
+        self.assertEqual(result['level'].shape, (60, 3))
+        names = ['lower', 'upper', 'side']
+        volume = {'lower': 100.0, 'upper': 150.0, 'side': 170.0}
+        for t in range(60):
+            passed = 0.0
+            for i in [1, 2, 0]:
+                name = names[i]
+                reservoir = self.s.reservoirs[name]
+                water = volume[name] + inflow[t, i] + (passed if name == 'lower' else 0.0)
+                evaporation = min(0.01 * np.interp(volume[name], reservoir.volumes, reservoir.areas),
+                                  volume[name] + inflow[t, i])
+                water -= evaporation
+                outlet = np.interp(reservoir.outlet_elevation, reservoir.elevations, reservoir.volumes)
+                release = min(max(water - outlet, 0.0), 4.0)
+                water -= release
+                level = np.interp(water, reservoir.volumes, reservoir.elevations)
+                weir = reservoir.weir_coef * reservoir.weir_length * max(level - reservoir.spillway_crest, 0.0)**1.5
+                spill = min(weir, max(water - reservoir.spillway_volume, 0.0))
+                volume[name] = water - spill
+                if name == 'upper':
+                    passed = release + spill
+                self.assertAlmostEqual(result['volume'][t, i], volume[name], 9)
+        self.s.save_volumes()
+        self.assertEqual(self.upper.volume, result['volume'][-1, 1])
+
+    def testSpillway(self):
+        """Spill follows the weir settings and never draws below the crest"""
+        self.upper.weir_length = 2.0
+        self.side.weir_coef = 1000.0
+        self.lower.capacity = 90.0
+        result = self.s.step([0.0, 40.0, 30.0])
+        head = (150.0 + 40.0 - 175.0) / 41.5
+        self.assertAlmostEqual(result['spill'][1], 2.0 * 3.2 * head**1.5)
+        self.assertAlmostEqual(result['spill'][2], 170.0 + 30.0 - 175.0)
+        self.assertAlmostEqual(self.s.volume[2], 175.0)
+        self.assertAlmostEqual(self.s.volume[0], 90.0)
+        # Setting the capacity already cut the lower reservoir down to 90
+        self.assertAlmostEqual(result['spill'][0], result['outflow'][1])
+
+    def testLoop(self):
+        self.s.add_reservoir('lower', self.lower, 'upper')
+        with self.assertRaises(ValueError):
+            self.s.build()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,4 +1,5 @@
 from unittest import TestCase
+import numpy as np
 from water_manage.store_array import StoreArray
 
 
@@ -26,3 +27,25 @@ class TestStoresCase(TestCase):
 
     def testOutflow(self):
         self.assertAlmostEqual(self.sa.total_outflow(), 9.93)
+
+    def testStoreView(self):
+        """Indexing returns a Store-like view of the arrays"""
+        self.assertAlmostEqual(self.sa[0].quantity, 0.0)
+        self.assertAlmostEqual(self.sa[0].outflow, 2.5)
+        self.sa[2].capacity = 10.0
+        self.assertEqual(self.sa.capacity[2], 10.0)
+        self.assertAlmostEqual(self.sa[2].overflow, 11.45)
+
+    def testSetCapacityCopies(self):
+        """The capacities are not tied to the caller's array"""
+        capacity = np.full(4, 50.0)
+        self.sa.set_capacity(capacity)
+        capacity[0] = 1.0
+        self.assertEqual(self.sa.capacity[0], 50.0)
+
+    def testTransfer(self):
+        """Material moved between stores is conserved"""
+        self.sa.transfer(1, 0, 5.0)
+        self.assertAlmostEqual(self.sa[0].quantity, 5.0)
+        self.assertAlmostEqual(self.sa[1].quantity, 2.8)
+        self.assertAlmostEqual(self.sa.total_quantity(), self.total_quantity)